@@ -5,22 +5,90 @@
 Flask バックエンド API
 """
 
+import io
+import sys
 import sqlite3
 import json
 import uuid
+import tempfile
+import threading
+import time
+import zlib
 from datetime import datetime, date
 from typing import Optional, List, Dict, Any
 from functools import wraps
+from contextlib import contextmanager, nullcontext
+from urllib.parse import unquote_to_bytes
 
-from flask import Flask, g, request, jsonify, render_template, send_from_directory
+from flask import (Flask, after_this_request, g, has_app_context, has_request_context, request, jsonify,
+                   render_template, send_from_directory)
 from werkzeug import Response
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Rule
+
+import archive
+import distributions
+import jobs
+import leagues
+import player_search
+import rollups
+import streaks
 
 import os
-# データベースのファイル名（絶対パスを使用）
+# データベースのファイル名（絶対パスを使用）。MAHJONG_DATABASE で差し替え可能
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE = os.path.join(BASE_DIR, 'database.db')
+DATABASE = os.environ.get('MAHJONG_DATABASE') or os.path.join(BASE_DIR, 'database.db')
+
+# スナップショットモード：読み取りは書き込みごとに公開される不変コピーから行う
+SNAPSHOT_MODE = os.environ.get('MAHJONG_SNAPSHOT_MODE') == '1'
+
+# 書き込みごとに順位表などのJSONを static/data に書き出し、Apacheから直接配信する
+STATIC_ARTIFACTS = os.environ.get('MAHJONG_STATIC_ARTIFACTS') == '1'
+# 順位表をメモリ上の NumPy の列から計算する（standings_engine.py）
+STANDINGS_ENGINE = os.environ.get('MAHJONG_STANDINGS_ENGINE') == 'numpy'
+# 順位表の SSE 配信を画面で使う。接続を保持し続けるので、常駐するサーバー（asgi.py など）のときだけ有効にする
+# （CGI では開いているタブごとにプロセスが残り、タイムアウトのたびに起動し直すことになる）
+LIVE_STANDINGS = os.environ.get('MAHJONG_LIVE_STANDINGS') == '1'
+# 静的JSONの書き出しをリクエスト内で行わず、ジョブとして worker.py に任せる
+DEFER_STATIC_ARTIFACTS = os.environ.get('MAHJONG_DEFER_STATIC_ARTIFACTS') == '1'
+# worker.py が常駐してジョブを実行している。設定しなければ、ポイントの再計算などのジョブは登録したリクエストのレスポンスの後に実行する
+JOB_WORKER = os.environ.get('MAHJONG_JOB_WORKER') == '1'
+STATIC_DATA_DIR = os.path.join(BASE_DIR, 'static', 'data')
+
+class LazyBuildRule(Rule):
+    """URL生成用の関数を初めて url_for で使うときにコンパイルするルール
+
+    Werkzeug はルールの登録時に URL 生成用のコードを組み立ててコンパイルするため、
+    CGI ではリクエストのたびに全ルール分のコストがかかる。API は url_for を使わないので後回しにする。
+    Werkzeug の非公開メソッド Rule._compile_builder を置き換えるので、lazy_build_supported() で
+    想定どおりのときだけ使う（requirements.txt の Werkzeug のバージョン範囲で確認済み）。
+    """
+
+    def _compile_builder(self, append_unknown: bool = True):
+        compiled = None
+        compile_builder = super()._compile_builder
+
+        def build(rule, *args, **kwargs):
+            nonlocal compiled
+            if compiled is None:
+                compiled = compile_builder(append_unknown)
+            return compiled(rule, *args, **kwargs)
+
+        return build
+
+    @staticmethod
+    def lazy_build_supported() -> bool:
+        """Rule._compile_builder(append_unknown) があるか（なければ Werkzeug の既定のルールを使う）"""
+        compile_builder = getattr(Rule, '_compile_builder', None)
+        code = getattr(compile_builder, '__code__', None)
+        return code is not None and code.co_varnames[:code.co_argcount] == ('self', 'append_unknown')
+
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+if LazyBuildRule.lazy_build_supported():
+    app.url_rule_class = LazyBuildRule
+# /l/<リーグ名>/... とリーグのホスト名を振り分ける（MAHJONG_LEAGUES_DIR）
+app.wsgi_app = leagues.LeagueMiddleware(app.wsgi_app)
 
 @app.after_request
 def after_request(response):
@@ -43,21 +111,182 @@ def after_request(response):
 def static_files(filename):
     return send_from_directory(app.static_folder, filename)
 
+@app.route('/static/data/<path:filename>')
+def static_data_files(filename):
+    """書き出した静的JSON（リーグのパス・ホスト名ではそのリーグのもの）"""
+    return send_from_directory(static_data_dir(), filename)
+
+# ==================== Leagues ====================
+
+def current_league() -> Optional[leagues.League]:
+    """現在のリクエスト（またはジョブ）のリーグ。リーグなしなら None"""
+    return g.get('_league') if has_app_context() else None
+
+def current_database() -> str:
+    """現在のリーグのデータベースのファイル名（リーグなしなら DATABASE）"""
+    league = current_league()
+    return league.database if league is not None else DATABASE
+
+@contextmanager
+def league_context(league: Optional[leagues.League]):
+    """リクエストの外（ジョブ・SSE 配信）で、ブロック内の処理をそのリーグのデータベースに対して行う"""
+    with app.app_context():
+        g._league = league
+        yield
+
+def connect_db(database: Optional[str] = None, check_same_thread: bool = True) -> sqlite3.Connection:
+    """新しいデータベース接続を開く（アーカイブ済みシーズンも all_* ビューから読める）"""
+    database = database or current_database()
+    db = archive.connect(archive.file_uri(database), archive.archive_dir(database),
+                         check_same_thread=check_same_thread)
+    db.execute('PRAGMA foreign_keys = ON')
+    db.row_factory = sqlite3.Row
+    return db
+
+# プロセス内で開いているリーグ（接続のプールを持ち、使われていないものから解放する）
+league_registry = leagues.LeagueRegistry(lambda database: connect_db(database, check_same_thread=False))
+
+def open_league(name: Optional[str]) -> Optional[leagues.League]:
+    """名前でリーグを開く（None は従来の DATABASE。ジョブやコマンドラインの --league で使う）"""
+    if name is None:
+        return None
+    league = league_registry.get(name)
+    if league is None:
+        raise ValueError(f'League not found: {name}')
+    return league
+
+@app.before_request
+def select_league():
+    """LeagueMiddleware が決めたリーグを開く"""
+    name = request.environ.get(leagues.ENVIRON_KEY)
+    if name is None:
+        return None
+    league = league_registry.get(name)
+    if league is None:
+        return api_response(error=f'League not found: {name}', status=404)
+    g._league = league
+    return None
+
 def get_db() -> sqlite3.Connection:
-    """データベース接続を得る"""
+    """データベース接続を得る（リーグの接続はプールから借りる）"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE)
-        db.execute('PRAGMA foreign_keys = ON')
+        league = current_league()
+        db = g._database = league.pool.acquire() if league is not None else connect_db()
+    return db
+
+@contextmanager
+def _exclusive_lock(lock_path: str):
+    """プロセス間で排他するためのファイルロック"""
+    with open(lock_path, 'a') as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+        yield
+
+def snapshot_path() -> str:
+    """読み取り用スナップショットのファイル名"""
+    return os.path.splitext(current_database())[0] + '.snapshot.db'
+
+def publish_snapshot() -> str:
+    """ライブDBの一貫したコピーをバックアップAPIで作成し、アトミックに差し替える"""
+    path = snapshot_path()
+    directory = os.path.dirname(path)
+
+    # 複数プロセスの公開を直列化し、古いコピーが新しいコピーを上書きしないようにする
+    with _exclusive_lock(path + '.lock'):
+        fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', suffix='.db', dir=directory)
+        os.close(fd)
+        try:
+            source = sqlite3.connect(current_database())
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    return path
+
+def _ensure_snapshot() -> str:
+    """スナップショットがないか、ライブDBより古ければ公開し直す"""
+    path = snapshot_path()
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(current_database()):
+            return path
+    except OSError:
+        pass
+    return publish_snapshot()
+
+def get_read_db() -> sqlite3.Connection:
+    """読み取り専用の接続を得る
+
+    スナップショットモードでは不変のスナップショットを mode=ro&immutable=1 で開くため、
+    ロックや変更検知が一切発生せず、書き込みと競合しない。
+    """
+    if not SNAPSHOT_MODE:
+        return get_db()
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        uri = archive.file_uri(_ensure_snapshot()) + '?mode=ro&immutable=1'
+        db = g._read_database = archive.connect(uri, archive.archive_dir(current_database()))
         db.row_factory = sqlite3.Row
     return db
 
+@contextmanager
+def read_snapshot():
+    """ブロック内の読み取りをすべて同じ時点の状態から行う
+
+    スナップショットモードでは読み取り用の接続が不変なので何もしない。
+    それ以外では読み取りトランザクションを開始して共有ロックを取り、ブロックの終わりまで保持する。
+    """
+    if SNAPSHOT_MODE:
+        yield
+        return
+    db = get_read_db()
+    if db.in_transaction:
+        yield
+        return
+    db.execute('BEGIN')
+    db.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+    g._in_read_snapshot = True
+    try:
+        yield
+    finally:
+        g._in_read_snapshot = False
+        db.rollback()
+
+@app.after_request
+def publish_snapshot_after_write(response):
+    """書き込みが成功したらスナップショットを公開する"""
+    if (SNAPSHOT_MODE and request.method in ('POST', 'PUT', 'DELETE')
+            and request.path.startswith('/api/') and request.endpoint != 'batch_requests'
+            and response.status_code < 400):
+        try:
+            publish_snapshot()
+        except Exception:
+            app.logger.exception('Failed to publish snapshot')
+    return response
+
 @app.teardown_appcontext
 def close_connection(exception: Optional[BaseException]) -> None:
     """データベース接続を閉じる"""
     db = getattr(g, '_database', None)
     if db is not None:
-        db.close()
+        league = current_league()
+        if league is not None:
+            league.pool.release(db)
+        else:
+            db.close()
+    read_db = getattr(g, '_read_database', None)
+    if read_db is not None:
+        read_db.close()
 
 def json_serializer(obj):
     """JSON serializer for datetime objects"""
@@ -74,6 +303,967 @@ def api_response(data=None, error=None, status=200):
     }
     return jsonify(response_data), status
 
+def _get_path(obj, path):
+    """パスの値（途中が None・dict 以外・キーなしなら None）"""
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+def _missing_rows(rows, path):
+    """親は dict なのにパスのキーがない行の番号（None の値とは区別する）"""
+    missing = []
+    for index, row in enumerate(rows):
+        parent = _get_path(row, path[:-1])
+        if isinstance(parent, dict) and path[-1] not in parent:
+            missing.append(index)
+    return missing
+
+def _is_nested_list(rows, key):
+    """フィールドがオブジェクトの配列（例: ゲームのresults）かどうか"""
+    for row in rows:
+        value = row.get(key)
+        if isinstance(value, list) and value:
+            return all(isinstance(item, dict) for item in value)
+    return False
+
+def _columnar_schema(values, prefix, fields, objects):
+    """全行のキーの和集合から葉のパスを最初に現れた順に集める
+
+    どれかの行で空でない dict になっているパスはオブジェクトとして展開し、
+    ほかの行で None・キーなしになっていれば objects に加える（その行では null に戻す）。
+    """
+    keys = {}
+    for value in values:
+        if isinstance(value, dict):
+            keys.update(dict.fromkeys(value))
+    for key in keys:
+        path = prefix + (key,)
+        children = [value.get(key) if isinstance(value, dict) else None for value in values]
+        if any(isinstance(child, dict) and child for child in children):
+            if not all(isinstance(child, dict) for child in children):
+                objects.append(path)
+            _columnar_schema(children, path, fields, objects)
+        else:
+            fields.append(path)
+
+def to_columnar(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """オブジェクトの配列を列指向形式（スキーマ＋フィールドごとの配列）に変換する
+
+    フィールド名はキーの配列（例: ["player", "id"]）で、全行のキーの和集合から作る。
+    行によって None・キーなしのオブジェクトは objects の present が false になり、
+    オブジェクトの配列は各行の要素数 (lengths。None なら null) を持つ入れ子の列指向データになる。
+    キーがない行は missing にパスごとの行番号を持つ。
+    クライアント側の decodeColumnar で元のオブジェクトに復元できる（キーなしの行にはキーを作らない）。
+    """
+    if not rows:
+        return {'format': 'columnar', 'length': 0, 'fields': [], 'columns': [], 'objects': [], 'nested': {},
+                'missing': []}
+
+    nested = {}
+    for key in dict.fromkeys(key for row in rows for key in row):
+        if _is_nested_list(rows, key):
+            lists = [row.get(key) if isinstance(row.get(key), list) else None for row in rows]
+            nested[key] = to_columnar([child for items in lists if items for child in items])
+            nested[key]['lengths'] = [len(items) if items is not None else None for items in lists]
+
+    fields, objects = [], []
+    _columnar_schema([{key: value for key, value in row.items() if key not in nested} for row in rows],
+                     (), fields, objects)
+    missing = []
+    for path in [*objects, *fields, *((key,) for key in nested)]:
+        indexes = _missing_rows(rows, path)
+        if indexes:
+            missing.append({'path': [str(key) for key in path], 'rows': indexes})
+    return {
+        'format': 'columnar',
+        'length': len(rows),
+        # JSON のオブジェクトのキーは文字列になるので、int のキー（rankDistribution など）も文字列にする
+        'fields': [[str(key) for key in path] for path in fields],
+        'columns': [[_get_path(row, path) for row in rows] for path in fields],
+        'objects': [{'path': [str(key) for key in path], 'present': [isinstance(_get_path(row, path), dict) for row in rows]}
+                    for path in objects],
+        'nested': nested,
+        'missing': missing
+    }
+
+def rows_response(rows: List[Dict[str, Any]]):
+    """行データのAPIレスポンス（?format=columnar 指定時は列指向形式）"""
+    if request.args.get('format') == 'columnar':
+        return api_response(to_columnar(rows))
+    return api_response(rows)
+
+# ==================== Standings ====================
+
+# ポイントの精度（小数点以下の桁数）。素点（整数）/ 1000 + ウマ（整数）なので小数点以下3桁で表せる。
+# 浮動小数点の合計・差分の誤差（10.400000000000002 など）はこの桁で丸める
+POINTS_DECIMALS = 3
+
+# 順位表の集計列（列名 -> game_results から集計するSQL式）
+STANDINGS_AGGREGATES = {
+    'games_played': 'COUNT(gr.id)',
+    'total_points': f'ROUND(SUM(gr.calculated_points), {POINTS_DECIMALS})',
+    'average_points': 'AVG(gr.calculated_points)',
+    'average_raw_score': 'AVG(gr.raw_score)',
+    'average_rank': 'AVG(gr.rank)',
+    'best_raw_score': 'MAX(gr.raw_score)',
+    'wins': 'SUM(CASE WHEN gr.rank = 1 THEN 1 ELSE 0 END)',
+    'second_places': 'SUM(CASE WHEN gr.rank = 2 THEN 1 ELSE 0 END)',
+    'third_places': 'SUM(CASE WHEN gr.rank = 3 THEN 1 ELSE 0 END)',
+    'fourth_places': 'SUM(CASE WHEN gr.rank = 4 THEN 1 ELSE 0 END)',
+    'top_two_finishes': 'SUM(CASE WHEN gr.rank <= 2 THEN 1 ELSE 0 END)',
+    'avoid_last_finishes': 'SUM(CASE WHEN gr.rank < 4 THEN 1 ELSE 0 END)',
+    'total_agari': 'SUM(COALESCE(gr.agari_count, 0))',
+    'total_riichi': 'SUM(COALESCE(gr.riichi_count, 0))',
+    'total_houjuu': 'SUM(COALESCE(gr.houjuu_count, 0))',
+    'total_furo': 'SUM(COALESCE(gr.furo_count, 0))',
+    'total_hands': 'SUM(COALESCE(g.total_hands_in_game, 0))',
+}
+
+def _cumulative_delta(column: str) -> str:
+    return f'(hi.{column} - COALESCE(lo.{column}, 0))'
+
+# 同じ集計列を累計テーブルの差分 cum(end) - cum(start-1) から求めるSQL式
+STANDINGS_CUMULATIVE_AGGREGATES = {
+    'games_played': _cumulative_delta('cum_games'),
+    'total_points': f"ROUND({_cumulative_delta('cum_points')}, {POINTS_DECIMALS})",
+    'average_points': f"ROUND({_cumulative_delta('cum_points')}, {POINTS_DECIMALS}) / {_cumulative_delta('cum_games')}",
+    'average_raw_score': f"CAST({_cumulative_delta('cum_raw_score')} AS REAL) / {_cumulative_delta('cum_games')}",
+    'average_rank': f"CAST({_cumulative_delta('cum_rank')} AS REAL) / {_cumulative_delta('cum_games')}",
+    # 最高素点は差分で求められないため、期間内の日別集計の最大値を使う
+    'best_raw_score': '''(
+        SELECT MAX(r.best_raw_score) FROM daily_player_stats r
+        WHERE r.player_id = p.id AND r.game_date BETWEEN :start_date AND :end_date
+    )''',
+    'wins': _cumulative_delta('cum_wins'),
+    'second_places': _cumulative_delta('cum_second_places'),
+    'third_places': _cumulative_delta('cum_third_places'),
+    'fourth_places': _cumulative_delta('cum_fourth_places'),
+    'top_two_finishes': f"{_cumulative_delta('cum_wins')} + {_cumulative_delta('cum_second_places')}",
+    'avoid_last_finishes': f"{_cumulative_delta('cum_games')} - {_cumulative_delta('cum_fourth_places')}",
+    'total_agari': _cumulative_delta('cum_agari'),
+    'total_riichi': _cumulative_delta('cum_riichi'),
+    'total_houjuu': _cumulative_delta('cum_houjuu'),
+    'total_furo': _cumulative_delta('cum_furo'),
+    'total_hands': _cumulative_delta('cum_hands'),
+}
+
+# 並び順と件数判定のため常に集計する列
+STANDINGS_BASE_AGGREGATES = ('games_played', 'total_points', 'average_points')
+
+def _rate(numerator, denominator):
+    return numerator / denominator if denominator > 0 else 0
+
+# 出力フィールド -> (必要な集計列, 値の計算)
+STANDINGS_FIELDS = {
+    'gamesPlayed': (('games_played',), lambda s: s['games_played']),
+    'totalPoints': (('total_points',), lambda s: s['total_points']),
+    'averagePoints': (('average_points',), lambda s: s['average_points']),
+    'averageRawScore': (('average_raw_score',), lambda s: s['average_raw_score']),
+    'averageRank': (('average_rank',), lambda s: s['average_rank']),
+    'bestRawScore': (('best_raw_score',),
+                     lambda s: s['best_raw_score'] if s['best_raw_score'] is not None else 0),
+    'rankDistribution': (('wins', 'second_places', 'third_places', 'fourth_places'),
+                         lambda s: {1: s['wins'], 2: s['second_places'],
+                                    3: s['third_places'], 4: s['fourth_places']}),
+    'winRate': (('wins', 'games_played'), lambda s: _rate(s['wins'], s['games_played'])),
+    'secondPlaceRate': (('second_places', 'games_played'),
+                        lambda s: _rate(s['second_places'], s['games_played'])),
+    'thirdPlaceRate': (('third_places', 'games_played'),
+                       lambda s: _rate(s['third_places'], s['games_played'])),
+    'fourthPlaceRate': (('fourth_places', 'games_played'),
+                        lambda s: _rate(s['fourth_places'], s['games_played'])),
+    'rentaiRate': (('top_two_finishes', 'games_played'),
+                   lambda s: _rate(s['top_two_finishes'], s['games_played'])),
+    'rasuKaihiRate': (('avoid_last_finishes', 'games_played'),
+                      lambda s: _rate(s['avoid_last_finishes'], s['games_played'])),
+    'totalAgariCount': (('total_agari',), lambda s: s['total_agari']),
+    'totalRiichiCount': (('total_riichi',), lambda s: s['total_riichi']),
+    'totalHoujuuCount': (('total_houjuu',), lambda s: s['total_houjuu']),
+    'totalFuroCount': (('total_furo',), lambda s: s['total_furo']),
+    'totalHandsPlayedIn': (('total_hands',), lambda s: s['total_hands']),
+    'agariRatePerHand': (('total_agari', 'total_hands'),
+                         lambda s: _rate(s['total_agari'], s['total_hands'])),
+    'riichiRatePerHand': (('total_riichi', 'total_hands'),
+                          lambda s: _rate(s['total_riichi'], s['total_hands'])),
+    'houjuuRatePerHand': (('total_houjuu', 'total_hands'),
+                          lambda s: _rate(s['total_houjuu'], s['total_hands'])),
+    'furoRatePerHand': (('total_furo', 'total_hands'),
+                        lambda s: _rate(s['total_furo'], s['total_hands'])),
+    # 直近10ゲームのポイントは集計とは別のクエリで取得する
+    'lastTenGamesPoints': ((), None),
+    # 連続記録は player_streaks から取得する（期間の指定にかかわらず現在の値）
+    'streaks': ((), None),
+}
+
+def requested_standings_fields() -> List[str]:
+    """?fields= で指定された順位表の出力フィールド（未指定なら全フィールド）"""
+    fields_param = request.args.get('fields')
+    if not fields_param:
+        return list(STANDINGS_FIELDS)
+
+    fields = [field.strip() for field in fields_param.split(',') if field.strip()]
+    unknown = [field for field in fields if field != 'player' and field not in STANDINGS_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown standings fields: {", ".join(unknown)}')
+    return [field for field in STANDINGS_FIELDS if field in fields]
+
+def _last_ten_games_points(cur, where: str, params: tuple) -> Dict[str, List[float]]:
+    """プレイヤーごとの直近10ゲームのポイントを1クエリで取得する"""
+    rows = cur.execute(f'''
+        SELECT player_id, calculated_points
+        FROM (
+            SELECT gr.player_id, gr.calculated_points,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY gr.player_id
+                       ORDER BY g.game_date DESC, g.recorded_date DESC
+                   ) AS recent_rank
+            FROM all_game_results gr
+            JOIN all_games g ON gr.game_id = g.id
+            WHERE {where or '1 = 1'}
+        )
+        WHERE recent_rank <= 10
+        ORDER BY player_id, recent_rank
+    ''', params).fetchall()
+
+    points = {}
+    for row in rows:
+        points.setdefault(row['player_id'], []).append(row['calculated_points'])
+    return points
+
+
+def query_standings(cur, fields: List[str], start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """順位表を計算する
+
+    fields で要求されたフィールドに必要な集計列だけをSQLで計算し、
+    直近10ゲームのポイントも要求された場合にのみ取得する。
+    日付を指定した場合は、累計テーブルからプレイヤーごとに2行（end_date 以前と
+    start_date より前の最新の累計）を引いて差分を取る。start_date を省略すると
+    end_date 時点の累計になる。
+    STANDINGS_ENGINE なら同じ内容をメモリ上の列から計算する。
+    """
+    if STANDINGS_ENGINE:
+        import standings_engine
+        if standings_engine.available():
+            return standings_engine.query_standings(
+                standings_engine.get_engine(current_database()), cur, current_revision(cur), fields, STANDINGS_FIELDS,
+                start_date, end_date)
+
+    aggregates = list(STANDINGS_BASE_AGGREGATES)
+    for field in fields:
+        for column in STANDINGS_FIELDS[field][0]:
+            if column not in aggregates:
+                aggregates.append(column)
+
+    if start_date is not None or end_date is not None:
+        params = {'start_date': start_date or '', 'end_date': end_date or '9999-12-31'}
+        select_sql = ',\n'.join(f'{STANDINGS_CUMULATIVE_AGGREGATES[column]} AS {column}' for column in aggregates)
+        standings = cur.execute(f'''
+            SELECT
+                p.id,
+                p.name,
+                p.avatar_url,
+                {select_sql}
+            FROM players p
+            JOIN player_cumulative_stats hi ON hi.player_id = p.id AND hi.game_date = (
+                SELECT MAX(game_date) FROM player_cumulative_stats
+                WHERE player_id = p.id AND game_date <= :end_date
+            )
+            LEFT JOIN player_cumulative_stats lo ON lo.player_id = p.id AND lo.game_date = (
+                SELECT MAX(game_date) FROM player_cumulative_stats
+                WHERE player_id = p.id AND game_date < :start_date
+            )
+            WHERE hi.cum_games > COALESCE(lo.cum_games, 0)
+            ORDER BY total_points DESC, average_points DESC
+        ''', params).fetchall()
+        where = 'g.game_date BETWEEN :start_date AND :end_date'
+    else:
+        # ゲーム単位の列（局数）がなければ games の結合を省く
+        join_games = 'total_hands' in aggregates
+        select_sql = ',\n'.join(f'{STANDINGS_AGGREGATES[column]} AS {column}' for column in aggregates)
+        standings = cur.execute(f'''
+            SELECT
+                p.id,
+                p.name,
+                p.avatar_url,
+                {select_sql}
+            FROM all_game_results gr
+            JOIN players p ON p.id = gr.player_id
+            {'JOIN all_games g ON gr.game_id = g.id' if join_games else ''}
+            GROUP BY p.id, p.name, p.avatar_url
+            ORDER BY total_points DESC, average_points DESC
+        ''').fetchall()
+        where, params = '', ()
+
+    last_ten = {}
+    if 'lastTenGamesPoints' in fields:
+        last_ten = _last_ten_games_points(cur, where, params)
+    player_streaks = streaks.query_player_streaks(cur) if 'streaks' in fields else {}
+
+    standings_data = []
+    for stat in standings:
+        row = {
+            'player': {
+                'id': stat['id'],
+                'name': stat['name'],
+                'avatarUrl': stat['avatar_url']
+            }
+        }
+        for field in fields:
+            if field == 'lastTenGamesPoints':
+                row[field] = last_ten.get(stat['id'], [])
+            elif field == 'streaks':
+                row[field] = player_streaks.get(stat['id'], streaks.EMPTY_STREAKS)
+            else:
+                row[field] = STANDINGS_FIELDS[field][1](stat)
+        standings_data.append(row)
+
+    return standings_data
+
+# ==================== Players ====================
+
+def query_players(cur) -> List[Dict[str, Any]]:
+    """全プレイヤー（名前順、連続記録つき）"""
+    player_streaks = streaks.query_player_streaks(cur)
+    return [{
+        'id': player['id'],
+        'name': player['name'],
+        'avatarUrl': player['avatar_url'],
+        'created_date': player['created_date'],
+        'streaks': player_streaks.get(player['id'], streaks.EMPTY_STREAKS)
+    } for player in cur.execute('SELECT * FROM players ORDER BY name').fetchall()]
+
+# ==================== Games ====================
+
+def query_games(cur, where: str = '', params: tuple = ()) -> List[Dict[str, Any]]:
+    """ゲーム一覧（結果・シーズン名つき）を取得する。where は games (g) に対する絞り込み条件"""
+    games = cur.execute(f'''
+        SELECT g.id, g.season_id, g.game_date, g.round_name, g.total_hands_in_game, g.recorded_date,
+               s.name AS season_name,
+               json_group_array(json_object(
+                   'playerId', gr.player_id,
+                   'rawScore', gr.raw_score,
+                   'rank', gr.rank,
+                   'calculatedPoints', gr.calculated_points,
+                   'agariCount', gr.agari_count,
+                   'riichiCount', gr.riichi_count,
+                   'houjuuCount', gr.houjuu_count,
+                   'furoCount', gr.furo_count
+               )) AS results
+        FROM all_games g
+        LEFT JOIN seasons s ON g.season_id = s.id
+        LEFT JOIN all_game_results gr ON g.id = gr.game_id
+        {f'WHERE {where}' if where else ''}
+        GROUP BY g.id
+        ORDER BY g.game_date DESC, g.recorded_date DESC
+    ''', params).fetchall()
+
+    games_data = []
+    for game in games:
+        results = json.loads(game['results']) if game['results'] else []
+        # None値を含む結果を除外（アーカイブと合わせて読むと並びが変わるため順位順にする）
+        results = sorted((r for r in results if r.get('playerId')), key=lambda r: r['rank'])
+
+        games_data.append({
+            'id': game['id'],
+            'seasonId': game['season_id'],
+            'seasonName': game['season_name'],
+            'gameDate': game['game_date'],
+            'roundName': game['round_name'],
+            'totalHandsInGame': game['total_hands_in_game'],
+            'recordedDate': game['recorded_date'],
+            'results': results
+        })
+
+    return games_data
+
+# ==================== Aggregate cache ====================
+
+def current_revision(cur) -> int:
+    """データの版（変更ログの最新 seq）。ゲーム・プレイヤーが変更されるたびに増える"""
+    return cur.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+
+# 複数のワーカープロセス間でも同じ集計の計算を1回にまとめる（ファイルロックで排他する）
+AGGREGATE_PROCESS_LOCKS = os.environ.get('MAHJONG_AGGREGATE_PROCESS_LOCKS') == '1'
+AGGREGATE_LOCK_STRIPES = 16
+# 他のスレッドの計算を待つ最大秒数（超えたら自分で計算する）
+AGGREGATE_WAIT_SECONDS = 30
+
+class _AggregateFlight:
+    """計算中の集計。同じキー・版を要求したスレッドは完了を待ち、シリアライズ済みの結果を使う"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.payload: Optional[str] = None
+
+_aggregate_flights: Dict[tuple, _AggregateFlight] = {}
+_aggregate_flights_lock = threading.Lock()
+
+def _load_cached_aggregate(cur, cache_key: str, revision: int) -> Optional[str]:
+    cached = cur.execute('''
+        SELECT payload FROM aggregate_cache WHERE cache_key = ? AND revision = ?
+    ''', (cache_key, revision)).fetchone()
+    return cached['payload'] if cached else None
+
+@contextmanager
+def _aggregate_process_lock(cache_key: str):
+    """同じ集計を計算する他のプロセスと排他する（キーのハッシュで選んだロックファイル）"""
+    lock_dir = os.path.splitext(current_database())[0] + '.locks'
+    os.makedirs(lock_dir, exist_ok=True)
+    stripe = zlib.crc32(cache_key.encode('utf-8')) % AGGREGATE_LOCK_STRIPES
+    with _exclusive_lock(os.path.join(lock_dir, f'aggregate-{stripe}.lock')):
+        yield
+
+def _compute_aggregate(cur, cache_key: str, revision: int, compute) -> str:
+    """集計を計算して aggregate_cache に保存し、シリアライズした結果を返す"""
+    if getattr(g, '_in_read_snapshot', False):
+        # 保存するとコミットで読み取りスナップショットが終わってしまうため、次の通常の読み取りに任せる
+        return json.dumps(compute(cur), ensure_ascii=False, separators=(',', ':'))
+
+    with (_aggregate_process_lock(cache_key) if AGGREGATE_PROCESS_LOCKS else nullcontext()):
+        con = get_db()
+        if AGGREGATE_PROCESS_LOCKS:
+            # ロックを待つ間に他のプロセスが保存していればそれを使う
+            payload = _load_cached_aggregate(con.cursor(), cache_key, revision)
+            if payload is not None:
+                return payload
+
+        payload = json.dumps(compute(cur), ensure_ascii=False, separators=(',', ':'))
+        try:
+            # 計算した版が書き込み先の最新でなければ保存しない
+            con.execute('''
+                INSERT OR REPLACE INTO aggregate_cache (cache_key, revision, payload)
+                SELECT ?, ?, ?
+                WHERE (SELECT COALESCE(MAX(seq), 0) FROM change_log) = ?
+            ''', (cache_key, revision, payload, revision))
+            con.commit()
+        except sqlite3.Error:
+            app.logger.exception('Failed to store aggregate cache')
+        return payload
+
+def cached_aggregate(cache_key: str, compute):
+    """集計結果を aggregate_cache に保存して使い回す
+
+    キャッシュは変更ログへの記録時にトリガーで消えるが、スナップショットからの
+    読み取りでも正しいように、保存時の版が現在の版と一致する場合だけ使う。
+    キャッシュがないときに同じ集計が同時に要求されても、計算は1回だけ行い結果を共有する
+    （同じプロセスのスレッド間。AGGREGATE_PROCESS_LOCKS ならプロセス間も）。
+    """
+    cur = get_read_db().cursor()
+    revision = current_revision(cur)
+    payload = _load_cached_aggregate(cur, cache_key, revision)
+    if payload is not None:
+        return json.loads(payload)
+
+    flight_key = (current_database(), cache_key, revision)
+    with _aggregate_flights_lock:
+        flight = _aggregate_flights.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _aggregate_flights[flight_key] = _AggregateFlight()
+
+    if not leader:
+        if flight.done.wait(AGGREGATE_WAIT_SECONDS) and flight.payload is not None:
+            return json.loads(flight.payload)
+        # 計算が失敗したか時間がかかりすぎているので自分で計算する
+        return json.loads(_compute_aggregate(cur, cache_key, revision, compute))
+
+    try:
+        flight.payload = _compute_aggregate(cur, cache_key, revision, compute)
+    finally:
+        with _aggregate_flights_lock:
+            _aggregate_flights.pop(flight_key, None)
+        flight.done.set()
+    return json.loads(flight.payload)
+
+def aggregate_filters() -> Dict[str, Any]:
+    """集計APIの共通の絞り込み条件（season_id, start_date, end_date）"""
+    filters = {}
+    season_id = request.args.get('season_id')
+    if season_id:
+        try:
+            filters['season_id'] = int(season_id)
+        except ValueError:
+            raise ValueError('season_id must be an integer')
+    for name in ('start_date', 'end_date'):
+        if request.args.get(name):
+            filters[name] = request.args.get(name)
+    return filters
+
+def games_filter_sql(filters: Dict[str, Any]) -> str:
+    """絞り込み条件を games (g) に対する条件にする（filters を名前付きパラメータとして渡す）"""
+    conditions = []
+    if 'season_id' in filters:
+        conditions.append('g.season_id = :season_id')
+    if 'start_date' in filters:
+        conditions.append('g.game_date >= :start_date')
+    if 'end_date' in filters:
+        conditions.append('g.game_date <= :end_date')
+    return ' AND '.join(conditions)
+
+# ==================== Head-to-head ====================
+
+def query_head_to_head(cur, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """同卓したプレイヤーの組ごとの対戦成績
+
+    game_results を game_id で自己結合し、1回の集計で全ての組を求める。
+    各組は ID の小さい方を playerA とし、差はすべて playerA から見た値。
+    """
+    where = games_filter_sql(filters)
+    pairs = cur.execute(f'''
+        SELECT
+            a.player_id AS player_a,
+            b.player_id AS player_b,
+            COUNT(*) AS shared_games,
+            AVG(a.rank - b.rank) AS average_rank_difference,
+            SUM(a.calculated_points - b.calculated_points) AS point_differential,
+            SUM(CASE WHEN a.rank < b.rank THEN 1 ELSE 0 END) AS player_a_finished_above
+        FROM all_game_results a
+        JOIN all_game_results b ON b.game_id = a.game_id AND a.player_id < b.player_id
+        {f'JOIN all_games g ON g.id = a.game_id WHERE {where}' if where else ''}
+        GROUP BY a.player_id, b.player_id
+    ''', filters).fetchall()
+
+    players = {
+        player['id']: {'id': player['id'], 'name': player['name'], 'avatarUrl': player['avatar_url']}
+        for player in cur.execute('SELECT id, name, avatar_url FROM players').fetchall()
+    }
+
+    return [{
+        'playerA': players.get(pair['player_a']),
+        'playerB': players.get(pair['player_b']),
+        'sharedGames': pair['shared_games'],
+        'averageRankDifference': round(pair['average_rank_difference'], 3),
+        'pointDifferential': round(pair['point_differential'], 1),
+        'averagePointDifferential': round(pair['point_differential'] / pair['shared_games'], 1),
+        'playerAFinishedAbove': pair['player_a_finished_above']
+    } for pair in pairs]
+
+# ==================== Trends ====================
+
+# ローリング平均の既定のゲーム数と上限
+TRENDS_DEFAULT_WINDOW = 10
+TRENDS_MAX_WINDOW = 100
+
+def query_trends(cur, filters: Dict[str, Any], window: int) -> List[Dict[str, Any]]:
+    """プレイヤーごとのゲーム単位の推移（累計ポイント・シーズン内累計・直近 window ゲームの平均）
+
+    ウィンドウ関数で全プレイヤー分を1回のクエリで求め、プレイヤー・ゲーム順に並んだ結果を
+    1回なめてプレイヤーごとにまとめる。
+    """
+    players = {
+        player['id']: {'id': player['id'], 'name': player['name'], 'avatarUrl': player['avatar_url']}
+        for player in cur.execute('SELECT id, name, avatar_url FROM players').fetchall()
+    }
+
+    where = games_filter_sql(filters)
+    conditions = [where] if where else []
+    if 'player_id' in filters:
+        conditions.append('gr.player_id = :player_id')
+    rows = cur.execute(f'''
+        SELECT
+            gr.player_id, g.id AS game_id, g.season_id, g.game_date,
+            gr.calculated_points, gr.rank,
+            ROW_NUMBER() OVER history AS game_number,
+            SUM(gr.calculated_points) OVER (history ROWS UNBOUNDED PRECEDING) AS cumulative_points,
+            ROW_NUMBER() OVER season AS season_game_number,
+            SUM(gr.calculated_points) OVER (season ROWS UNBOUNDED PRECEDING) AS season_cumulative_points,
+            AVG(gr.calculated_points) OVER (history ROWS {window - 1} PRECEDING) AS rolling_average_points,
+            AVG(gr.rank) OVER (history ROWS {window - 1} PRECEDING) AS rolling_average_rank
+        FROM all_game_results gr
+        JOIN all_games g ON gr.game_id = g.id
+        {f'WHERE {" AND ".join(conditions)}' if conditions else ''}
+        WINDOW
+            history AS (PARTITION BY gr.player_id ORDER BY g.game_date, g.recorded_date, g.id),
+            season AS (PARTITION BY gr.player_id, g.season_id ORDER BY g.game_date, g.recorded_date, g.id)
+        ORDER BY gr.player_id, game_number
+    ''', filters)
+
+    trends = []
+    for row in rows:
+        if not trends or trends[-1]['player']['id'] != row['player_id']:
+            trends.append({
+                'player': players.get(row['player_id'], {'id': row['player_id']}),
+                'window': window,
+                'games': []
+            })
+        trends[-1]['games'].append({
+            'gameId': row['game_id'],
+            'seasonId': row['season_id'],
+            'gameDate': row['game_date'],
+            'points': row['calculated_points'],
+            'rank': row['rank'],
+            'gameNumber': row['game_number'],
+            'cumulativePoints': round(row['cumulative_points'], 1),
+            'seasonGameNumber': row['season_game_number'],
+            'seasonCumulativePoints': round(row['season_cumulative_points'], 1),
+            'rollingAveragePoints': round(row['rolling_average_points'], 1),
+            'rollingAverageRank': round(row['rolling_average_rank'], 3)
+        })
+
+    for trend in trends:
+        latest = trend['games'][-1]
+        trend['gameCount'] = latest['gameNumber']
+        trend['totalPoints'] = latest['cumulativePoints']
+        trend['rollingAveragePoints'] = latest['rollingAveragePoints']
+        trend['rollingAverageRank'] = latest['rollingAverageRank']
+    trends.sort(key=lambda trend: trend['player'].get('name') or '')
+    return trends
+
+# ==================== Live standings ====================
+
+# SSE の再接続待ち時間・ハートビート間隔・他プロセスの書き込みを確認する間隔
+SSE_RETRY_MILLISECONDS = 3000
+SSE_HEARTBEAT_SECONDS = 15
+SSE_POLL_SECONDS = 1.0
+# 保持する配信イベント数
+STANDINGS_EVENTS_KEPT = 20
+
+# 同一プロセス内の購読者を書き込み直後に起こすための条件変数
+_standings_event_condition = threading.Condition()
+# 同じプロセスの購読者が同じ版の順位表を重ねて計算しないようにする
+_standings_publish_lock = threading.Lock()
+
+def notify_standings_subscribers() -> None:
+    """同じプロセスの購読者を起こす（順位表は購読者が読むときに計算される）"""
+    with _standings_event_condition:
+        _standings_event_condition.notify_all()
+
+def publish_standings_event(con: sqlite3.Connection) -> Optional[int]:
+    """最新の順位表を計算して配信イベントとして保存する
+
+    他のプロセスが同じ版以降のイベントを先に保存していれば保存せず None を返す。
+    """
+    cur = con.cursor()
+    change_seq = current_revision(cur)
+    standings_data = query_standings(cur, list(STANDINGS_FIELDS))
+    payload = json.dumps({'changeSeq': change_seq, 'standings': standings_data},
+                         ensure_ascii=False, separators=(',', ':'))
+
+    cur.execute('''
+        INSERT INTO standings_events (change_seq, payload)
+        SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM standings_events WHERE change_seq >= ?)
+    ''', (change_seq, payload, change_seq))
+    event_id = cur.lastrowid if cur.rowcount else None
+    if event_id is not None:
+        cur.execute('DELETE FROM standings_events WHERE id <= ?', (event_id - STANDINGS_EVENTS_KEPT,))
+    con.commit()
+    return event_id
+
+def latest_standings_event(con: sqlite3.Connection, last_event_id: int):
+    """last_event_id より新しい最新の配信イベント（なければ None）
+
+    書き込みのたびに順位表を計算すると購読者がいなくても書き込みが遅くなるので、
+    購読者が読むときに、最新の版のイベントがまだなければここで計算して保存する。
+    """
+    change_seq = current_revision(con.cursor())
+    latest = con.execute('SELECT MAX(change_seq) FROM standings_events').fetchone()[0]
+    if latest is None or latest < change_seq:
+        with _standings_publish_lock:
+            latest = con.execute('SELECT MAX(change_seq) FROM standings_events').fetchone()[0]
+            if latest is None or latest < change_seq:
+                publish_standings_event(con)
+    # 順位表は毎回全体を配信するので、溜まっていても最新の1件だけ送ればよい
+    return con.execute('''
+        SELECT id, payload FROM standings_events
+        WHERE id > ? ORDER BY id DESC LIMIT 1
+    ''', (last_event_id,)).fetchone()
+
+def _standings_stream(last_event_id: int, league: Optional[leagues.League] = None):
+    """順位表の SSE ストリーム（last_event_id より新しいイベントから配信）
+
+    応答の本文はリクエストのコンテキストが終わってから生成されるので、リーグは引数で受け取る。
+    """
+    con = connect_db(league.database if league is not None else DATABASE)
+    try:
+        yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+        last_sent = time.monotonic()
+        while True:
+            with league_context(league):
+                event = latest_standings_event(con, last_event_id)
+
+            if event:
+                last_event_id = event['id']
+                yield f'id: {event["id"]}\nevent: standings\ndata: {event["payload"]}\n\n'
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT_SECONDS:
+                yield ': heartbeat\n\n'
+                last_sent = time.monotonic()
+
+            with _standings_event_condition:
+                _standings_event_condition.wait(SSE_POLL_SECONDS)
+    finally:
+        con.close()
+
+# ==================== Static artifacts ====================
+
+def static_data_dir() -> str:
+    """静的JSONの書き出し先（リーグでは static/data/leagues/<リーグ名>/）"""
+    league = current_league()
+    if league is None:
+        return STATIC_DATA_DIR
+    return os.path.join(STATIC_DATA_DIR, 'leagues', league.name)
+
+def _write_static_artifact(relative_path: str, data, change_seq: int) -> None:
+    """APIと同じ形式のJSONを一時ファイル経由でアトミックに書き出す"""
+    path = os.path.join(static_data_dir(), relative_path)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'success': True, 'data': data, 'error': None, 'changeSeq': change_seq},
+                      f, ensure_ascii=False, separators=(',', ':'))
+        # mkstemp は 0600 で作成するため、Webサーバーが読めるようにする
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def rebuild_static_artifacts(con: sqlite3.Connection, standings: bool = False,
+                             players: bool = False, season_ids=()) -> None:
+    """書き込みの影響を受けた静的JSONだけを作り直す
+
+    standings: 全シーズン累計とシーズンの順位表
+    players: プレイヤー一覧
+    season_ids: 指定シーズンのゲーム一覧と順位表（アクティブなシーズンか、既に書き出し済みのもの）
+    """
+    if not STATIC_ARTIFACTS:
+        return
+
+    data_dir = static_data_dir()
+    os.makedirs(data_dir, exist_ok=True)
+    # 同時に書き込まれても、ロックを取った時点の最新の状態で書き出す
+    with _exclusive_lock(os.path.join(data_dir, '.lock')):
+        cur = con.cursor()
+        # データと changeSeq を同じ時点の状態から読む
+        cur.execute('BEGIN')
+        try:
+            change_seq = cur.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+            active = cur.execute('SELECT id FROM seasons WHERE is_active = 1 LIMIT 1').fetchone()
+
+            def season_published(season_id, name):
+                return (active is not None and season_id == active['id']) or os.path.exists(
+                    os.path.join(data_dir, 'seasons', str(season_id), name))
+
+            standings_paths = []
+            if standings:
+                standings_paths.append('standings/all.json')
+                seasons_dir = os.path.join(data_dir, 'seasons')
+                existing = os.listdir(seasons_dir) if os.path.isdir(seasons_dir) else []
+                season_targets = {int(name) for name in existing if name.isdigit()}
+                if active is not None:
+                    season_targets.add(active['id'])
+                season_targets.update(season_ids)
+            else:
+                season_targets = set(season_ids)
+            standings_paths += [
+                f'seasons/{season_id}/standings.json' for season_id in sorted(season_targets)
+                if season_published(season_id, 'standings.json')
+            ]
+
+            if standings_paths:
+                # シーズンの順位表も全期間の累計（/api/seasons/<id>/standings と同じ内容）
+                standings_data = query_standings(cur, list(STANDINGS_FIELDS))
+                for path in standings_paths:
+                    _write_static_artifact(path, standings_data, change_seq)
+
+            for season_id in season_ids:
+                if season_published(season_id, 'games.json'):
+                    games_data = query_games(cur, 'g.season_id = ?', (season_id,))
+                    _write_static_artifact(f'seasons/{season_id}/games.json', games_data, change_seq)
+
+            if players:
+                _write_static_artifact('players.json', query_players(cur), change_seq)
+        finally:
+            con.rollback()
+
+def _rebuild_static_artifacts_safely(con: sqlite3.Connection, **kwargs) -> None:
+    try:
+        rebuild_static_artifacts(con, **kwargs)
+    except Exception:
+        app.logger.exception('Failed to rebuild static artifacts')
+
+def on_games_committed(con: sqlite3.Connection, season_id: int) -> None:
+    """ゲームの記録・更新・削除のコミット後に実行する後処理"""
+    notify_standings_subscribers()
+    # プレイヤー一覧も連続記録を含むので作り直す
+    # worker.py がなければ、リクエストからはレスポンスの後に実行する（ジョブの中ならそのまま作り直す）
+    if STATIC_ARTIFACTS and DEFER_STATIC_ARTIFACTS and (JOB_WORKER or has_request_context()):
+        try:
+            job_id = jobs.enqueue(con.cursor(), 'rebuild_static_artifacts', {'season_ids': [season_id]},
+                                  dedupe_key=f'rebuild_static_artifacts:{season_id}')
+            con.commit()
+        except Exception:
+            app.logger.exception('Failed to enqueue static artifacts rebuild')
+            return
+        after_this_request(lambda response: run_job_after_response(response, job_id))
+        return
+    _rebuild_static_artifacts_safely(con, standings=True, players=True, season_ids=(season_id,))
+
+# ==================== Jobs ====================
+
+# ポイントの再計算で1トランザクションに含めるゲーム数
+REPRICE_BATCH_SIZE = 200
+
+@jobs.register('reprice_season')
+def reprice_season_job(con: sqlite3.Connection, payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """シーズンの全ゲームのポイントを現在のリーグ設定で計算し直す
+
+    計算式はゲーム記録画面と同じ (素点 - 計算基準チップ数) / 1000 + 順位点。
+    値が変わるゲームだけを更新し、集計テーブルもそのゲームの分だけ更新する。
+    """
+    season_id = int(payload['season_id'])
+    cur = con.cursor()
+    settings = cur.execute('''
+        SELECT calculation_base_chip_count, uma_1st, uma_2nd, uma_3rd FROM league_settings WHERE season_id = ?
+    ''', (season_id,)).fetchone()
+    if not settings:
+        raise ValueError(f'League settings not found for season {season_id}')
+    points = {
+        'base': settings['calculation_base_chip_count'],
+        'uma_1st': settings['uma_1st'],
+        'uma_2nd': settings['uma_2nd'],
+        'uma_3rd': settings['uma_3rd'],
+        'uma_4th': -(settings['uma_1st'] + settings['uma_2nd'] + settings['uma_3rd']),
+    }
+    points_sql = '''(raw_score - :base) / 1000.0 + CASE rank
+        WHEN 1 THEN :uma_1st WHEN 2 THEN :uma_2nd WHEN 3 THEN :uma_3rd ELSE :uma_4th END'''
+
+    game_ids = [row[0] for row in cur.execute('''
+        SELECT id FROM games WHERE season_id = ? ORDER BY game_date, recorded_date, id
+    ''', (season_id,)).fetchall()]
+    updated = 0
+    for start in range(0, len(game_ids), REPRICE_BATCH_SIZE):
+        batch = game_ids[start:start + REPRICE_BATCH_SIZE]
+        cur.execute('BEGIN IMMEDIATE')
+        changed = [row[0] for row in cur.execute(f'''
+            SELECT DISTINCT game_id FROM game_results
+            WHERE game_id IN (SELECT value FROM json_each(:game_ids)) AND calculated_points != {points_sql}
+        ''', {**points, 'game_ids': json.dumps(batch)}).fetchall()]
+        keys = set()
+        for game_id in changed:
+            distributions.apply_game(cur, game_id, -1)
+            cur.execute(f'UPDATE game_results SET calculated_points = {points_sql} WHERE game_id = :game_id',
+                        {**points, 'game_id': game_id})
+            distributions.apply_game(cur, game_id, 1)
+            keys |= rollups.game_rollup_keys(cur, game_id)
+        rollups.refresh_rollups(cur, keys)
+        con.commit()
+        updated += len(changed)
+        report((start + len(batch)) / len(game_ids), f'{start + len(batch)}/{len(game_ids)} games')
+
+    if updated:
+        on_games_committed(con, season_id)
+    return {'seasonId': season_id, 'gameCount': len(game_ids), 'updatedGames': updated}
+
+@jobs.register('rebuild_aggregates')
+def rebuild_aggregates_job(con: sqlite3.Connection, payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """集計テーブル・検索用の名前・集計キャッシュをすべて作り直す"""
+    cur = con.cursor()
+    steps = (
+        ('rollups', rollups.rebuild_rollups),
+        ('histograms', distributions.rebuild_histograms),
+        ('streaks', streaks.rebuild_streaks),
+        ('player search', player_search.rebuild_index),
+        ('aggregate cache', lambda cur: cur.execute('DELETE FROM aggregate_cache')),
+    )
+    for index, (name, rebuild) in enumerate(steps):
+        cur.execute('BEGIN IMMEDIATE')
+        rebuild(cur)
+        con.commit()
+        report((index + 1) / len(steps), name)
+    _rebuild_static_artifacts_safely(con, standings=True, players=True)
+    return {'steps': [name for name, _ in steps]}
+
+@jobs.register('rebuild_static_artifacts')
+def rebuild_static_artifacts_job(con: sqlite3.Connection, payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """静的JSONを作り直す（MAHJONG_DEFER_STATIC_ARTIFACTS のときゲームの書き込みごとに登録される）"""
+    season_ids = tuple(payload.get('season_ids', ()))
+    rebuild_static_artifacts(con, standings=True, players=True, season_ids=season_ids)
+    return {'seasonIds': list(season_ids)}
+
+@jobs.register('archive_season')
+def archive_season_job(con: sqlite3.Connection, payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """終了したシーズンをアーカイブファイルに移す"""
+    database = current_database()
+    archive_con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    archive_con.execute('PRAGMA foreign_keys = ON')
+    try:
+        result = archive.archive_season(archive_con, int(payload['season_id']), archive.archive_dir(database))
+    finally:
+        archive_con.close()
+    return {'seasonId': result['seasonId'], 'gameCount': result['gameCount'], 'resultCount': result['resultCount']}
+
+@jobs.register('export_game_results')
+def export_game_results_job(con: sqlite3.Connection, payload: Dict[str, Any], report) -> Dict[str, Any]:
+    """ゲーム結果を分析用の Parquet / .npz に書き出す（export.py）"""
+    import export
+    result = export.export_game_results(con, payload.get('format'), season_id=payload.get('season_id'),
+                                        directory=export_dir())
+    return {key: value for key, value in result.items() if key != 'path'}
+
+def export_dir() -> str:
+    """エクスポートの置き場所（リーグではリーグのディレクトリの exports/）"""
+    import export
+    league = current_league()
+    if league is None:
+        return export.EXPORT_DIR
+    return os.path.join(os.path.dirname(league.database), 'exports')
+
+def run_job_inline(job_id: int) -> Optional[Dict[str, Any]]:
+    """worker.py がなければ（JOB_WORKER でなければ）、登録したジョブをこのリクエストの中で実行する
+
+    ジョブを登録したトランザクションをコミットしてから呼ぶこと。スナップショットは書き込みのリクエストの後に公開される。
+    """
+    if JOB_WORKER:
+        return None
+    database = current_database()
+    return jobs.run_next(lambda: connect_db(database), f'inline-{os.getpid()}', app.logger.info, job_id=job_id)
+
+def run_job_after_response(response, job_id: int):
+    """worker.py がなければ、登録したジョブをレスポンスを返し終えてから実行する
+
+    CGI では Web サーバーが標準出力の終わりまで待つので、標準出力を閉じてから実行する。
+    """
+    if JOB_WORKER:
+        return response
+    league = current_league()
+    run_once = request.environ.get('wsgi.run_once')
+
+    def run():
+        if run_once:
+            sys.stdout.flush()
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        with league_context(league):
+            try:
+                job = run_job_inline(job_id)
+                if job and job['status'] == 'succeeded' and SNAPSHOT_MODE:
+                    publish_snapshot()
+            except Exception:
+                app.logger.exception(f'Failed to run job {job_id}')
+
+    response.call_on_close(run)
+    return response
+
+def run_next_job(worker_id: str, log=print, league: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """キューの次のジョブを1つ実行する（worker.py から呼ぶ。league を指定するとそのリーグのキュー）"""
+    with league_context(open_league(league)):
+        # heartbeat は別のスレッドで接続を開くので、データベースを固定して渡す
+        database = current_database()
+        job = jobs.run_next(lambda: connect_db(database), worker_id, log)
+        if job and job['status'] == 'succeeded' and SNAPSHOT_MODE:
+            try:
+                publish_snapshot()
+            except Exception:
+                app.logger.exception('Failed to publish snapshot')
+    return job
+
 # ==================== Routes ====================
 
 @app.route('/')
@@ -81,7 +1271,8 @@ def index():
     """React アプリのエントリポイント"""
     # Flask のスクリプトルートを基にアプリケーションのベースパスを取得
     base_path = request.script_root or ''
-    return render_template('index.html', base_path=base_path)
+    return render_template('index.html', base_path=base_path, static_data=STATIC_ARTIFACTS,
+                           live_standings=LIVE_STANDINGS)
 
 # ==================== Seasons API ====================
 
@@ -89,11 +1280,14 @@ def index():
 def get_seasons():
     """全シーズン取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         seasons = cur.execute('''
-            SELECT s.*, vs.game_count, vs.player_count
+            SELECT s.*,
+                   COALESCE(vs.game_count, a.game_count) AS game_count,
+                   COALESCE(vs.player_count, a.player_count) AS player_count
             FROM seasons s
             LEFT JOIN view_season_summary vs ON s.id = vs.season_id
+            LEFT JOIN archived_seasons a ON s.id = a.season_id
             ORDER BY s.created_date DESC
         ''').fetchall()
         
@@ -119,11 +1313,14 @@ def get_seasons():
 def get_season(season_id):
     """特定シーズン取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         season = cur.execute('''
-            SELECT s.*, vs.game_count, vs.player_count
+            SELECT s.*,
+                   COALESCE(vs.game_count, a.game_count) AS game_count,
+                   COALESCE(vs.player_count, a.player_count) AS player_count
             FROM seasons s
             LEFT JOIN view_season_summary vs ON s.id = vs.season_id
+            LEFT JOIN archived_seasons a ON s.id = a.season_id
             WHERE s.id = ?
         ''', (season_id,)).fetchone()
         
@@ -150,7 +1347,7 @@ def get_season(season_id):
 def get_active_season():
     """アクティブシーズン取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         season = cur.execute('''
             SELECT * FROM seasons WHERE is_active = 1 LIMIT 1
         ''').fetchone()
@@ -208,6 +1405,7 @@ def create_season():
         ''', (season_id,))
         
         con.commit()
+        _rebuild_static_artifacts_safely(con, season_ids=(season_id,))
         
         return api_response({'id': season_id, 'message': 'Season created successfully'})
     except sqlite3.IntegrityError as e:
@@ -251,6 +1449,7 @@ def update_season(season_id):
         ''', params)
         
         con.commit()
+        _rebuild_static_artifacts_safely(con, season_ids=(season_id,))
         
         return api_response({'message': 'Season updated successfully'})
     except sqlite3.IntegrityError:
@@ -275,6 +1474,7 @@ def activate_season(season_id):
         cur.execute('UPDATE seasons SET is_active = 1 WHERE id = ?', (season_id,))
         
         con.commit()
+        _rebuild_static_artifacts_safely(con, season_ids=(season_id,))
         
         return api_response({'message': 'Season activated successfully'})
     except Exception as e:
@@ -286,21 +1486,24 @@ def activate_season(season_id):
 def get_players():
     """全プレイヤー取得"""
     try:
-        cur = get_db().cursor()
-        players = cur.execute('''
-            SELECT * FROM players ORDER BY name
-        ''').fetchall()
-        
-        players_data = []
-        for player in players:
-            players_data.append({
-                'id': player['id'],
-                'name': player['name'],
-                'avatarUrl': player['avatar_url'],
-                'created_date': player['created_date']
-            })
-        
-        return api_response(players_data)
+        cur = get_read_db().cursor()
+        return api_response(query_players(cur))
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/players/search', methods=['GET'])
+def search_players():
+    """プレイヤー名の検索（前方一致を優先し、続いて部分一致。ローマ字でもかなの名前を引ける）"""
+    try:
+        query = request.args.get('q', '')
+        try:
+            limit = int(request.args.get('limit', player_search.SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return api_response(error='limit must be an integer', status=400)
+        limit = min(max(limit, 1), player_search.SEARCH_MAX_LIMIT)
+
+        cur = get_read_db().cursor()
+        return api_response(player_search.search_players(cur, query, limit))
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -321,8 +1524,10 @@ def create_player():
             INSERT INTO players (id, name, avatar_url)
             VALUES (?, ?, ?)
         ''', (player_id, data['name'], data.get('avatarUrl')))
+        player_search.index_player(cur, player_id, data['name'])
         
         con.commit()
+        _rebuild_static_artifacts_safely(con, players=True)
         
         return api_response({'id': player_id, 'message': 'Player created successfully'})
     except Exception as e:
@@ -363,8 +1568,12 @@ def update_player(player_id):
             UPDATE players SET {', '.join(update_fields)}
             WHERE id = ?
         ''', params)
+        if 'name' in data:
+            player_search.index_player(cur, player_id, data['name'])
         
         con.commit()
+        # 名前の変更は順位表にも反映する
+        _rebuild_static_artifacts_safely(con, players=True, standings=True)
         
         return api_response({'message': 'Player updated successfully'})
     except Exception as e:
@@ -384,7 +1593,7 @@ def delete_player(player_id):
         
         # 全シーズン累計の対戦履歴確認
         game_count = cur.execute('''
-            SELECT COUNT(*) as count FROM game_results WHERE player_id = ?
+            SELECT COUNT(*) as count FROM all_game_results WHERE player_id = ?
         ''', (player_id,)).fetchone()
         
         if game_count['count'] > 0:
@@ -397,6 +1606,7 @@ def delete_player(player_id):
         cur.execute('DELETE FROM players WHERE id = ?', (player_id,))
         
         con.commit()
+        _rebuild_static_artifacts_safely(con, players=True)
         
         return api_response({'message': f'プレイヤー "{player["name"]}" を削除しました'})
     except Exception as e:
@@ -406,7 +1616,7 @@ def delete_player(player_id):
 def check_player_can_delete(player_id):
     """プレイヤーが削除可能かどうかをチェック（全シーズン累計の対戦履歴で判定）"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         
         # プレイヤー存在確認
         player = cur.execute('SELECT id, name FROM players WHERE id = ?', (player_id,)).fetchone()
@@ -415,7 +1625,7 @@ def check_player_can_delete(player_id):
         
         # 全シーズン累計の対戦履歴確認
         game_count = cur.execute('''
-            SELECT COUNT(*) as count FROM game_results WHERE player_id = ?
+            SELECT COUNT(*) as count FROM all_game_results WHERE player_id = ?
         ''', (player_id,)).fetchone()
         
         can_delete = game_count['count'] == 0
@@ -434,9 +1644,9 @@ def check_player_can_delete(player_id):
 def get_league_settings(season_id):
     """シーズンのリーグ設定取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         settings = cur.execute('''
-            SELECT * FROM league_settings WHERE season_id = ?
+            SELECT * FROM all_league_settings WHERE season_id = ?
         ''', (season_id,)).fetchone()
         
         if not settings:
@@ -473,7 +1683,17 @@ def update_league_settings(season_id):
         if not season:
             return api_response(error='Season not found', status=404)
         
-        # 設定更新
+        # 設定更新（JSON のキーは文字列なので umaPoints は "1" のように届く）
+        uma = data.get('umaPoints', {})
+        points_settings = (
+            data.get('calculationBaseChipCount', 25000),
+            uma.get('1', uma.get(1, 20)),
+            uma.get('2', uma.get(2, 10)),
+            uma.get('3', uma.get(3, -10)),
+        )
+        previous = cur.execute('''
+            SELECT calculation_base_chip_count, uma_1st, uma_2nd, uma_3rd FROM league_settings WHERE season_id = ?
+        ''', (season_id,)).fetchone()
         cur.execute('''
             UPDATE league_settings SET
                 game_start_chip_count = ?,
@@ -482,18 +1702,20 @@ def update_league_settings(season_id):
                 uma_2nd = ?,
                 uma_3rd = ?
             WHERE season_id = ?
-        ''', (
-            data.get('gameStartChipCount', 25000),
-            data.get('calculationBaseChipCount', 25000),
-            data.get('umaPoints', {}).get(1, 20),
-            data.get('umaPoints', {}).get(2, 10),
-            data.get('umaPoints', {}).get(3, -10),
-            season_id
-        ))
+        ''', (data.get('gameStartChipCount', 25000), *points_settings, season_id))
+        # 計算基準チップ数か順位点が変わったときだけ、記録済みのゲームのポイントを再計算する
+        job_id = None
+        if previous is not None and tuple(previous) != points_settings:
+            job_id = jobs.enqueue(cur, 'reprice_season', {'season_id': season_id},
+                                  dedupe_key=f'reprice_season:{season_id}')
         
         con.commit()
-        
-        return api_response({'message': 'League settings updated successfully'})
+        if job_id is None:
+            return api_response({'message': 'League settings updated successfully', 'jobId': None})
+        # 再計算はシーズン全体に及ぶので、このリクエストでは待たずに 202 を返す
+        response = app.make_response(api_response({'message': 'League settings updated successfully',
+                                                   'jobId': job_id}, status=202))
+        return run_job_after_response(response, job_id)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -503,31 +1725,31 @@ def update_league_settings(season_id):
 def get_games(season_id):
     """シーズンのゲーム一覧取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         games = cur.execute('''
-            SELECT f.game_id AS id, f.season_id, f.game_date, f.round_name, f.total_hands_in_game, g.recorded_date,
+            SELECT g.id, g.season_id, g.game_date, g.round_name, g.total_hands_in_game, g.recorded_date,
                    json_group_array(json_object(
-                       'playerId', f.player_id,
-                       'rawScore', f.raw_score,
-                       'rank', f.rank,
-                       'calculatedPoints', f.calculated_points,
-                       'agariCount', f.agari_count,
-                       'riichiCount', f.riichi_count,
-                       'houjuuCount', f.houjuu_count,
-                       'furoCount', f.furo_count
+                       'playerId', gr.player_id,
+                       'rawScore', gr.raw_score,
+                       'rank', gr.rank,
+                       'calculatedPoints', gr.calculated_points,
+                       'agariCount', gr.agari_count,
+                       'riichiCount', gr.riichi_count,
+                       'houjuuCount', gr.houjuu_count,
+                       'furoCount', gr.furo_count
                    )) AS results
-            FROM view_game_results_flat f
-            JOIN games g ON f.game_id = g.id
-            WHERE f.season_id = ?
-            GROUP BY f.game_id
-            ORDER BY f.game_date DESC, g.recorded_date DESC
+            FROM all_games g
+            JOIN all_game_results gr ON gr.game_id = g.id
+            WHERE g.season_id = ?
+            GROUP BY g.id
+            ORDER BY g.game_date DESC, g.recorded_date DESC
         ''', (season_id,)).fetchall()
         
         games_data = []
         for game in games:
             results = json.loads(game['results']) if game['results'] else []
-            # None値を含む結果を除外
-            results = [r for r in results if r.get('playerId')]
+            # None値を含む結果を除外（アーカイブと合わせて読むと並びが変わるため順位順にする）
+            results = sorted((r for r in results if r.get('playerId')), key=lambda r: r['rank'])
             
             games_data.append({
                 'id': game['id'],
@@ -539,7 +1761,7 @@ def get_games(season_id):
                 'results': results
             })
         
-        return api_response(games_data)
+        return rows_response(games_data)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -547,123 +1769,13 @@ def get_games(season_id):
 def get_season_standings(season_id):
     """シーズンの順位表取得（全期間の累計結果）"""
     try:
-        cur = get_db().cursor()
-        
-        # 全期間のプレイヤー統計を計算
-        standings = cur.execute('''
-            WITH player_stats AS (
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.avatar_url,
-                    COUNT(gr.id) as games_played,
-                    SUM(gr.calculated_points) as total_points,
-                    AVG(gr.calculated_points) as average_points,
-                    AVG(gr.raw_score) as average_raw_score,
-                    AVG(gr.rank) as average_rank,
-                    MAX(gr.raw_score) as best_raw_score,
-                    SUM(CASE WHEN gr.rank = 1 THEN 1 ELSE 0 END) as wins,
-                    SUM(CASE WHEN gr.rank = 2 THEN 1 ELSE 0 END) as second_places,
-                    SUM(CASE WHEN gr.rank = 3 THEN 1 ELSE 0 END) as third_places,
-                    SUM(CASE WHEN gr.rank = 4 THEN 1 ELSE 0 END) as fourth_places,
-                    SUM(CASE WHEN gr.rank <= 2 THEN 1 ELSE 0 END) as top_two_finishes,
-                    SUM(CASE WHEN gr.rank < 4 THEN 1 ELSE 0 END) as avoid_last_finishes,
-                    SUM(COALESCE(gr.agari_count, 0)) as total_agari,
-                    SUM(COALESCE(gr.riichi_count, 0)) as total_riichi,
-                    SUM(COALESCE(gr.houjuu_count, 0)) as total_houjuu,
-                    SUM(COALESCE(gr.furo_count, 0)) as total_furo,
-                    SUM(COALESCE(g.total_hands_in_game, 0)) as total_hands
-                FROM players p
-                LEFT JOIN game_results gr ON p.id = gr.player_id
-                LEFT JOIN games g ON gr.game_id = g.id
-                WHERE gr.game_id IS NOT NULL
-                GROUP BY p.id, p.name, p.avatar_url
-                HAVING games_played > 0
-            )
-            SELECT 
-                id,
-                name,
-                avatar_url,
-                games_played,
-                total_points,
-                average_points,
-                average_raw_score,
-                average_rank,
-                best_raw_score,
-                wins,
-                second_places,
-                third_places,
-                fourth_places,
-                CASE WHEN games_played > 0 THEN CAST(wins AS REAL) / games_played ELSE 0 END as win_rate,
-                CASE WHEN games_played > 0 THEN CAST(second_places AS REAL) / games_played ELSE 0 END as second_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(third_places AS REAL) / games_played ELSE 0 END as third_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(fourth_places AS REAL) / games_played ELSE 0 END as fourth_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(top_two_finishes AS REAL) / games_played ELSE 0 END as rentai_rate,
-                CASE WHEN games_played > 0 THEN CAST(avoid_last_finishes AS REAL) / games_played ELSE 0 END as rasu_kaihi_rate,
-                total_agari,
-                total_riichi,
-                total_houjuu,
-                total_furo,
-                total_hands,
-                CASE WHEN total_hands > 0 THEN CAST(total_agari AS REAL) / total_hands ELSE 0 END as agari_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_riichi AS REAL) / total_hands ELSE 0 END as riichi_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_houjuu AS REAL) / total_hands ELSE 0 END as houjuu_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_furo AS REAL) / total_hands ELSE 0 END as furo_rate_per_hand
-            FROM player_stats
-            ORDER BY total_points DESC, average_points DESC
-        ''').fetchall()
-        
-        standings_data = []
-        for stat in standings:
-            # 最近のゲーム結果取得（最大10ゲーム）
-            recent_games = cur.execute('''
-                SELECT gr.calculated_points
-                FROM game_results gr
-                JOIN games g ON gr.game_id = g.id
-                WHERE gr.player_id = ?
-                ORDER BY g.game_date DESC, g.recorded_date DESC
-                LIMIT 10
-            ''', (stat['id'],)).fetchall()
-            
-            last_ten_games_points = [game['calculated_points'] for game in recent_games]
-            
-            standings_data.append({
-                'player': {
-                    'id': stat['id'],
-                    'name': stat['name'],
-                    'avatarUrl': stat['avatar_url']
-                },
-                'gamesPlayed': stat['games_played'],
-                'totalPoints': stat['total_points'],
-                'averagePoints': stat['average_points'],
-                'averageRawScore': stat['average_raw_score'],
-                'averageRank': stat['average_rank'],
-                'bestRawScore': stat['best_raw_score'] if stat['best_raw_score'] is not None else 0,
-                'rankDistribution': {
-                    1: stat['wins'],
-                    2: stat['second_places'],
-                    3: stat['third_places'],
-                    4: stat['fourth_places']
-                },
-                'winRate': stat['win_rate'],
-                'secondPlaceRate': stat['second_place_rate'],
-                'thirdPlaceRate': stat['third_place_rate'],
-                'fourthPlaceRate': stat['fourth_place_rate'],
-                'rentaiRate': stat['rentai_rate'],
-                'rasuKaihiRate': stat['rasu_kaihi_rate'],
-                'totalAgariCount': stat['total_agari'],
-                'totalRiichiCount': stat['total_riichi'],
-                'totalHoujuuCount': stat['total_houjuu'],
-                'totalFuroCount': stat['total_furo'],
-                'totalHandsPlayedIn': stat['total_hands'],
-                'agariRatePerHand': stat['agari_rate_per_hand'],
-                'riichiRatePerHand': stat['riichi_rate_per_hand'],
-                'houjuuRatePerHand': stat['houjuu_rate_per_hand'],
-                'furoRatePerHand': stat['furo_rate_per_hand'],
-                'lastTenGamesPoints': last_ten_games_points
-            })
-        
-        return api_response(standings_data)
+        fields = requested_standings_fields()
+        # ゲーム終了直後に全員が同時に開くため、キャッシュを通して計算を1回にまとめる
+        standings_data = cached_aggregate('standings:' + ','.join(fields),
+                                          lambda cur: query_standings(cur, fields))
+        return rows_response(standings_data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -672,97 +1784,12 @@ def get_season_standings(season_id):
 def get_all_standings():
     """全シーズン累計の順位表取得"""
     try:
-        cur = get_db().cursor()
-        
-        # view_all_standingsビューを使用して統計を取得
-        standings = cur.execute('''
-            SELECT 
-                id,
-                name,
-                avatar_url,
-                games_played,
-                total_points,
-                average_points,
-                average_raw_score,
-                average_rank,
-                best_raw_score,
-                wins,
-                second_places,
-                third_places,
-                fourth_places,
-                top_two_finishes,
-                avoid_last_finishes,
-                total_agari,
-                total_riichi,
-                total_houjuu,
-                total_furo,
-                total_hands,
-                CASE WHEN games_played > 0 THEN CAST(wins AS REAL) / games_played ELSE 0 END as win_rate,
-                CASE WHEN games_played > 0 THEN CAST(second_places AS REAL) / games_played ELSE 0 END as second_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(third_places AS REAL) / games_played ELSE 0 END as third_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(fourth_places AS REAL) / games_played ELSE 0 END as fourth_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(top_two_finishes AS REAL) / games_played ELSE 0 END as rentai_rate,
-                CASE WHEN games_played > 0 THEN CAST(avoid_last_finishes AS REAL) / games_played ELSE 0 END as rasu_kaihi_rate,
-                CASE WHEN total_hands > 0 THEN CAST(total_agari AS REAL) / total_hands ELSE 0 END as agari_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_riichi AS REAL) / total_hands ELSE 0 END as riichi_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_houjuu AS REAL) / total_hands ELSE 0 END as houjuu_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_furo AS REAL) / total_hands ELSE 0 END as furo_rate_per_hand
-            FROM view_all_standings
-            WHERE games_played > 0
-            ORDER BY total_points DESC, average_points DESC
-        ''').fetchall()
-        
-        standings_data = []
-        for stat in standings:
-            # 最近のゲーム結果取得（最大10ゲーム）
-            recent_games = cur.execute('''
-                SELECT gr.calculated_points
-                FROM game_results gr
-                JOIN games g ON gr.game_id = g.id
-                WHERE gr.player_id = ?
-                ORDER BY g.game_date DESC, g.recorded_date DESC
-                LIMIT 10
-            ''', (stat['id'],)).fetchall()
-            
-            last_ten_games_points = [game['calculated_points'] for game in recent_games]
-            
-            standings_data.append({
-                'player': {
-                    'id': stat['id'],
-                    'name': stat['name'],
-                    'avatarUrl': stat['avatar_url']
-                },
-                'gamesPlayed': stat['games_played'],
-                'totalPoints': stat['total_points'],
-                'averagePoints': stat['average_points'],
-                'averageRawScore': stat['average_raw_score'],
-                'averageRank': stat['average_rank'],
-                'bestRawScore': stat['best_raw_score'] if stat['best_raw_score'] is not None else 0,
-                'rankDistribution': {
-                    1: stat['wins'],
-                    2: stat['second_places'],
-                    3: stat['third_places'],
-                    4: stat['fourth_places']
-                },
-                'winRate': stat['win_rate'],
-                'secondPlaceRate': stat['second_place_rate'],
-                'thirdPlaceRate': stat['third_place_rate'],
-                'fourthPlaceRate': stat['fourth_place_rate'],
-                'rentaiRate': stat['rentai_rate'],
-                'rasuKaihiRate': stat['rasu_kaihi_rate'],
-                'totalAgariCount': stat['total_agari'],
-                'totalRiichiCount': stat['total_riichi'],
-                'totalHoujuuCount': stat['total_houjuu'],
-                'totalFuroCount': stat['total_furo'],
-                'totalHandsPlayedIn': stat['total_hands'],
-                'agariRatePerHand': stat['agari_rate_per_hand'],
-                'riichiRatePerHand': stat['riichi_rate_per_hand'],
-                'houjuuRatePerHand': stat['houjuu_rate_per_hand'],
-                'furoRatePerHand': stat['furo_rate_per_hand'],
-                'lastTenGamesPoints': last_ten_games_points
-            })
-        
-        return api_response(standings_data)
+        fields = requested_standings_fields()
+        standings_data = cached_aggregate('standings:' + ','.join(fields),
+                                          lambda cur: query_standings(cur, fields))
+        return rows_response(standings_data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -774,123 +1801,28 @@ def get_daily_standings():
         if not target_date:
             return api_response(error='日付パラメータが必要です', status=400)
         
-        cur = get_db().cursor()
-        
-        # 指定日のゲーム結果のみを対象とした統計
-        standings = cur.execute('''
-            WITH player_stats AS (
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.avatar_url,
-                    COUNT(gr.id) as games_played,
-                    SUM(gr.calculated_points) as total_points,
-                    AVG(gr.calculated_points) as average_points,
-                    AVG(gr.raw_score) as average_raw_score,
-                    AVG(gr.rank) as average_rank,
-                    MAX(gr.raw_score) as best_raw_score,
-                    SUM(CASE WHEN gr.rank = 1 THEN 1 ELSE 0 END) as wins,
-                    SUM(CASE WHEN gr.rank = 2 THEN 1 ELSE 0 END) as second_places,
-                    SUM(CASE WHEN gr.rank = 3 THEN 1 ELSE 0 END) as third_places,
-                    SUM(CASE WHEN gr.rank = 4 THEN 1 ELSE 0 END) as fourth_places,
-                    SUM(CASE WHEN gr.rank <= 2 THEN 1 ELSE 0 END) as top_two_finishes,
-                    SUM(CASE WHEN gr.rank < 4 THEN 1 ELSE 0 END) as avoid_last_finishes,
-                    SUM(COALESCE(gr.agari_count, 0)) as total_agari,
-                    SUM(COALESCE(gr.riichi_count, 0)) as total_riichi,
-                    SUM(COALESCE(gr.houjuu_count, 0)) as total_houjuu,
-                    SUM(COALESCE(gr.furo_count, 0)) as total_furo,
-                    SUM(COALESCE(g.total_hands_in_game, 0)) as total_hands
-                FROM players p
-                LEFT JOIN game_results gr ON p.id = gr.player_id
-                LEFT JOIN games g ON gr.game_id = g.id
-                WHERE gr.game_id IS NOT NULL AND g.game_date = ?
-                GROUP BY p.id, p.name, p.avatar_url
-                HAVING games_played > 0
-            )
-            SELECT 
-                id,
-                name,
-                avatar_url,
-                games_played,
-                total_points,
-                average_points,
-                average_raw_score,
-                average_rank,
-                best_raw_score,
-                wins,
-                second_places,
-                third_places,
-                fourth_places,
-                CASE WHEN games_played > 0 THEN CAST(wins AS REAL) / games_played ELSE 0 END as win_rate,
-                CASE WHEN games_played > 0 THEN CAST(second_places AS REAL) / games_played ELSE 0 END as second_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(third_places AS REAL) / games_played ELSE 0 END as third_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(fourth_places AS REAL) / games_played ELSE 0 END as fourth_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(top_two_finishes AS REAL) / games_played ELSE 0 END as rentai_rate,
-                CASE WHEN games_played > 0 THEN CAST(avoid_last_finishes AS REAL) / games_played ELSE 0 END as rasu_kaihi_rate,
-                total_agari,
-                total_riichi,
-                total_houjuu,
-                total_furo,
-                total_hands,
-                CASE WHEN total_hands > 0 THEN CAST(total_agari AS REAL) / total_hands ELSE 0 END as agari_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_riichi AS REAL) / total_hands ELSE 0 END as riichi_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_houjuu AS REAL) / total_hands ELSE 0 END as houjuu_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_furo AS REAL) / total_hands ELSE 0 END as furo_rate_per_hand
-            FROM player_stats
-            ORDER BY total_points DESC, average_points DESC
-        ''', (target_date,)).fetchall()
-        
-        standings_data = []
-        for stat in standings:
-            # 指定日のゲーム結果のみを対象とした統計（その日の戦績のみ）
-            recent_games = cur.execute('''
-                SELECT gr.calculated_points
-                FROM game_results gr
-                JOIN games g ON gr.game_id = g.id
-                WHERE gr.player_id = ? AND g.game_date = ?
-                ORDER BY g.game_date DESC, g.recorded_date DESC
-                LIMIT 10
-            ''', (stat['id'], target_date)).fetchall()
-            
-            last_ten_games_points = [game['calculated_points'] for game in recent_games]
-            
-            standings_data.append({
-                'player': {
-                    'id': stat['id'],
-                    'name': stat['name'],
-                    'avatarUrl': stat['avatar_url']
-                },
-                'gamesPlayed': stat['games_played'],
-                'totalPoints': stat['total_points'],
-                'averagePoints': stat['average_points'],
-                'averageRawScore': stat['average_raw_score'],
-                'averageRank': stat['average_rank'],
-                'bestRawScore': stat['best_raw_score'] if stat['best_raw_score'] is not None else 0,
-                'rankDistribution': {
-                    1: stat['wins'],
-                    2: stat['second_places'],
-                    3: stat['third_places'],
-                    4: stat['fourth_places']
-                },
-                'winRate': stat['win_rate'],
-                'secondPlaceRate': stat['second_place_rate'],
-                'thirdPlaceRate': stat['third_place_rate'],
-                'fourthPlaceRate': stat['fourth_place_rate'],
-                'rentaiRate': stat['rentai_rate'],
-                'rasuKaihiRate': stat['rasu_kaihi_rate'],
-                'totalAgariCount': stat['total_agari'],
-                'totalRiichiCount': stat['total_riichi'],
-                'totalHoujuuCount': stat['total_houjuu'],
-                'totalFuroCount': stat['total_furo'],
-                'totalHandsPlayedIn': stat['total_hands'],
-                'agariRatePerHand': stat['agari_rate_per_hand'],
-                'riichiRatePerHand': stat['riichi_rate_per_hand'],
-                'houjuuRatePerHand': stat['houjuu_rate_per_hand'],
-                'furoRatePerHand': stat['furo_rate_per_hand'],
-                'lastTenGamesPoints': last_ten_games_points
-            })
-        
-        return api_response(standings_data)
+        fields = requested_standings_fields()
+        # 指定日のゲーム結果のみを対象とした統計（直近10ゲームもその日の戦績のみ）
+        standings_data = query_standings(get_read_db().cursor(), fields, target_date, target_date)
+        return rows_response(standings_data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/standings/as-of', methods=['GET'])
+def get_standings_as_of():
+    """指定日時点の累計順位表取得"""
+    try:
+        target_date = request.args.get('date')  # YYYY-MM-DD形式
+        if not target_date:
+            return api_response(error='日付パラメータが必要です', status=400)
+
+        fields = requested_standings_fields()
+        standings_data = query_standings(get_read_db().cursor(), fields, end_date=target_date)
+        return rows_response(standings_data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -898,45 +1830,8 @@ def get_daily_standings():
 def get_all_games():
     """全シーズンのゲーム履歴取得"""
     try:
-        cur = get_db().cursor()
-        games = cur.execute('''
-            SELECT g.id, g.season_id, g.game_date, g.round_name, g.total_hands_in_game, g.recorded_date,
-                   s.name AS season_name,
-                   json_group_array(json_object(
-                       'playerId', gr.player_id,
-                       'rawScore', gr.raw_score,
-                       'rank', gr.rank,
-                       'calculatedPoints', gr.calculated_points,
-                       'agariCount', gr.agari_count,
-                       'riichiCount', gr.riichi_count,
-                       'houjuuCount', gr.houjuu_count,
-                       'furoCount', gr.furo_count
-                   )) AS results
-            FROM games g
-            LEFT JOIN seasons s ON g.season_id = s.id
-            LEFT JOIN game_results gr ON g.id = gr.game_id
-            GROUP BY g.id
-            ORDER BY g.game_date DESC, g.recorded_date DESC
-        ''').fetchall()
-        
-        games_data = []
-        for game in games:
-            results = json.loads(game['results']) if game['results'] else []
-            # None値を含む結果を除外
-            results = [r for r in results if r.get('playerId')]
-            
-            games_data.append({
-                'id': game['id'],
-                'seasonId': game['season_id'],
-                'seasonName': game['season_name'],
-                'gameDate': game['game_date'],
-                'roundName': game['round_name'],
-                'totalHandsInGame': game['total_hands_in_game'],
-                'recordedDate': game['recorded_date'],
-                'results': results
-            })
-        
-        return api_response(games_data)
+        games_data = query_games(get_read_db().cursor())
+        return rows_response(games_data)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -948,45 +1843,8 @@ def get_daily_games():
         if not target_date:
             return api_response(error='日付パラメータが必要です', status=400)
         
-        cur = get_db().cursor()
-        games = cur.execute('''
-            SELECT g.*, s.name as season_name,
-                   json_group_array(json_object(
-                       'playerId', gr.player_id,
-                       'rawScore', gr.raw_score,
-                       'rank', gr.rank,
-                       'calculatedPoints', gr.calculated_points,
-                       'agariCount', gr.agari_count,
-                       'riichiCount', gr.riichi_count,
-                       'houjuuCount', gr.houjuu_count,
-                       'furoCount', gr.furo_count
-                   )) as results
-            FROM games g
-            LEFT JOIN seasons s ON g.season_id = s.id
-            LEFT JOIN game_results gr ON g.id = gr.game_id
-            WHERE g.game_date = ?
-            GROUP BY g.id
-            ORDER BY g.recorded_date DESC
-        ''', (target_date,)).fetchall()
-        
-        games_data = []
-        for game in games:
-            results = json.loads(game['results']) if game['results'] else []
-            # None値を含む結果を除外
-            results = [r for r in results if r.get('playerId')]
-            
-            games_data.append({
-                'id': game['id'],
-                'seasonId': game['season_id'],
-                'seasonName': game['season_name'],
-                'gameDate': game['game_date'],
-                'roundName': game['round_name'],
-                'totalHandsInGame': game['total_hands_in_game'],
-                'recordedDate': game['recorded_date'],
-                'results': results
-            })
-        
-        return api_response(games_data)
+        games_data = query_games(get_read_db().cursor(), 'g.game_date = ?', (target_date,))
+        return rows_response(games_data)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -1000,45 +1858,8 @@ def get_games_by_date_range():
         if not start_date or not end_date:
             return api_response(error='開始日と終了日の両方が必要です', status=400)
         
-        cur = get_db().cursor()
-        games = cur.execute('''
-            SELECT g.*, s.name as season_name,
-                   json_group_array(json_object(
-                       'playerId', gr.player_id,
-                       'rawScore', gr.raw_score,
-                       'rank', gr.rank,
-                       'calculatedPoints', gr.calculated_points,
-                       'agariCount', gr.agari_count,
-                       'riichiCount', gr.riichi_count,
-                       'houjuuCount', gr.houjuu_count,
-                       'furoCount', gr.furo_count
-                   )) as results
-            FROM games g
-            LEFT JOIN seasons s ON g.season_id = s.id
-            LEFT JOIN game_results gr ON g.id = gr.game_id
-            WHERE g.game_date BETWEEN ? AND ?
-            GROUP BY g.id
-            ORDER BY g.game_date DESC, g.recorded_date DESC
-        ''', (start_date, end_date)).fetchall()
-        
-        games_data = []
-        for game in games:
-            results = json.loads(game['results']) if game['results'] else []
-            # None値を含む結果を除外
-            results = [r for r in results if r.get('playerId')]
-            
-            games_data.append({
-                'id': game['id'],
-                'seasonId': game['season_id'],
-                'seasonName': game['season_name'],
-                'gameDate': game['game_date'],
-                'roundName': game['round_name'],
-                'totalHandsInGame': game['total_hands_in_game'],
-                'recordedDate': game['recorded_date'],
-                'results': results
-            })
-        
-        return api_response(games_data)
+        games_data = query_games(get_read_db().cursor(), 'g.game_date BETWEEN ? AND ?', (start_date, end_date))
+        return rows_response(games_data)
     except Exception as e:
         return api_response(error=str(e), status=500)
 
@@ -1063,6 +1884,8 @@ def create_game(season_id):
         season = cur.execute('SELECT id FROM seasons WHERE id = ?', (season_id,)).fetchone()
         if not season:
             return api_response(error='Season not found', status=404)
+        if cur.execute('SELECT 1 FROM archived_seasons WHERE season_id = ?', (season_id,)).fetchone():
+            return api_response(error='アーカイブ済みのシーズンにはゲームを記録できません', status=400)
         
         # ゲーム作成
         cur.execute('''
@@ -1095,7 +1918,13 @@ def create_game(season_id):
                 result.get('furoCount', 0)
             ))
         
+        # 集計テーブルの更新
+        rollups.refresh_rollups(cur, rollups.game_rollup_keys(cur, game_id))
+        distributions.apply_game(cur, game_id, 1)
+        streaks.refresh_streaks(cur, streaks.game_streak_keys(cur, game_id))
+        
         con.commit()
+        on_games_committed(con, season_id)
         
         return api_response({'id': game_id, 'message': 'Game recorded successfully'})
     except Exception as e:
@@ -1131,6 +1960,11 @@ def update_game(game_id):
         
         print(f"Found game: {game}")
         
+        # 更新前の日付・プレイヤーの組（集計テーブルの更新対象）
+        rollup_keys = rollups.game_rollup_keys(cur, game_id)
+        streak_keys = streaks.game_streak_keys(cur, game_id)
+        distributions.apply_game(cur, game_id, -1)
+        
         # ゲーム情報の更新
         cur.execute('''
             UPDATE games SET
@@ -1171,8 +2005,16 @@ def update_game(game_id):
                 result.get('furoCount', 0)
             ))
         
+        # 集計テーブルの更新（更新前と更新後の両方）
+        rollup_keys |= rollups.game_rollup_keys(cur, game_id)
+        rollups.refresh_rollups(cur, rollup_keys)
+        distributions.apply_game(cur, game_id, 1)
+        # 連続記録は更新前と更新後の早い方の位置から数え直す
+        streaks.refresh_streaks(cur, streaks.merge_keys(streak_keys, streaks.game_streak_keys(cur, game_id)))
+        
         con.commit()
         print("Successfully updated game")
+        on_games_committed(con, game['season_id'])
         
         return api_response({'message': 'Game updated successfully'})
     except Exception as e:
@@ -1189,17 +2031,26 @@ def delete_game(game_id):
         cur = con.cursor()
         
         # ゲーム存在確認
-        game = cur.execute('SELECT id FROM games WHERE id = ?', (game_id,)).fetchone()
+        game = cur.execute('SELECT id, season_id FROM games WHERE id = ?', (game_id,)).fetchone()
         if not game:
             return api_response(error='Game not found', status=404)
         
+        rollup_keys = rollups.game_rollup_keys(cur, game_id)
+        streak_keys = streaks.game_streak_keys(cur, game_id)
+        distributions.apply_game(cur, game_id, -1)
+        
         # 関連するゲーム結果を削除（外部キー制約により自動削除される場合もありますが明示的に削除）
         cur.execute('DELETE FROM game_results WHERE game_id = ?', (game_id,))
         
         # ゲームを削除
         cur.execute('DELETE FROM games WHERE id = ?', (game_id,))
         
+        # 集計テーブルの更新
+        rollups.refresh_rollups(cur, rollup_keys)
+        streaks.refresh_streaks(cur, streak_keys)
+        
         con.commit()
+        on_games_committed(con, game['season_id'])
         
         return api_response({'message': 'Game deleted successfully'})
     except Exception as e:
@@ -1209,7 +2060,7 @@ def delete_game(game_id):
 def get_game_detail(game_id):
     """特定ゲームの詳細取得"""
     try:
-        cur = get_db().cursor()
+        cur = get_read_db().cursor()
         game = cur.execute('''
             SELECT g.*, s.name as season_name,
                    json_group_array(json_object(
@@ -1222,9 +2073,9 @@ def get_game_detail(game_id):
                        'houjuuCount', gr.houjuu_count,
                        'furoCount', gr.furo_count
                    )) as results
-            FROM games g
+            FROM all_games g
             LEFT JOIN seasons s ON g.season_id = s.id
-            LEFT JOIN game_results gr ON g.id = gr.game_id
+            LEFT JOIN all_game_results gr ON g.id = gr.game_id
             WHERE g.id = ?
             GROUP BY g.id
         ''', (game_id,)).fetchone()
@@ -1233,8 +2084,8 @@ def get_game_detail(game_id):
             return api_response(error='Game not found', status=404)
         
         results = json.loads(game['results']) if game['results'] else []
-        # None値を含む結果を除外
-        results = [r for r in results if r.get('playerId')]
+        # None値を含む結果を除外（アーカイブと合わせて読むと並びが変わるため順位順にする）
+        results = sorted((r for r in results if r.get('playerId')), key=lambda r: r['rank'])
         
         game_data = {
             'id': game['id'],
@@ -1261,122 +2112,370 @@ def get_date_range_standings():
         if not start_date or not end_date:
             return api_response(error='開始日と終了日の両方が必要です', status=400)
         
-        cur = get_db().cursor()
-        
-        # 指定期間のゲーム結果のみを対象とした統計
-        standings = cur.execute('''
-            WITH player_stats AS (
-                SELECT 
-                    p.id,
-                    p.name,
-                    p.avatar_url,
-                    COUNT(gr.id) as games_played,
-                    SUM(gr.calculated_points) as total_points,
-                    AVG(gr.calculated_points) as average_points,
-                    AVG(gr.raw_score) as average_raw_score,
-                    AVG(gr.rank) as average_rank,
-                    MAX(gr.raw_score) as best_raw_score,
-                    SUM(CASE WHEN gr.rank = 1 THEN 1 ELSE 0 END) as wins,
-                    SUM(CASE WHEN gr.rank = 2 THEN 1 ELSE 0 END) as second_places,
-                    SUM(CASE WHEN gr.rank = 3 THEN 1 ELSE 0 END) as third_places,
-                    SUM(CASE WHEN gr.rank = 4 THEN 1 ELSE 0 END) as fourth_places,
-                    SUM(CASE WHEN gr.rank <= 2 THEN 1 ELSE 0 END) as top_two_finishes,
-                    SUM(CASE WHEN gr.rank < 4 THEN 1 ELSE 0 END) as avoid_last_finishes,
-                    SUM(COALESCE(gr.agari_count, 0)) as total_agari,
-                    SUM(COALESCE(gr.riichi_count, 0)) as total_riichi,
-                    SUM(COALESCE(gr.houjuu_count, 0)) as total_houjuu,
-                    SUM(COALESCE(gr.furo_count, 0)) as total_furo,
-                    SUM(COALESCE(g.total_hands_in_game, 0)) as total_hands
-                FROM players p
-                LEFT JOIN game_results gr ON p.id = gr.player_id
-                LEFT JOIN games g ON gr.game_id = g.id
-                WHERE gr.game_id IS NOT NULL AND g.game_date BETWEEN ? AND ?
-                GROUP BY p.id, p.name, p.avatar_url
-                HAVING games_played > 0
-            )
-            SELECT 
-                id,
-                name,
-                avatar_url,
-                games_played,
-                total_points,
-                average_points,
-                average_raw_score,
-                average_rank,
-                best_raw_score,
-                wins,
-                second_places,
-                third_places,
-                fourth_places,
-                CASE WHEN games_played > 0 THEN CAST(wins AS REAL) / games_played ELSE 0 END as win_rate,
-                CASE WHEN games_played > 0 THEN CAST(second_places AS REAL) / games_played ELSE 0 END as second_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(third_places AS REAL) / games_played ELSE 0 END as third_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(fourth_places AS REAL) / games_played ELSE 0 END as fourth_place_rate,
-                CASE WHEN games_played > 0 THEN CAST(top_two_finishes AS REAL) / games_played ELSE 0 END as rentai_rate,
-                CASE WHEN games_played > 0 THEN CAST(avoid_last_finishes AS REAL) / games_played ELSE 0 END as rasu_kaihi_rate,
-                total_agari,
-                total_riichi,
-                total_houjuu,
-                total_furo,
-                total_hands,
-                CASE WHEN total_hands > 0 THEN CAST(total_agari AS REAL) / total_hands ELSE 0 END as agari_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_riichi AS REAL) / total_hands ELSE 0 END as riichi_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_houjuu AS REAL) / total_hands ELSE 0 END as houjuu_rate_per_hand,
-                CASE WHEN total_hands > 0 THEN CAST(total_furo AS REAL) / total_hands ELSE 0 END as furo_rate_per_hand
-            FROM player_stats
-            ORDER BY total_points DESC, average_points DESC
-        ''', (start_date, end_date)).fetchall()
-        
-        standings_data = []
-        for stat in standings:
-            # 指定期間のゲーム結果のみを対象とした統計（その期間の戦績のみ）
-            recent_games = cur.execute('''
-                SELECT gr.calculated_points
-                FROM game_results gr
-                JOIN games g ON gr.game_id = g.id
-                WHERE gr.player_id = ? AND g.game_date BETWEEN ? AND ?
-                ORDER BY g.game_date DESC, g.recorded_date DESC
-                LIMIT 10
-            ''', (stat['id'], start_date, end_date)).fetchall()
-            
-            last_ten_games_points = [game['calculated_points'] for game in recent_games]
-            
-            standings_data.append({
-                'player': {
-                    'id': stat['id'],
-                    'name': stat['name'],
-                    'avatarUrl': stat['avatar_url']
-                },
-                'gamesPlayed': stat['games_played'],
-                'totalPoints': stat['total_points'],
-                'averagePoints': stat['average_points'],
-                'averageRawScore': stat['average_raw_score'],
-                'averageRank': stat['average_rank'],
-                'bestRawScore': stat['best_raw_score'] if stat['best_raw_score'] is not None else 0,
-                'rankDistribution': {
-                    1: stat['wins'],
-                    2: stat['second_places'],
-                    3: stat['third_places'],
-                    4: stat['fourth_places']
-                },
-                'winRate': stat['win_rate'],
-                'secondPlaceRate': stat['second_place_rate'],
-                'thirdPlaceRate': stat['third_place_rate'],
-                'fourthPlaceRate': stat['fourth_place_rate'],
-                'rentaiRate': stat['rentai_rate'],
-                'rasuKaihiRate': stat['rasu_kaihi_rate'],
-                'totalAgariCount': stat['total_agari'],
-                'totalRiichiCount': stat['total_riichi'],
-                'totalHoujuuCount': stat['total_houjuu'],
-                'totalFuroCount': stat['total_furo'],
-                'totalHandsPlayedIn': stat['total_hands'],
-                'agariRatePerHand': stat['agari_rate_per_hand'],
-                'riichiRatePerHand': stat['riichi_rate_per_hand'],
-                'houjuuRatePerHand': stat['houjuu_rate_per_hand'],
-                'furoRatePerHand': stat['furo_rate_per_hand'],
-                'lastTenGamesPoints': last_ten_games_points
+        fields = requested_standings_fields()
+        # 指定期間のゲーム結果のみを対象とした統計（直近10ゲームもその期間の戦績のみ）
+        standings_data = query_standings(get_read_db().cursor(), fields, start_date, end_date)
+        return rows_response(standings_data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+# ==================== Changes API ====================
+
+CHANGES_PAGE_SIZE = 500
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """差分同期：since より後の変更（ゲーム・プレイヤーの更新と削除）を取得
+
+    since を省略した場合は最新の seq のみを返す。クライアントは全件取得の前に
+    この seq を控えておき、以降は ?since=<seq> で差分だけを受け取る。
+    """
+    try:
+        cur = get_read_db().cursor()
+        last_seq = cur.execute('SELECT COALESCE(MAX(seq), 0) FROM change_log').fetchone()[0]
+
+        since = request.args.get('since')
+        if since is None:
+            return api_response({'lastSeq': last_seq, 'changes': [], 'hasMore': False, 'reset': False})
+        try:
+            since = int(since)
+        except ValueError:
+            return api_response(error='since must be an integer', status=400)
+
+        changes = cur.execute('''
+            SELECT seq, entity, entity_id, operation, changed_date
+            FROM change_log
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (since, CHANGES_PAGE_SIZE + 1)).fetchall()
+
+        has_more = len(changes) > CHANGES_PAGE_SIZE
+        changes = changes[:CHANGES_PAGE_SIZE]
+
+        # 更新されたエンティティの現在の内容をまとめて取得
+        upserted = {'game': [], 'player': []}
+        for change in changes:
+            if change['operation'] == 'upsert':
+                upserted[change['entity']].append(change['entity_id'])
+
+        games = {}
+        if upserted['game']:
+            placeholders = ', '.join('?' * len(upserted['game']))
+            games = {
+                game['id']: game
+                for game in query_games(cur, f'g.id IN ({placeholders})', tuple(upserted['game']))
+            }
+
+        players = {}
+        if upserted['player']:
+            placeholders = ', '.join('?' * len(upserted['player']))
+            for player in cur.execute(f'''
+                SELECT * FROM players WHERE id IN ({placeholders})
+            ''', upserted['player']).fetchall():
+                players[player['id']] = {
+                    'id': player['id'],
+                    'name': player['name'],
+                    'avatarUrl': player['avatar_url'],
+                    'created_date': player['created_date']
+                }
+
+        changes_data = []
+        for change in changes:
+            source = games if change['entity'] == 'game' else players
+            changes_data.append({
+                'seq': change['seq'],
+                'entity': change['entity'],
+                'id': change['entity_id'],
+                'operation': change['operation'],
+                'changedDate': change['changed_date'],
+                'data': source.get(change['entity_id']) if change['operation'] == 'upsert' else None
             })
-        
-        return api_response(standings_data)
+
+        return api_response({
+            'lastSeq': changes_data[-1]['seq'] if changes_data else since,
+            'changes': changes_data,
+            'hasMore': has_more,
+            # since が最新の seq より新しい（DBが作り直された）場合は全件の再取得が必要
+            'reset': since > last_seq
+        })
     except Exception as e:
         return api_response(error=str(e), status=500)
+
+# ==================== Jobs API ====================
+
+JOBS_DEFAULT_LIMIT = 50
+JOBS_MAX_LIMIT = 200
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """ジョブの状態・進捗・結果"""
+    try:
+        # スナップショットはジョブの進捗では更新されないため、ライブDBから読む
+        job = jobs.query_job(get_db().cursor(), job_id)
+        if not job:
+            return api_response(error='Job not found', status=404)
+        return api_response(job)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """ジョブ一覧（新しい順。status, kind で絞り込み）"""
+    try:
+        status = request.args.get('status')
+        if status and status not in jobs.JOB_STATUSES:
+            raise ValueError(f'status must be one of {", ".join(jobs.JOB_STATUSES)}')
+        try:
+            limit = int(request.args.get('limit', JOBS_DEFAULT_LIMIT))
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if not 1 <= limit <= JOBS_MAX_LIMIT:
+            raise ValueError(f'limit must be between 1 and {JOBS_MAX_LIMIT}')
+        return rows_response(jobs.query_jobs(get_db().cursor(), status, request.args.get('kind'), limit))
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+# ==================== Export API ====================
+
+@app.route('/api/exports', methods=['POST'])
+def create_export():
+    """ゲーム結果のエクスポートをジョブとして登録する（format: parquet / npz, seasonId）
+
+    完了したジョブの result.fileName を /api/exports/<fileName> からダウンロードする。
+    worker.py がなければ（JOB_WORKER でなければ）このリクエストの中で作成し、ジョブの結果も返す。
+    """
+    try:
+        import export
+        data = request.get_json(silent=True) or {}
+        # 必要なライブラリがない形式はジョブに入れる前に断る（RuntimeError -> 503）
+        payload = {'format': export.check_format(data.get('format'))}
+        if data.get('seasonId') is not None:
+            payload['season_id'] = int(data['seasonId'])
+
+        con = get_db()
+        job_id = jobs.enqueue(con.cursor(), 'export_game_results', payload,
+                              dedupe_key='export_game_results:' + json.dumps(payload, sort_keys=True))
+        con.commit()
+        if run_job_inline(job_id) is None:
+            return api_response({'jobId': job_id})
+        job = jobs.query_job(con.cursor(), job_id)
+        return api_response({'jobId': job_id, 'status': job['status'], 'result': job['result'],
+                             'error': job['error']})
+    except (ValueError, TypeError) as e:
+        return api_response(error=str(e), status=400)
+    except RuntimeError as e:
+        return api_response(error=str(e), status=503)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/exports/<path:file_name>', methods=['GET'])
+def download_export(file_name):
+    """作成済みのエクスポートファイル"""
+    try:
+        return send_from_directory(export_dir(), file_name, as_attachment=True)
+    except HTTPException:
+        return api_response(error='Export not found', status=404)
+
+# ==================== Stats API ====================
+
+@app.route('/api/stats/head-to-head', methods=['GET'])
+def get_head_to_head():
+    """プレイヤーの組ごとの対戦成績（同卓数・平均順位差・ポイント差）"""
+    try:
+        filters = aggregate_filters()
+        cache_key = 'head-to-head:' + json.dumps(filters, sort_keys=True)
+        head_to_head = cached_aggregate(cache_key, lambda cur: query_head_to_head(cur, filters))
+        return rows_response(head_to_head)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/stats/trends', methods=['GET'])
+def get_trends():
+    """プレイヤーごとの成績の推移（累計ポイント・シーズン内の推移・直近 window ゲームの平均ポイントと平均順位）"""
+    try:
+        filters = aggregate_filters()
+        if request.args.get('player_id'):
+            filters['player_id'] = request.args.get('player_id')
+        try:
+            window = int(request.args.get('window', TRENDS_DEFAULT_WINDOW))
+        except ValueError:
+            raise ValueError('window must be an integer')
+        if not 1 <= window <= TRENDS_MAX_WINDOW:
+            raise ValueError(f'window must be between 1 and {TRENDS_MAX_WINDOW}')
+
+        cache_key = 'trends:' + json.dumps({**filters, 'window': window}, sort_keys=True)
+        trends = cached_aggregate(cache_key, lambda cur: query_trends(cur, filters, window))
+        return rows_response(trends)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/seasons/<int:season_id>/projections', methods=['GET'])
+def get_season_projections(season_id):
+    """シーズン最終順位の予測（モンテカルロ法。順位ごとの確率と最終ポイントの期待値）
+
+    remaining_games を省略すると、シーズンの終了日までの残りゲーム数をプレイヤーごとのペースから見積もる。
+    結果は次にゲームが記録されるまでキャッシュする。
+    """
+    try:
+        # NumPy の読み込みは CGI の起動を遅くするので、使うときだけ読み込む
+        import projections
+        if not projections.available():
+            return api_response(error='Projections require NumPy', status=503)
+        try:
+            simulations = int(request.args.get('simulations', projections.PROJECTION_SIMULATIONS))
+        except ValueError:
+            raise ValueError('simulations must be an integer')
+        if not 1 <= simulations <= projections.PROJECTION_MAX_SIMULATIONS:
+            raise ValueError(f'simulations must be between 1 and {projections.PROJECTION_MAX_SIMULATIONS}')
+
+        cur = get_read_db().cursor()
+        if not cur.execute('SELECT 1 FROM seasons WHERE id = ?', (season_id,)).fetchone():
+            return api_response(error='Season not found', status=404)
+        if request.args.get('remaining_games'):
+            try:
+                remaining_games = int(request.args.get('remaining_games'))
+            except ValueError:
+                raise ValueError('remaining_games must be an integer')
+            if remaining_games < 0:
+                raise ValueError('remaining_games must not be negative')
+        else:
+            remaining_games = projections.estimate_remaining_games(cur, season_id, date.today().isoformat())
+            if remaining_games is None:
+                raise ValueError('remaining_games is required when the season has no upcoming end_date')
+
+        cache_key = 'projections:' + json.dumps(
+            {'season_id': season_id, 'remaining_games': remaining_games, 'simulations': simulations},
+            sort_keys=True)
+        # 同じ版のデータからは同じ結果になるよう、版を乱数のシードにする
+        data = cached_aggregate(cache_key, lambda cur: {
+            'seasonId': season_id,
+            'simulations': simulations,
+            'projections': projections.project_season(
+                cur, season_id, remaining_games, simulations, seed=current_revision(cur))
+        })
+        return api_response(data)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+@app.route('/api/stats/distribution', methods=['GET'])
+def get_score_distribution():
+    """素点・ポイントの分布（ヒストグラム・中央値・p10/p90）
+
+    group_by=player（既定）はプレイヤーごと、season はシーズンごと、all は全体で1つの分布。
+    """
+    try:
+        metric = request.args.get('metric', 'rawScore')
+        if metric not in distributions.METRICS:
+            return api_response(error=f'Unknown metric: {metric}', status=400)
+        filters = aggregate_filters()
+        if 'start_date' in filters or 'end_date' in filters:
+            return api_response(error='Date filters are not supported for distributions', status=400)
+
+        distribution = distributions.query_distributions(
+            get_read_db().cursor(), metric,
+            season_id=filters.get('season_id'),
+            player_id=request.args.get('player_id'),
+            group_by=request.args.get('group_by', 'player')
+        )
+        return api_response(distribution)
+    except ValueError as e:
+        return api_response(error=str(e), status=400)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+# ==================== Batch API ====================
+
+# 1回のバッチで実行できるサブリクエスト数
+BATCH_MAX_REQUESTS = 20
+# バッチから呼べないエンドポイント（バッチ自身と、接続を保持し続ける配信）
+BATCH_EXCLUDED_ENDPOINTS = {'batch_requests', 'stream_standings'}
+
+def _batch_error(path, status: int, error: str) -> Dict[str, Any]:
+    return {'path': path, 'status': status, 'body': {'success': False, 'data': None, 'error': error}}
+
+def _run_batch_request(path) -> Dict[str, Any]:
+    """GET サブリクエストを現在のアプリケーションコンテキスト（同じ接続）で実行する"""
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return _batch_error(path, 400, 'path must start with /api/')
+
+    path_info, _, query = path.partition('?')
+    environ = dict(request.environ)
+    environ.pop('werkzeug.request', None)
+    environ.pop('CONTENT_TYPE', None)
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': unquote_to_bytes(path_info).decode('latin-1'),
+        'QUERY_STRING': query,
+        'CONTENT_LENGTH': '0',
+        'wsgi.input': io.BytesIO(),
+    })
+
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match(method='GET')
+    except HTTPException as e:
+        return _batch_error(path, e.code, e.description)
+    if endpoint in BATCH_EXCLUDED_ENDPOINTS:
+        return _batch_error(path, 400, f'{path_info} cannot be batched')
+
+    with app.request_context(environ):
+        try:
+            response = app.full_dispatch_request()
+        except Exception as e:
+            return _batch_error(path, 500, str(e))
+    return {'path': path, 'status': response.status_code, 'body': response.get_json(silent=True)}
+
+@app.route('/api/batch', methods=['POST'])
+def batch_requests():
+    """複数の GET リクエストをまとめて実行する
+
+    本体は {"requests": ["/api/seasons", {"path": "/api/players"}, ...]}。
+    サブリクエストは同じ接続・同じ時点の状態で順に実行し、それぞれのステータスと応答本体を返す。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('requests')
+        if not isinstance(items, list) or not items:
+            return api_response(error='requests must be a non-empty list', status=400)
+        if len(items) > BATCH_MAX_REQUESTS:
+            return api_response(error=f'At most {BATCH_MAX_REQUESTS} requests can be batched', status=400)
+
+        with read_snapshot():
+            results = [
+                _run_batch_request(item.get('path') if isinstance(item, dict) else item)
+                for item in items
+            ]
+        return api_response(results)
+    except Exception as e:
+        return api_response(error=str(e), status=500)
+
+# ==================== Live standings API ====================
+
+@app.route('/api/standings/stream', methods=['GET'])
+def stream_standings():
+    """順位表のリアルタイム配信（Server-Sent Events）
+
+    ゲームが記録されるたびに全シーズン累計の順位表を standings イベントとして送る。
+    再接続時は Last-Event-ID ヘッダー（または ?lastEventId=）以降のイベントから再開する。
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return api_response(error='Last-Event-ID must be an integer', status=400)
+
+    return Response(
+        _standings_stream(last_event_id, current_league()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+麻雀リーグ管理システム - 終了したシーズンのアーカイブ
+
+終了したシーズンの games / game_results / league_settings を
+archives/season_<id>.db に移し、ライブDB（database.db）を小さく保つ。
+
+アプリはアーカイブを読み取り専用で ATTACH し、
+ライブDBとアーカイブを UNION ALL した一時ビュー all_games / all_game_results /
+all_league_settings から読む。ATTACH とビューの作成は、接続で初めて all_* を使うときに行う（ArchiveConnection）。全シーズンをまたぐ集計（日別集計・累計・分布）は
+アーカイブ後もそのまま残り、シーズン一覧のゲーム数は archived_seasons に保存した値を使う。
+アーカイブしたシーズンは読み取り専用になる（ゲームの記録・更新・削除はできない）。
+
+SQLite が1つの接続に ATTACH できるのは10個までなので、アーカイブファイルは ARCHIVE_MAX_FILES 個までにする。
+超える場合は、新しいシーズンとゲーム数の少ない既存のファイルを1つのファイルにまとめて書き出し、
+登録を移してから古いファイルを削除する（1つのファイルに複数のシーズンが入る）。
+
+使い方:
+    python archive.py <season_id> [--vacuum]
+    python archive.py --list
+    python archive.py --compact          # ARCHIVE_MAX_FILES を超えている古いインストールのファイルをまとめる
+    python archive.py --league club-a <season_id>
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+# アーカイブに移すテーブル
+ARCHIVED_TABLES = ('games', 'game_results', 'league_settings')
+# アーカイブファイルの上限（SQLite の ATTACH の上限 10 から、書き出し先と読み込み元の2つ分を残す）
+ARCHIVE_MAX_FILES = 8
+
+_ARCHIVE_INDEXES = (
+    'CREATE INDEX target.idx_games_id ON games(id)',
+    'CREATE INDEX target.idx_game_results_game ON game_results(game_id)',
+    'CREATE INDEX target.idx_game_results_player ON game_results(player_id)',
+    'CREATE INDEX target.idx_league_settings_season ON league_settings(season_id)',
+)
+
+
+def archive_dir(database: str) -> str:
+    """アーカイブファイルを置くディレクトリ（ライブDBと同じ場所の archives/）"""
+    return os.path.join(os.path.dirname(os.path.abspath(database)), 'archives')
+
+
+def file_uri(path: str) -> str:
+    """SQLite の URI ファイル名（urllib.request.pathname2url と同じ変換）
+
+    urllib.request は読み込みに時間がかかるので、CGI の起動時には読み込まない。
+    """
+    return f'file:{quote(path)}'
+
+
+def _columns(con: sqlite3.Connection, schema: str, table: str):
+    return [row[1] for row in con.execute(f'PRAGMA {schema}.table_info({table})').fetchall()]
+
+
+def _select_columns(con: sqlite3.Connection, schema: str, table: str) -> str:
+    """ライブDBの列に合わせて schema.table を読む SELECT の列（アーカイブにない列は NULL）"""
+    archived_columns = set(_columns(con, schema, table))
+    return ', '.join(column if column in archived_columns else f'NULL AS {column}'
+                     for column in _columns(con, 'main', table))
+
+
+def archive_files(con: sqlite3.Connection) -> List[Tuple[str, str]]:
+    """登録済みのアーカイブファイルごとの (ATTACH するスキーマ名, ファイル名)
+
+    スキーマ名はファイルに入っている最初のシーズンから archive_<シーズンID> とする。
+    """
+    try:
+        return [(f'archive_{season_id}', file_name) for season_id, file_name in con.execute('''
+            SELECT MIN(season_id), file_name FROM main.archived_seasons GROUP BY file_name ORDER BY 1
+        ''').fetchall()]
+    except sqlite3.OperationalError:
+        # archived_seasons がまだない古いデータベース
+        return []
+
+
+def attach_archives(con: sqlite3.Connection, directory: str) -> None:
+    """アーカイブを読み取り専用で ATTACH し、全シーズン分を読む一時ビューを作る
+
+    接続は uri=True で開いていること。アーカイブがなければビューはライブDBのテーブルそのもの。
+    ATTACH 済みのアーカイブと作成済みのビューはそのまま使う（何度呼んでもよい）。
+    """
+    files = archive_files(con)
+    if len(files) > ARCHIVE_MAX_FILES:
+        raise RuntimeError(f'アーカイブファイルが {len(files)} 個あります（上限 {ARCHIVE_MAX_FILES}）。'
+                           'python archive.py --compact でまとめてください')
+
+    attached = {row[1] for row in con.execute('PRAGMA database_list').fetchall()}
+    aliases = []
+    for alias, file_name in files:
+        if alias not in attached:
+            path = os.path.join(directory, file_name)
+            # アーカイブは作成後に変更されないので immutable で開く
+            con.execute(f'ATTACH DATABASE ? AS {alias}', (file_uri(path) + '?mode=ro&immutable=1',))
+        aliases.append(alias)
+
+    for table in ARCHIVED_TABLES:
+        if not aliases:
+            select_sql = f'SELECT * FROM main.{table}'
+        else:
+            # 後から列が追加されても揃うように、ライブDBの列に合わせる
+            columns = _columns(con, 'main', table)
+            selects = [f'SELECT {", ".join(columns)} FROM main.{table}']
+            for alias in aliases:
+                selects.append(f'SELECT {_select_columns(con, alias, table)} FROM {alias}.{table}')
+            select_sql = '\nUNION ALL\n'.join(selects)
+        con.execute(f'CREATE TEMP VIEW IF NOT EXISTS all_{table} AS {select_sql}')
+
+
+# all_* ビューがまだない（ATTACH 前か、ビューを作ったトランザクションがロールバックされた）ときのエラー
+_MISSING_VIEW = 'no such table: all_'
+
+
+def _with_archives(con: 'ArchiveConnection', method, sql: str, parameters):
+    """all_* ビューがなければアーカイブを ATTACH してから実行し直す"""
+    try:
+        return method(sql, parameters)
+    except sqlite3.OperationalError as e:
+        if con.archive_directory is None or not str(e).startswith(_MISSING_VIEW):
+            raise
+    attach_archives(con, con.archive_directory)
+    return method(sql, parameters)
+
+
+class ArchiveCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        return _with_archives(self.connection, super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return _with_archives(self.connection, super().executemany, sql, parameters)
+
+
+class ArchiveConnection(sqlite3.Connection):
+    """all_* ビューを初めて使うときにアーカイブを ATTACH する接続
+
+    ATTACH とビューの作成ではアーカイブごとにファイルを開いてスキーマを読むので、
+    all_* を使わないリクエスト（プレイヤー一覧・変更の差分など）ではそのコストをかけない。
+    """
+
+    archive_directory: Optional[str] = None
+
+    def cursor(self, factory=ArchiveCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+
+def connect(uri: str, directory: str, **kwargs) -> ArchiveConnection:
+    """directory のアーカイブを必要になったときに ATTACH する接続を開く（uri は file_uri の形式）"""
+    con = sqlite3.connect(uri, uri=True, factory=ArchiveConnection, **kwargs)
+    con.archive_directory = directory
+    return con
+
+
+def ensure_attached(con: sqlite3.Connection) -> None:
+    """ArchiveConnection のアーカイブを ATTACH しておく（all_* を通さずに archive_* を直接読む前に呼ぶ）"""
+    directory = getattr(con, 'archive_directory', None)
+    if directory is not None:
+        attach_archives(con, directory)
+
+
+def generation(con: sqlite3.Connection):
+    """登録済みのアーカイブの状態
+
+    接続を使い回す場合、これが開いたときと変わっていれば開き直す（all_* ビューと ATTACH が古くなるため）。
+    ファイル数も含めるので、シーズン数の変わらないまとめ直し（compact_archives）でも変わる。
+    """
+    try:
+        return con.execute('''
+            SELECT COUNT(*), COUNT(DISTINCT file_name), COALESCE(MAX(season_id), 0) FROM main.archived_seasons
+        ''').fetchone()[:]
+    except sqlite3.OperationalError:
+        return None
+
+
+def _files_to_merge(con: sqlite3.Connection, adding: int) -> List[str]:
+    """ファイルを adding 個追加しても ARCHIVE_MAX_FILES に収まるよう、1つにまとめる既存のファイル
+
+    ゲーム数の少ないファイルから選ぶ。adding が 0 のときは、まとめた結果も1ファイルになる分だけ多く選ぶ。
+    """
+    files = [row[0] for row in con.execute('''
+        SELECT file_name FROM archived_seasons GROUP BY file_name ORDER BY SUM(game_count), MIN(season_id)
+    ''').fetchall()]
+    excess = len(files) + adding - ARCHIVE_MAX_FILES
+    if excess <= 0:
+        return []
+    return files[:excess + (0 if adding else 1)]
+
+
+def _new_file_name(con: sqlite3.Connection, directory: str, stem: str) -> str:
+    """登録されておらず、ディレクトリにもないアーカイブファイル名"""
+    registered = {row[0] for row in con.execute('SELECT file_name FROM archived_seasons').fetchall()}
+    file_name, number = f'{stem}.db', 2
+    while file_name in registered or os.path.exists(os.path.join(directory, file_name)):
+        file_name, number = f'{stem}_{number}.db', number + 1
+    return file_name
+
+
+def _write_archive(con: sqlite3.Connection, path: str, directory: str,
+                   season_id: Optional[int], merged_files: List[str]) -> None:
+    """ライブDBのシーズン season_id と既存のアーカイブファイル merged_files を path に書き出す
+
+    一時ファイルに書き出して件数と整合性を確認してから置き換える。
+    ATTACH の上限を超えないよう、読み込み元のファイルは1つずつ ATTACH する。
+    """
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    expected_games = expected_results = 0
+    con.execute('ATTACH DATABASE ? AS target', (tmp_path,))
+    try:
+        for table in ARCHIVED_TABLES:
+            con.execute(f'CREATE TABLE target.{table} AS SELECT * FROM main.{table} WHERE 0')
+
+        if season_id is not None:
+            con.execute('''
+                INSERT INTO target.games SELECT * FROM main.games WHERE season_id = ? ORDER BY rowid
+            ''', (season_id,))
+            con.execute('''
+                INSERT INTO target.game_results
+                SELECT * FROM main.game_results
+                WHERE game_id IN (SELECT id FROM main.games WHERE season_id = ?)
+                ORDER BY id
+            ''', (season_id,))
+            con.execute('''
+                INSERT INTO target.league_settings SELECT * FROM main.league_settings WHERE season_id = ?
+            ''', (season_id,))
+            expected_games += con.execute('SELECT COUNT(*) FROM main.games WHERE season_id = ?',
+                                          (season_id,)).fetchone()[0]
+            expected_results += con.execute('''
+                SELECT COUNT(*) FROM main.game_results
+                WHERE game_id IN (SELECT id FROM main.games WHERE season_id = ?)
+            ''', (season_id,)).fetchone()[0]
+
+        for file_name in merged_files:
+            con.execute('ATTACH DATABASE ? AS source',
+                        (file_uri(os.path.join(directory, file_name)) + '?mode=ro&immutable=1',))
+            try:
+                for table in ARCHIVED_TABLES:
+                    con.execute(f'''
+                        INSERT INTO target.{table}
+                        SELECT {_select_columns(con, 'source', table)} FROM source.{table} ORDER BY rowid
+                    ''')
+                expected_games += con.execute('SELECT COUNT(*) FROM source.games').fetchone()[0]
+                expected_results += con.execute('SELECT COUNT(*) FROM source.game_results').fetchone()[0]
+            finally:
+                con.execute('DETACH DATABASE source')
+
+        for statement in _ARCHIVE_INDEXES:
+            con.execute(statement)
+
+        archived_games = con.execute('SELECT COUNT(*) FROM target.games').fetchone()[0]
+        archived_results = con.execute('SELECT COUNT(*) FROM target.game_results').fetchone()[0]
+        integrity = con.execute('PRAGMA target.integrity_check').fetchone()[0]
+    finally:
+        con.execute('DETACH DATABASE target')
+
+    if (archived_games, archived_results, integrity) != (expected_games, expected_results, 'ok'):
+        os.remove(tmp_path)
+        raise RuntimeError(f'Archive verification failed for {os.path.basename(path)}')
+    os.replace(tmp_path, path)
+
+
+def _remove_files(directory: str, file_names: List[str]) -> None:
+    """まとめ終わったアーカイブファイルを削除する（開いている接続は削除後もそのまま読める）"""
+    for file_name in file_names:
+        try:
+            os.remove(os.path.join(directory, file_name))
+        except OSError:
+            pass
+
+
+def archive_season(con: sqlite3.Connection, season_id: int, directory: str) -> dict:
+    """シーズンをアーカイブファイルに移す
+
+    先にアーカイブファイルを一時ファイルに書き出して確認してから置き換え、
+    その後ライブDBからの削除と archived_seasons への登録を1つのトランザクションで行う。
+    途中で失敗しても、登録されていないアーカイブファイルは次回作り直される。
+    アーカイブファイルが ARCHIVE_MAX_FILES を超える場合は、既存のファイルも同じファイルにまとめる。
+    con は isolation_level=None（自動コミット）で開いた接続を渡す。
+    """
+    season = con.execute('SELECT id, name, is_active FROM seasons WHERE id = ?', (season_id,)).fetchone()
+    if not season:
+        raise ValueError(f'Season {season_id} not found')
+    if season[2]:
+        raise ValueError('アクティブなシーズンはアーカイブできません')
+    if con.execute('SELECT 1 FROM archived_seasons WHERE season_id = ?', (season_id,)).fetchone():
+        raise ValueError(f'Season {season_id} is already archived')
+
+    game_count, player_count = con.execute('''
+        SELECT COUNT(DISTINCT g.id), COUNT(DISTINCT gr.player_id)
+        FROM games g
+        LEFT JOIN game_results gr ON gr.game_id = g.id
+        WHERE g.season_id = ?
+    ''', (season_id,)).fetchone()
+    result_count = con.execute('''
+        SELECT COUNT(*) FROM game_results WHERE game_id IN (SELECT id FROM games WHERE season_id = ?)
+    ''', (season_id,)).fetchone()[0]
+
+    os.makedirs(directory, exist_ok=True)
+    file_name = f'season_{season_id}.db'
+    path = os.path.join(directory, file_name)
+    merged_files = _files_to_merge(con, 1)
+
+    # 1. アーカイブファイルを作成する
+    _write_archive(con, path, directory, season_id, merged_files)
+
+    # 2. ライブDBから削除して登録する
+    try:
+        con.execute('BEGIN IMMEDIATE')
+        con.execute('''
+            CREATE TEMP TABLE archived_game_ids AS SELECT id FROM games WHERE season_id = ?
+        ''', (season_id,))
+        con.execute('''
+            DELETE FROM game_results WHERE game_id IN (SELECT id FROM temp.archived_game_ids)
+        ''')
+        con.execute('DELETE FROM games WHERE season_id = ?', (season_id,))
+        con.execute('DELETE FROM league_settings WHERE season_id = ?', (season_id,))
+        # ゲームは削除されたのではなく移動しただけなので、変更ログは更新として残す
+        con.execute('''
+            UPDATE change_log SET operation = 'upsert'
+            WHERE entity = 'game' AND entity_id IN (SELECT id FROM temp.archived_game_ids)
+        ''')
+        con.execute('''
+            INSERT INTO archived_seasons (season_id, file_name, game_count, player_count)
+            VALUES (?, ?, ?, ?)
+        ''', (season_id, file_name, game_count, player_count))
+        con.executemany('UPDATE archived_seasons SET file_name = ? WHERE file_name = ?',
+                        [(file_name, merged) for merged in merged_files])
+        con.execute('DROP TABLE temp.archived_game_ids')
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    _remove_files(directory, merged_files)
+
+    return {'seasonId': season_id, 'path': path, 'gameCount': game_count, 'resultCount': result_count,
+            'mergedFiles': merged_files}
+
+
+def compact_archives(con: sqlite3.Connection, directory: str) -> Optional[str]:
+    """アーカイブファイルが ARCHIVE_MAX_FILES を超えていれば、ゲーム数の少ないものを1つにまとめる
+
+    まとめたファイル名を返す（まとめる必要がなければ None）。
+    con は isolation_level=None（自動コミット）で開いた接続を渡す。
+    """
+    merged_files = _files_to_merge(con, 0)
+    if not merged_files:
+        return None
+    first, last = con.execute('''
+        SELECT MIN(season_id), MAX(season_id) FROM archived_seasons
+        WHERE file_name IN (SELECT value FROM json_each(?))
+    ''', (json.dumps(merged_files),)).fetchone()
+    file_name = _new_file_name(con, directory, f'season_{first}-{last}')
+    _write_archive(con, os.path.join(directory, file_name), directory, None, merged_files)
+
+    try:
+        con.execute('BEGIN IMMEDIATE')
+        con.executemany('UPDATE archived_seasons SET file_name = ? WHERE file_name = ?',
+                        [(file_name, merged) for merged in merged_files])
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+    _remove_files(directory, merged_files)
+    return file_name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='終了したシーズンをアーカイブファイルに移す')
+    parser.add_argument('season_id', type=int, nargs='?', help='アーカイブするシーズンID')
+    parser.add_argument('--list', action='store_true', help='アーカイブ済みのシーズンを表示する')
+    parser.add_argument('--compact', action='store_true',
+                        help=f'アーカイブファイルを {ARCHIVE_MAX_FILES} 個以下にまとめる')
+    parser.add_argument('--vacuum', action='store_true', help='アーカイブ後にライブDBを VACUUM して縮小する')
+    parser.add_argument('--league', help='対象のリーグ（MAHJONG_LEAGUES_DIR）')
+    args = parser.parse_args()
+
+    import app as league_app
+
+    try:
+        league = league_app.open_league(args.league)
+    except ValueError:
+        parser.error(f'リーグ {args.league} がありません')
+    database = league_app.DATABASE if league is None else league.database
+
+    con = sqlite3.connect(database, isolation_level=None)
+    con.execute('PRAGMA foreign_keys = ON')
+    try:
+        if args.list:
+            for season_id, file_name, game_count, archived_date in con.execute('''
+                SELECT season_id, file_name, game_count, archived_date FROM archived_seasons ORDER BY season_id
+            '''):
+                print(f'{season_id}\t{file_name}\t{game_count} games\t{archived_date}')
+            return
+        if args.compact:
+            file_name = compact_archives(con, archive_dir(database))
+            print(f'{file_name} にまとめました' if file_name else 'まとめる必要はありません')
+            return
+        if args.season_id is None:
+            parser.error('season_id is required')
+
+        result = archive_season(con, args.season_id, archive_dir(database))
+        print(f"シーズン {result['seasonId']} を {result['path']} にアーカイブしました"
+              f"（{result['gameCount']} ゲーム, {result['resultCount']} 件の結果）")
+        if result['mergedFiles']:
+            print(f"既存のアーカイブ {', '.join(result['mergedFiles'])} も同じファイルにまとめました")
+        if args.vacuum:
+            con.execute('VACUUM')
+    finally:
+        con.close()
+
+    if league_app.SNAPSHOT_MODE:
+        with league_app.league_context(league):
+            league_app.publish_snapshot()
+
+
+if __name__ == '__main__':
+    main()
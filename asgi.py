@@ -0,0 +1,254 @@
+"""
+麻雀リーグ管理システム - ASGI エントリポイント
+
+app.py と同じ /api/... を asyncio で提供する。
+通常のリクエストは Flask アプリをスレッドプール上で実行し（SQLite へのアクセスは
+イベントループの外で行われる）、接続を保持し続ける順位表の SSE 配信だけを
+ネイティブの非同期処理で扱う。待機中の購読者はスレッドを占有しない。
+
+起動例:
+    uvicorn asgi:application --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from urllib.parse import parse_qs
+
+import app as league_app
+import archive
+import leagues
+import projections
+
+# 常駐して SSE を非同期で配信できるので、画面の順位表のリアルタイム更新を有効にする
+league_app.LIVE_STANDINGS = True
+# イベントループとスレッドプールを持つプロセスは fork しない（予測は同じプロセスで計算する）
+projections.PROJECTION_FORK = False
+
+# Flask の処理と SQLite へのアクセスを実行するスレッド数
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi-db')
+_thread_local = threading.local()
+
+
+def _thread_db():
+    """プールのスレッドごとに使い回す読み取り用の接続
+
+    シーズンがアーカイブされたら all_* ビューが古くなるので開き直す（leagues.ConnectionPool と同じ）。
+    """
+    db = getattr(_thread_local, 'db', None)
+    if db is not None:
+        try:
+            stale = (_thread_local.database != league_app.DATABASE
+                     or archive.generation(db) != _thread_local.generation)
+        except sqlite3.Error:
+            stale = True
+        if stale:
+            db.close()
+            db = None
+    if db is None:
+        db = _thread_local.db = league_app.connect_db(league_app.DATABASE)
+        _thread_local.database = league_app.DATABASE
+        _thread_local.generation = archive.generation(db)
+    return db
+
+
+def _run_in_db_thread(func, *args):
+    return asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+# ==================== WSGI アダプター ====================
+
+def _build_environ(scope, body: bytes) -> dict:
+    """ASGI の HTTP スコープから WSGI の environ を組み立てる"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_wsgi(environ: dict):
+    """Flask アプリを同期的に実行し、ステータス・ヘッダー・本文を返す"""
+    response = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return chunks.append
+
+    result = league_app.app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            break
+    return body
+
+
+async def _handle_wsgi(scope, receive, send):
+    body = await _read_body(receive)
+    status, headers, content = await _run_in_db_thread(_call_wsgi, _build_environ(scope, body))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': content})
+
+
+# ==================== 順位表の SSE 配信 ====================
+
+def _latest_standings_event(last_event_id: int, league: Optional[leagues.League] = None):
+    if league is None:
+        return league_app.latest_standings_event(_thread_db(), last_event_id)
+    # リーグは数が多いのでスレッドごとに接続を持たず、リーグのプールから借りる
+    db = league.pool.acquire()
+    try:
+        with league_app.league_context(league):
+            return league_app.latest_standings_event(db, last_event_id)
+    finally:
+        league.pool.release(db)
+
+
+def _last_event_id(scope) -> Optional[int]:
+    value = None
+    for name, raw_value in scope.get('headers', []):
+        if name.lower() == b'last-event-id':
+            value = raw_value.decode('latin-1')
+    if not value:
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        value = query.get('lastEventId', ['0'])[0]
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+async def _handle_standings_stream(scope, receive, send, league: Optional[leagues.League] = None):
+    last_event_id = _last_event_id(scope)
+    if last_event_id is None:
+        # エラー応答の形式は Flask 側に任せる
+        await _handle_wsgi(scope, receive, send)
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': f'retry: {league_app.SSE_RETRY_MILLISECONDS}\n\n'.encode(),
+        'more_body': True,
+    })
+
+    disconnected = asyncio.ensure_future(receive())
+    last_sent = time.monotonic()
+    try:
+        while True:
+            event = await _run_in_db_thread(_latest_standings_event, last_event_id, league)
+            if event:
+                last_event_id = event['id']
+                message = f'id: {event["id"]}\nevent: standings\ndata: {event["payload"]}\n\n'
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= league_app.SSE_HEARTBEAT_SECONDS:
+                await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+                last_sent = time.monotonic()
+
+            # 切断されるか、次の確認時刻まで待つ（待機中はスレッドを使わない）
+            done, _ = await asyncio.wait({disconnected}, timeout=league_app.SSE_POLL_SECONDS)
+            if done and disconnected.result()['type'] == 'http.disconnect':
+                break
+            if done:
+                disconnected = asyncio.ensure_future(receive())
+    finally:
+        disconnected.cancel()
+
+
+# ==================== ASGI アプリケーション ====================
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            _executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI アプリケーション"""
+    if scope['type'] == 'lifespan':
+        await _handle_lifespan(receive, send)
+    elif scope['type'] == 'http':
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        # リーグの振り分けは Flask 側では LeagueMiddleware が行う。配信だけはここで同じ判定をする
+        name, path = leagues.split_path(path)
+        if name is None:
+            host = next((value for key, value in scope.get('headers', []) if key.lower() == b'host'), b'')
+            name = leagues.name_from_host(host.decode('latin-1'))
+        league = league_app.league_registry.get(name) if name is not None else None
+        if scope['method'] == 'GET' and path == '/api/standings/stream' and (name is None or league is not None):
+            await _handle_standings_stream(scope, receive, send, league)
+        else:
+            await _handle_wsgi(scope, receive, send)
+    else:
+        raise NotImplementedError(f'Unsupported ASGI scope type: {scope["type"]}')
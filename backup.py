@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+麻雀リーグ管理システム - オンラインバックアップ
+
+SQLite のバックアップAPI（sqlite3.Connection.backup）で、稼働中のデータベースを
+少しずつ（既定 64 ページずつ）コピーし、ステップの合間に待機する。
+ロックを保持するのは各ステップの間だけなので、通常のリクエストが長く待たされることはない。
+コピー中に別の接続から書き込まれた場合は SQLite が最初からコピーし直すため、
+書き込みが続いて何度もやり直しになる場合は一度でコピーする。
+
+コピーは一時ファイルに作成し、integrity_check が通ったものだけを
+backups/database-YYYYmmdd-HHMMSS.db として保存する。古いものは --keep 件を残して削除する。
+アーカイブ済みシーズンのファイル（archives/）は変更されないため、未保存のものだけをコピーする。
+
+使い方:
+    python backup.py backup [--keep 14] [--pages 64] [--sleep 0.05]
+    python backup.py schedule --interval 3600 [--keep 14]
+    python backup.py list
+    python backup.py restore backups/database-20250101-030000.db --yes
+    python backup.py --league club-a backup
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from urllib.request import pathname2url
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKUP_DIR = os.environ.get('MAHJONG_BACKUP_DIR') or os.path.join(BASE_DIR, 'backups')
+
+# 1ステップでコピーするページ数と、ステップ間の待機秒数
+BACKUP_PAGES = 64
+BACKUP_SLEEP_SECONDS = 0.05
+# この回数やり直しになったら分割せずにコピーする
+BACKUP_MAX_RESTARTS = 3
+# 残すバックアップの数
+BACKUP_KEEP = 14
+
+_BACKUP_PREFIX = 'database-'
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy_pages(source: sqlite3.Connection, target: sqlite3.Connection,
+                pages: int, sleep_seconds: float) -> None:
+    """少しずつコピーする。書き込みが続いて何度もやり直しになる場合は一度でコピーする"""
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # 残りページ数が減っていなければ、書き込みがあって最初からやり直している
+        if state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] >= BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        # 次のステップまで待ち、その間は他の接続がロックを取れるようにする
+        if remaining:
+            time.sleep(sleep_seconds)
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=sleep_seconds)
+    except _TooManyRestarts:
+        source.backup(target)
+
+
+def check_integrity(path: str) -> str:
+    """integrity_check の結果（正常なら 'ok'）"""
+    con = sqlite3.connect(f'file:{pathname2url(path)}?mode=ro', uri=True)
+    try:
+        return con.execute('PRAGMA integrity_check').fetchone()[0]
+    finally:
+        con.close()
+
+
+def list_backups(directory: str = BACKUP_DIR):
+    """バックアップファイルを古い順に返す"""
+    return sorted(glob.glob(os.path.join(directory, f'{_BACKUP_PREFIX}*.db')))
+
+
+def prune_backups(keep: int, directory: str = BACKUP_DIR):
+    """新しいものを keep 件残して削除し、削除したファイルを返す"""
+    backups = list_backups(directory)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def _backup_archives(database: str, directory: str) -> None:
+    """アーカイブ済みシーズンのファイルを（まだなければ）コピーする"""
+    import archive
+
+    source_dir = archive.archive_dir(database)
+    target_dir = os.path.join(directory, 'archives')
+    for path in glob.glob(os.path.join(source_dir, 'season_*.db')):
+        target = os.path.join(target_dir, os.path.basename(path))
+        if not os.path.exists(target):
+            os.makedirs(target_dir, exist_ok=True)
+            shutil.copy2(path, target + '.tmp')
+            os.replace(target + '.tmp', target)
+
+
+def backup_database(database: str, directory: str = BACKUP_DIR, pages: int = BACKUP_PAGES,
+                    sleep_seconds: float = BACKUP_SLEEP_SECONDS, keep: int = BACKUP_KEEP) -> str:
+    """稼働中のデータベースをバックアップし、保存したファイル名を返す"""
+    os.makedirs(directory, exist_ok=True)
+    name = f'{_BACKUP_PREFIX}{datetime.now().strftime("%Y%m%d-%H%M%S")}.db'
+    path = os.path.join(directory, name)
+    tmp_path = os.path.join(directory, f'.{name}.tmp')
+
+    source = sqlite3.connect(database)
+    target = sqlite3.connect(tmp_path)
+    try:
+        _copy_pages(source, target, pages, sleep_seconds)
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        result = check_integrity(tmp_path)
+        if result != 'ok':
+            raise RuntimeError(f'Backup integrity check failed: {result}')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    _backup_archives(database, directory)
+    prune_backups(keep, directory)
+    return path
+
+
+def restore_database(backup_path: str, database: str) -> None:
+    """バックアップをライブDBに書き戻す
+
+    ファイルを置き換えるのではなくバックアップAPIでライブDBの接続に書き込むので、
+    他のプロセスが開いている接続にも一貫した状態として反映される。
+    書き込み先のロックはコピーが終わるまで保持されるため、分割せずに一度でコピーする。
+    """
+    result = check_integrity(backup_path)
+    if result != 'ok':
+        raise RuntimeError(f'Backup integrity check failed: {result}')
+
+    source = sqlite3.connect(f'file:{pathname2url(backup_path)}?mode=ro', uri=True)
+    target = sqlite3.connect(database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+    # アーカイブ済みシーズンのファイルが失われていれば、バックアップから戻す
+    import archive
+
+    archive_backup_dir = os.path.join(os.path.dirname(os.path.abspath(backup_path)), 'archives')
+    live_archive_dir = archive.archive_dir(database)
+    for path in glob.glob(os.path.join(archive_backup_dir, 'season_*.db')):
+        target_path = os.path.join(live_archive_dir, os.path.basename(path))
+        if not os.path.exists(target_path):
+            os.makedirs(live_archive_dir, exist_ok=True)
+            shutil.copy2(path, target_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='データベースのオンラインバックアップと復元')
+    parser.add_argument('--league', help='対象のリーグ（MAHJONG_LEAGUES_DIR。バックアップはリーグのディレクトリの backups/）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_copy_options(subparser):
+        subparser.add_argument('--pages', type=int, default=BACKUP_PAGES, help='1ステップでコピーするページ数')
+        subparser.add_argument('--sleep', type=float, default=BACKUP_SLEEP_SECONDS, help='ステップ間の待機秒数')
+
+    backup_parser = subparsers.add_parser('backup', help='バックアップを1回作成する')
+    add_copy_options(backup_parser)
+    backup_parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='残すバックアップの数')
+
+    schedule_parser = subparsers.add_parser('schedule', help='一定間隔でバックアップを作成し続ける')
+    add_copy_options(schedule_parser)
+    schedule_parser.add_argument('--keep', type=int, default=BACKUP_KEEP, help='残すバックアップの数')
+    schedule_parser.add_argument('--interval', type=float, default=24 * 60 * 60, help='バックアップの間隔（秒）')
+
+    subparsers.add_parser('list', help='バックアップの一覧を表示する')
+
+    restore_parser = subparsers.add_parser('restore', help='バックアップからライブDBを復元する')
+    restore_parser.add_argument('backup_file', help='復元するバックアップファイル')
+    restore_parser.add_argument('--yes', action='store_true', help='確認なしで上書きする')
+
+    args = parser.parse_args()
+
+    import app as league_app
+
+    try:
+        league = league_app.open_league(args.league)
+    except ValueError:
+        parser.error(f'リーグ {args.league} がありません')
+    database = league_app.DATABASE if league is None else league.database
+    directory = BACKUP_DIR if league is None else os.path.join(os.path.dirname(database), 'backups')
+
+    with league_app.league_context(league):
+        if args.command == 'list':
+            for path in list_backups(directory):
+                print(f'{path}\t{os.path.getsize(path)} bytes')
+        elif args.command == 'backup':
+            path = backup_database(database, directory, pages=args.pages, sleep_seconds=args.sleep, keep=args.keep)
+            print(f'バックアップを作成しました: {path}')
+        elif args.command == 'schedule':
+            while True:
+                started = time.monotonic()
+                try:
+                    path = backup_database(database, directory, pages=args.pages,
+                                           sleep_seconds=args.sleep, keep=args.keep)
+                    print(f'{datetime.now().isoformat(timespec="seconds")} バックアップを作成しました: {path}',
+                          flush=True)
+                except Exception as e:
+                    print(f'{datetime.now().isoformat(timespec="seconds")} バックアップに失敗しました: {e}',
+                          file=sys.stderr, flush=True)
+                time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+        elif args.command == 'restore':
+            if not args.yes:
+                parser.error(f'{database} を上書きします。実行するには --yes を指定してください')
+            restore_database(args.backup_file, database)
+            if league_app.SNAPSHOT_MODE:
+                league_app.publish_snapshot()
+            if league_app.STATIC_ARTIFACTS:
+                con = league_app.connect_db()
+                try:
+                    season_ids = [row['id'] for row in con.execute('SELECT id FROM seasons').fetchall()]
+                    league_app.rebuild_static_artifacts(con, standings=True, players=True, season_ids=season_ids)
+                finally:
+                    con.close()
+            print(f'{args.backup_file} から復元しました')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+同時接続数ベンチマーク: WSGI (app.py) と ASGI (asgi.py) の比較
+
+順位表の SSE 配信に N 本の接続を張ったまま保持し、
+  - 配信が開始された（retry: を受信した）接続数
+  - その状態での GET /api/standings/all の応答時間
+を計測する。WSGI 側は gunicorn の gthread ワーカー（スレッド数固定）、
+ASGI 側は uvicorn で起動する。どちらもデータベースのコピーに対して実行する。
+
+使い方:
+    python benchmarks/bench_concurrency.py --connections 200 --wsgi-threads 8
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(kind: str, port: int, database: str, wsgi_threads: int) -> subprocess.Popen:
+    env = dict(os.environ, MAHJONG_DATABASE=database)
+    if kind == 'wsgi':
+        command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+                   '--workers', '1', '--worker-class', 'gthread', '--threads', str(wsgi_threads),
+                   '--timeout', '0', 'app:app']
+    else:
+        command = [sys.executable, '-m', 'uvicorn', '--host', '127.0.0.1', '--port', str(port),
+                   '--log-level', 'warning', 'asgi:application']
+    process = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start: {" ".join(command)}')
+
+
+async def _open_stream(port: int, timeout: float):
+    """SSE 接続を開き、配信開始（retry:）を受信できたら接続を返す"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(b'GET /api/standings/stream HTTP/1.1\r\nHost: localhost\r\n'
+                     b'Accept: text/event-stream\r\n\r\n')
+        await writer.drain()
+        buffer = b''
+        while b'retry:' not in buffer:
+            chunk = await asyncio.wait_for(reader.read(4096), timeout)
+            if not chunk:
+                raise ConnectionError('closed')
+            buffer += chunk
+        return writer
+    except (OSError, asyncio.TimeoutError, ConnectionError):
+        return None
+
+
+async def _timed_get(port: int, path: str, timeout: float):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def _measure(port: int, connections: int, requests: int, timeout: float) -> dict:
+    streams = await asyncio.gather(*(_open_stream(port, timeout) for _ in range(connections)))
+    accepted = [writer for writer in streams if writer is not None]
+
+    latencies = []
+    failures = 0
+    for _ in range(requests):
+        elapsed = await _timed_get(port, '/api/standings/all', timeout)
+        if elapsed is None:
+            failures += 1
+        else:
+            latencies.append(elapsed)
+
+    for writer in accepted:
+        writer.close()
+
+    return {
+        'accepted': len(accepted),
+        'failures': failures,
+        'p50': statistics.median(latencies) * 1000 if latencies else None,
+        'p95': (statistics.quantiles(latencies, n=20)[-1] * 1000
+                if len(latencies) >= 2 else None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI と ASGI の同時接続数ベンチマーク')
+    parser.add_argument('--connections', type=int, default=200, help='保持する SSE 接続数')
+    parser.add_argument('--requests', type=int, default=20, help='接続保持中に送る通常リクエスト数')
+    parser.add_argument('--wsgi-threads', type=int, default=8, help='gunicorn のスレッド数')
+    parser.add_argument('--timeout', type=float, default=5.0, help='各操作のタイムアウト（秒）')
+    parser.add_argument('--database', default=os.path.join(BASE_DIR, 'database.db'),
+                        help='計測に使うデータベース（コピーして使用）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='mahjong-bench-')
+    try:
+        print(f'SSE connections: {args.connections}, WSGI threads: {args.wsgi_threads}')
+        print(f'{"server":<6} {"streams":>9} {"GET p50":>10} {"GET p95":>10} {"failed":>7}')
+        for kind in ('wsgi', 'asgi'):
+            database = os.path.join(work_dir, f'{kind}.db')
+            shutil.copyfile(args.database, database)
+            port = _free_port()
+            server = _start_server(kind, port, database, args.wsgi_threads)
+            try:
+                result = asyncio.run(_measure(port, args.connections, args.requests, args.timeout))
+            finally:
+                server.terminate()
+                server.wait()
+
+            p50 = f'{result["p50"]:.1f}ms' if result['p50'] is not None else '-'
+            p95 = f'{result["p95"]:.1f}ms' if result['p95'] is not None else '-'
+            print(f'{kind:<6} {result["accepted"]:>4}/{args.connections:<4} {p50:>10} {p95:>10} '
+                  f'{result["failures"]:>4}/{args.requests}')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
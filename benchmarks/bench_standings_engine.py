@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+順位表の計算ベンチマーク: SQL（累計テーブル）とメモリ上の NumPy の列（standings_engine.py）の比較
+
+指定した行数の game_results を持つデータベースを一時ディレクトリに作り、app.query_standings を
+  - 全期間
+  - 日別（start_date = end_date）
+  - ある日時点（end_date のみ）
+  - 期間指定（start_date〜end_date）
+のそれぞれについて、MAHJONG_STANDINGS_ENGINE なし（SQL）とあり（NumPy）で実行した応答時間の中央値を計測する。
+NumPy 側は、最初の読み込み時間と、ゲームを1つ追加したあとの差分の反映を含む1回目の時間も表示する。
+
+使い方:
+    python benchmarks/bench_standings_engine.py --rows 1000000 --runs 5
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 一括投入の間だけ外す変更ログのトリガー
+_BULK_TRIGGERS = ('log_games_insert', 'log_game_results_insert')
+
+
+def _build_database(path: str, rows: int, players: int, days: int) -> None:
+    """4人打ちのゲームを rows / 4 個持つデータベースを作る"""
+    con = sqlite3.connect(path)
+    with open(os.path.join(BASE_DIR, 'database_schema.sql'), encoding='utf-8') as f:
+        con.executescript(f.read())
+    con.execute("INSERT INTO seasons (name, start_date, is_active) VALUES ('Benchmark', '2020-01-01', 1)")
+    con.executemany('INSERT INTO players (id, name) VALUES (?, ?)',
+                    [(f'p{i:04d}', f'Player {i}') for i in range(players)])
+
+    triggers = []
+    for name in _BULK_TRIGGERS:
+        triggers.append(con.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                                    (name,)).fetchone()[0])
+        con.execute(f'DROP TRIGGER {name}')
+    con.executemany('''
+        INSERT INTO games (id, season_id, game_date, total_hands_in_game)
+        VALUES (?, 1, date('2020-01-01', '+' || (? % ?) || ' days'), 10)
+    ''', ((f'g{k:08d}', k, days) for k in range(rows // 4)))
+    # 同じゲームに同じプレイヤーが入らないよう、ランクごとに 1/4 ずつずらす
+    con.execute('''
+        INSERT INTO game_results (game_id, player_id, raw_score, rank, calculated_points,
+                                  agari_count, riichi_count, houjuu_count, furo_count)
+        SELECT g.id,
+               printf('p%04d', (g.rowid * 7 + (r.value - 1) * (:players / 4)) % :players),
+               45000 - r.value * 10000 + (g.rowid * r.value) % 7000,
+               r.value,
+               (45000 - r.value * 10000 + (g.rowid * r.value) % 7000 - 30000) / 1000.0 + 25 - r.value * 10,
+               g.rowid % 3, (g.rowid + r.value) % 4, r.value % 2, g.rowid % 5
+        FROM games g, (SELECT 1 AS value UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4) r
+    ''', {'players': players})
+    for sql in triggers:
+        con.execute(sql)
+    con.commit()
+    con.close()
+
+
+def _median_ms(function, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='順位表の計算（SQL と NumPy）のベンチマーク')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='game_results の行数')
+    parser.add_argument('--players', type=int, default=200, help='プレイヤー数')
+    parser.add_argument('--days', type=int, default=2000, help='ゲームを分散させる日数')
+    parser.add_argument('--runs', type=int, default=5, help='各条件の実行回数（中央値を表示する）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_standings_')
+    database = os.path.join(work_dir, 'database.db')
+    try:
+        start = time.perf_counter()
+        _build_database(database, args.rows, args.players, args.days)
+        print(f'データベースの作成: {time.perf_counter() - start:.1f}s ({args.rows} 行)')
+
+        os.environ['MAHJONG_DATABASE'] = database
+        sys.path.insert(0, BASE_DIR)
+        import app as league_app
+        import rollups
+        import standings_engine
+
+        if not standings_engine.available():
+            parser.error('NumPy がインストールされていません')
+
+        con = league_app.connect_db()
+        start = time.perf_counter()
+        rollups.rebuild_rollups(con.cursor())
+        con.commit()
+        print(f'累計テーブルの作成: {time.perf_counter() - start:.1f}s')
+
+        cur = con.cursor()
+        last_day = cur.execute('SELECT MAX(game_date) FROM games').fetchone()[0]
+        middle_day = cur.execute("SELECT date(MIN(game_date), '+' || (? / 2) || ' days') FROM games",
+                                 (args.days,)).fetchone()[0]
+        range_start = cur.execute("SELECT date(?, '-90 days')", (middle_day,)).fetchone()[0]
+        fields = list(league_app.STANDINGS_FIELDS)
+        cases = (
+            ('全期間', None, None),
+            ('日別', middle_day, middle_day),
+            ('ある日時点', None, middle_day),
+            ('期間指定 (90日)', range_start, middle_day),
+        )
+
+        engine = standings_engine.get_engine(database)
+        start = time.perf_counter()
+        with engine.lock:
+            engine.sync(cur, league_app.current_revision(cur))
+        print(f'NumPy の列の読み込み: {time.perf_counter() - start:.1f}s')
+
+        print(f'\n{"条件":<16}{"SQL (ms)":>12}{"NumPy (ms)":>12}')
+        for label, start_date, end_date in cases:
+            timings = []
+            for enabled in (False, True):
+                league_app.STANDINGS_ENGINE = enabled
+                timings.append(_median_ms(
+                    lambda: league_app.query_standings(cur, fields, start_date, end_date), args.runs))
+            print(f'{label:<16}{timings[0]:>12.1f}{timings[1]:>12.1f}')
+
+        # 1ゲームを追加したあとの1回目（変更ログからの差分の反映を含む）
+        cur.execute("INSERT INTO games (id, season_id, game_date) VALUES ('bench', 1, ?)", (last_day,))
+        cur.executemany('''
+            INSERT INTO game_results (game_id, player_id, raw_score, rank, calculated_points)
+            VALUES ('bench', ?, ?, ?, ?)
+        ''', [(f'p{rank:04d}', 45000 - rank * 10000, rank, 25 - rank * 10) for rank in range(1, 5)])
+        con.commit()
+        league_app.STANDINGS_ENGINE = True
+        print(f'\n1ゲーム追加後の1回目（NumPy・全期間）: '
+              f'{_median_ms(lambda: league_app.query_standings(cur, fields), 1):.1f} ms')
+        con.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+CGI 起動時間ベンチマーク
+
+CGI ではリクエストごとにインタプリタを起動して app を読み込むため、その時間がそのまま応答時間になる。
+  - app の読み込みにかかる時間のモジュール別の内訳（python -X importtime）
+  - index.cgi を CGI として実行したときの最初の1バイトまでの時間と終了までの時間
+を計測する。後者は、アプリのディレクトリに __pycache__ を書き込めない場合（Apache の実行ユーザー）を
+想定して -B で毎回ソースからコンパイルするときと、python -m compileall で事前にコンパイルしたときを比べる。
+どちらもアプリとデータベースのコピーに対して実行する。
+
+デプロイ時には事前にコンパイルしておくこと:
+    python -m compileall -q .
+
+使い方:
+    python benchmarks/bench_startup.py --runs 20 --path /api/seasons
+"""
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def _copy_app(work_dir: str, database: str) -> str:
+    """アプリ（__pycache__ なし）とデータベースを work_dir にコピーし、データベースのパスを返す"""
+    for path in glob.glob(os.path.join(BASE_DIR, '*.py')) + [os.path.join(BASE_DIR, 'index.cgi')]:
+        shutil.copy2(path, work_dir)
+    for directory in ('templates', 'static'):
+        source = os.path.join(BASE_DIR, directory)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(work_dir, directory),
+                            ignore=shutil.ignore_patterns('data'))
+    copied = os.path.join(work_dir, 'database.db')
+    shutil.copyfile(database, copied)
+    archives = os.path.join(os.path.dirname(os.path.abspath(database)), 'archives')
+    if os.path.isdir(archives):
+        shutil.copytree(archives, os.path.join(work_dir, 'archives'))
+    return copied
+
+
+def measure_imports(work_dir: str, env: dict, runs: int):
+    """app が直接読み込むモジュールごとの累積時間（マイクロ秒の中央値）と app 全体の時間"""
+    samples = {}
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                                cwd=work_dir, env=env, capture_output=True, text=True, check=True)
+        # 子モジュールの行が親の行より先に出力される
+        children = []
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME_PATTERN.match(line)
+            if not match:
+                continue
+            cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+            if depth == 1:
+                children.append((name, cumulative))
+            elif depth == 0:
+                if name == 'app':
+                    own = int(match.group(1))
+                    for child, value in children + [('(app module body)', own), ('app', cumulative)]:
+                        samples.setdefault(child, []).append(value)
+                children = []
+    return sorted(((name, statistics.median(values)) for name, values in samples.items()),
+                  key=lambda item: -item[1])
+
+
+def _run_cgi(command, work_dir: str, env: dict):
+    """CGI を1回実行し、(最初の1バイトまでの秒数, 終了までの秒数, ステータス行) を返す"""
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=work_dir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    first = process.stdout.read(1)
+    first_byte = time.perf_counter() - start
+    rest = process.stdout.read()
+    process.wait()
+    total = time.perf_counter() - start
+    status = (first + rest).split(b'\r\n', 1)[0].decode('latin-1')
+    return first_byte, total, status
+
+
+def measure_cgi(work_dir: str, env: dict, path: str, runs: int, bytecode: bool) -> dict:
+    cgi_env = dict(env, REQUEST_METHOD='GET', PATH_INFO=path, SCRIPT_NAME='/index.cgi',
+                   QUERY_STRING='', SERVER_NAME='localhost', SERVER_PORT='80',
+                   SERVER_PROTOCOL='HTTP/1.1', GATEWAY_INTERFACE='CGI/1.1')
+    for cache in glob.glob(os.path.join(work_dir, '**', '__pycache__'), recursive=True):
+        shutil.rmtree(cache)
+    if bytecode:
+        subprocess.run([sys.executable, '-m', 'compileall', '-q', work_dir], check=True)
+        command = [sys.executable, 'index.cgi']
+    else:
+        # __pycache__ を書き込めない環境と同じく、毎回ソースからコンパイルする
+        command = [sys.executable, '-B', 'index.cgi']
+
+    first_bytes, totals, statuses = [], [], set()
+    for _ in range(runs):
+        first_byte, total, status = _run_cgi(command, work_dir, cgi_env)
+        first_bytes.append(first_byte)
+        totals.append(total)
+        statuses.add(status)
+    return {
+        'first_byte': statistics.median(first_bytes) * 1000,
+        'total': statistics.median(totals) * 1000,
+        'status': ', '.join(sorted(statuses)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CGI 起動時間ベンチマーク')
+    parser.add_argument('--runs', type=int, default=20, help='各計測の実行回数（中央値を表示）')
+    parser.add_argument('--path', default='/api/seasons', help='CGI で要求するパス')
+    parser.add_argument('--top', type=int, default=15, help='表示するモジュール数')
+    parser.add_argument('--database', default=os.path.join(BASE_DIR, 'database.db'),
+                        help='計測に使うデータベース（コピーして使用）')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='mahjong-bench-')
+    try:
+        database = _copy_app(work_dir, args.database)
+        env = dict(os.environ, MAHJONG_DATABASE=database)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env.pop('PYTHONPYCACHEPREFIX', None)
+
+        interpreter = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', 'pass'], env=env, check=True)
+            interpreter.append(time.perf_counter() - start)
+        print(f'interpreter startup (python -c pass): {statistics.median(interpreter) * 1000:.1f}ms')
+
+        print(f'\nimport app (median of {args.runs}, cumulative)')
+        for name, micros in measure_imports(work_dir, env, args.runs)[:args.top]:
+            print(f'  {name:<28} {micros / 1000:>8.1f}ms')
+
+        print(f'\nGET {args.path} via index.cgi (median of {args.runs})')
+        print(f'  {"bytecode":<24} {"first byte":>11} {"total":>9}  status')
+        for label, bytecode in (('source (-B)', False), ('compileall', True)):
+            result = measure_cgi(work_dir, env, args.path, args.runs, bytecode)
+            print(f'  {label:<24} {result["first_byte"]:>9.1f}ms {result["total"]:>7.1f}ms  {result["status"]}')
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -60,12 +60,185 @@ CREATE TABLE game_results (
     UNIQUE (game_id, rank)
 );
 
+-- 日別・プレイヤー別の集計テーブル（日付・期間指定の順位表用、書き込み時に更新）
+CREATE TABLE daily_player_stats (
+    game_date DATE NOT NULL,
+    player_id TEXT NOT NULL,
+    games_played INTEGER NOT NULL,
+    total_points REAL NOT NULL,
+    total_raw_score INTEGER NOT NULL,
+    total_rank INTEGER NOT NULL,
+    best_raw_score INTEGER,
+    wins INTEGER NOT NULL,
+    second_places INTEGER NOT NULL,
+    third_places INTEGER NOT NULL,
+    fourth_places INTEGER NOT NULL,
+    total_agari INTEGER NOT NULL,
+    total_riichi INTEGER NOT NULL,
+    total_houjuu INTEGER NOT NULL,
+    total_furo INTEGER NOT NULL,
+    total_hands INTEGER NOT NULL,
+    PRIMARY KEY (game_date, player_id),
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+);
+
+-- プレイヤー別の累計テーブル（game_date 順の累計。期間の集計は cum(end) - cum(start-1) で求める）
+CREATE TABLE player_cumulative_stats (
+    player_id TEXT NOT NULL,
+    game_date DATE NOT NULL,
+    cum_games INTEGER NOT NULL,
+    cum_points REAL NOT NULL,
+    cum_raw_score INTEGER NOT NULL,
+    cum_rank INTEGER NOT NULL,
+    cum_wins INTEGER NOT NULL,
+    cum_second_places INTEGER NOT NULL,
+    cum_third_places INTEGER NOT NULL,
+    cum_fourth_places INTEGER NOT NULL,
+    cum_agari INTEGER NOT NULL,
+    cum_riichi INTEGER NOT NULL,
+    cum_houjuu INTEGER NOT NULL,
+    cum_furo INTEGER NOT NULL,
+    cum_hands INTEGER NOT NULL,
+    PRIMARY KEY (player_id, game_date),
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- 変更ログテーブル（差分同期用）
+-- エンティティごとに最新の変更1行だけを保持し、変更のたびに新しい seq で置き換える
+CREATE TABLE change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    entity TEXT NOT NULL CHECK (entity IN ('game', 'player')),
+    entity_id TEXT NOT NULL,
+    operation TEXT NOT NULL CHECK (operation IN ('upsert', 'delete')),
+    changed_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (entity, entity_id)
+);
+
+-- 順位表の配信イベント（SSE用）。書き込みごとに1回だけ計算した順位表を保持する
+CREATE TABLE standings_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    change_seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 成績分布のヒストグラム（固定幅のバケットごとの件数、書き込み時に +1 / -1 で更新）
+CREATE TABLE score_histograms (
+    season_id INTEGER NOT NULL,
+    player_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (season_id, player_id, metric, bucket),
+    FOREIGN KEY (season_id) REFERENCES seasons(id) ON DELETE CASCADE,
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- アーカイブ済みシーズン（games / game_results / league_settings は archives/<file_name> に移動済み）
+CREATE TABLE archived_seasons (
+    season_id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    game_count INTEGER NOT NULL,
+    player_count INTEGER NOT NULL,
+    archived_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (season_id) REFERENCES seasons(id)
+);
+
+-- 集計結果のキャッシュ（対戦成績など）。revision は計算時の変更ログの最新 seq
+CREATE TABLE aggregate_cache (
+    cache_key TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- バックグラウンドジョブのキュー（jobs.py / worker.py）
+CREATE TABLE jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    -- 同じ内容の実行待ちのジョブを重複して登録しないためのキー
+    dedupe_key TEXT,
+    locked_by TEXT,
+    heartbeat DATETIME,
+    run_after DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    created_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_date DATETIME,
+    finished_date DATETIME
+);
+
+-- ゲームごとの連続記録（streaks.py）。そのゲーム終了時点の現在の連続数と最長記録
+CREATE TABLE streak_history (
+    player_id TEXT NOT NULL,
+    game_date DATE NOT NULL,
+    recorded_date DATETIME NOT NULL,
+    game_id TEXT NOT NULL,
+    top_streak INTEGER NOT NULL,
+    best_top_streak INTEGER NOT NULL,
+    no_last_streak INTEGER NOT NULL,
+    best_no_last_streak INTEGER NOT NULL,
+    no_houjuu_streak INTEGER NOT NULL,
+    best_no_houjuu_streak INTEGER NOT NULL,
+    PRIMARY KEY (player_id, game_date, recorded_date, game_id),
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- プレイヤーごとの最新の連続記録（streak_history の最後の行）
+CREATE TABLE player_streaks (
+    player_id TEXT PRIMARY KEY,
+    top_streak INTEGER NOT NULL,
+    best_top_streak INTEGER NOT NULL,
+    no_last_streak INTEGER NOT NULL,
+    best_no_last_streak INTEGER NOT NULL,
+    no_houjuu_streak INTEGER NOT NULL,
+    best_no_houjuu_streak INTEGER NOT NULL,
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+);
+
+-- プレイヤー検索用の正規化した名前（player_search.py）
+-- id は VACUUM で変わらないように明示し、FTS の rowid として使う
+CREATE TABLE player_search (
+    id INTEGER PRIMARY KEY,
+    player_id TEXT NOT NULL UNIQUE,
+    name_key TEXT NOT NULL,
+    -- かなを含む名前のローマ字（ローマ字の入力で引く。かながなければ NULL）
+    reading_key TEXT,
+    FOREIGN KEY (player_id) REFERENCES players(id) ON DELETE CASCADE
+);
+
+-- 名前の部分一致検索（trigram、player_search を外部コンテンツとする）
+CREATE VIRTUAL TABLE player_search_fts USING fts5(
+    name_key,
+    content='player_search',
+    content_rowid='id',
+    tokenize='trigram'
+);
+
+-- 適用済みのスキーマバージョン（migrations.py）
+CREATE TABLE schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- インデックス作成
 CREATE INDEX idx_seasons_active ON seasons(is_active);
 CREATE INDEX idx_games_season_date ON games(season_id, game_date);
 CREATE INDEX idx_game_results_player ON game_results(player_id);
 CREATE INDEX idx_game_results_game ON game_results(game_id);
 CREATE INDEX idx_league_settings_season ON league_settings(season_id);
+CREATE INDEX idx_daily_player_stats_player ON daily_player_stats(player_id, game_date);
+CREATE INDEX idx_player_search_name_key ON player_search(name_key);
+CREATE INDEX idx_player_search_reading_key ON player_search(reading_key);
+CREATE INDEX idx_jobs_queue ON jobs(status, run_after, id);
+CREATE INDEX idx_jobs_dedupe_key ON jobs(dedupe_key, status);
 
 
 -- トリガー：更新日時の自動更新
@@ -87,6 +260,92 @@ CREATE TRIGGER update_league_settings_timestamp
         UPDATE league_settings SET updated_date = CURRENT_TIMESTAMP WHERE id = NEW.id;
     END;
 
+-- トリガー：変更ログの記録
+CREATE TRIGGER log_games_insert
+    AFTER INSERT ON games
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', NEW.id, 'upsert');
+    END;
+
+CREATE TRIGGER log_games_update
+    AFTER UPDATE ON games
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', NEW.id, 'upsert');
+    END;
+
+CREATE TRIGGER log_games_delete
+    AFTER DELETE ON games
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', OLD.id, 'delete');
+    END;
+
+-- ゲーム結果の変更はゲームの更新として記録する（ゲーム自体が削除済みなら記録しない）
+CREATE TRIGGER log_game_results_insert
+    AFTER INSERT ON game_results
+    WHEN EXISTS (SELECT 1 FROM games WHERE id = NEW.game_id)
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', NEW.game_id, 'upsert');
+    END;
+
+CREATE TRIGGER log_game_results_update
+    AFTER UPDATE ON game_results
+    WHEN EXISTS (SELECT 1 FROM games WHERE id = NEW.game_id)
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', NEW.game_id, 'upsert');
+    END;
+
+CREATE TRIGGER log_game_results_delete
+    AFTER DELETE ON game_results
+    WHEN EXISTS (SELECT 1 FROM games WHERE id = OLD.game_id)
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('game', OLD.game_id, 'upsert');
+    END;
+
+CREATE TRIGGER log_players_insert
+    AFTER INSERT ON players
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('player', NEW.id, 'upsert');
+    END;
+
+CREATE TRIGGER log_players_update
+    AFTER UPDATE ON players
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('player', NEW.id, 'upsert');
+    END;
+
+CREATE TRIGGER log_players_delete
+    AFTER DELETE ON players
+    BEGIN
+        INSERT OR REPLACE INTO change_log (entity, entity_id, operation) VALUES ('player', OLD.id, 'delete');
+    END;
+
+-- トリガー：プレイヤー検索の FTS を player_search と同期する
+CREATE TRIGGER player_search_fts_insert
+    AFTER INSERT ON player_search
+    BEGIN
+        INSERT INTO player_search_fts (rowid, name_key) VALUES (NEW.id, NEW.name_key);
+    END;
+
+CREATE TRIGGER player_search_fts_update
+    AFTER UPDATE ON player_search
+    BEGIN
+        INSERT INTO player_search_fts (player_search_fts, rowid, name_key) VALUES ('delete', OLD.id, OLD.name_key);
+        INSERT INTO player_search_fts (rowid, name_key) VALUES (NEW.id, NEW.name_key);
+    END;
+
+CREATE TRIGGER player_search_fts_delete
+    AFTER DELETE ON player_search
+    BEGIN
+        INSERT INTO player_search_fts (player_search_fts, rowid, name_key) VALUES ('delete', OLD.id, OLD.name_key);
+    END;
+
+-- トリガー：ゲーム・プレイヤーが変更されたら集計キャッシュを破棄する
+CREATE TRIGGER clear_aggregate_cache
+    AFTER INSERT ON change_log
+    BEGIN
+        DELETE FROM aggregate_cache;
+    END;
+
 -- アクティブシーズンの一意性制約
 CREATE TRIGGER enforce_single_active_season
     BEFORE UPDATE ON seasons
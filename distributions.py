@@ -0,0 +1,148 @@
+"""
+麻雀リーグ管理システム - 成績分布のヒストグラム
+
+score_histograms: (season_id, player_id, metric, bucket) ごとの件数。
+バケットは指標ごとに固定幅・固定範囲なので、プレイヤー・シーズンをまたいで
+件数を足し合わせるだけで分布を合成でき、サイズも上限がある。
+
+ゲームの記録・更新・削除と同じトランザクション内で、そのゲームの結果を
++1 / -1 して反映する。中央値などはヒストグラムから求める（誤差はバケット幅以内）。
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+# 指標 -> (game_results の列, バケット幅, 最小バケット, 最大バケット)
+# 範囲外の値は両端のバケットにまとめる
+METRICS: Dict[str, Tuple[str, float, int, int]] = {
+    'rawScore': ('raw_score', 1000, -100, 200),
+    'points': ('calculated_points', 1.0, -200, 200),
+}
+
+
+def _bucket_sql(metric: str) -> str:
+    column, width, lowest, highest = METRICS[metric]
+    # floor() は SQLite の数学関数が無効なビルドでは使えないため CAST で切り捨てる
+    value = f'(gr.{column} * 1.0 / {width})'
+    bucket = f'(CAST({value} AS INTEGER) - ({value} < CAST({value} AS INTEGER)))'
+    return f'MIN(MAX({bucket}, {lowest}), {highest})'
+
+
+def apply_game(cur, game_id: str, sign: int) -> None:
+    """ゲームの結果をヒストグラムに加える（sign=1）か取り除く（sign=-1）"""
+    for metric in METRICS:
+        cur.execute(f'''
+            INSERT INTO score_histograms (season_id, player_id, metric, bucket, count)
+            SELECT g.season_id, gr.player_id, ?, {_bucket_sql(metric)}, ?
+            FROM game_results gr
+            JOIN games g ON gr.game_id = g.id
+            WHERE g.id = ?
+            ON CONFLICT (season_id, player_id, metric, bucket)
+            DO UPDATE SET count = count + excluded.count
+        ''', (metric, sign, game_id))
+    cur.execute('DELETE FROM score_histograms WHERE count <= 0')
+
+
+def rebuild_histograms(cur, season_id: Optional[int] = None) -> None:
+    """ヒストグラムを作り直す（season_id を指定した場合はそのシーズンだけ）"""
+    where = '' if season_id is None else 'WHERE season_id = :season_id'
+    cur.execute(f'DELETE FROM score_histograms {where}', {'season_id': season_id})
+    for metric in METRICS:
+        cur.execute(f'''
+            INSERT INTO score_histograms (season_id, player_id, metric, bucket, count)
+            SELECT g.season_id, gr.player_id, :metric, {_bucket_sql(metric)} AS bucket, COUNT(*)
+            FROM all_game_results gr
+            JOIN all_games g ON gr.game_id = g.id
+            {'' if season_id is None else 'WHERE g.season_id = :season_id'}
+            GROUP BY g.season_id, gr.player_id, bucket
+        ''', {'metric': metric, 'season_id': season_id})
+
+
+def _quantile(buckets: List[Tuple[int, int]], total: int, width: float, q: float) -> Optional[float]:
+    """バケット内は一様に分布しているとみなして分位点を求める"""
+    if total == 0:
+        return None
+    target = q * total
+    seen = 0
+    for bucket, count in buckets:
+        if seen + count >= target:
+            return (bucket + (target - seen) / count) * width
+        seen += count
+    bucket = buckets[-1][0]
+    return (bucket + 1) * width
+
+
+def summarize(metric: str, buckets: List[Tuple[int, int]]) -> Dict:
+    """(bucket, 件数) の昇順リストから分布の要約を作る"""
+    width = METRICS[metric][1]
+    total = sum(count for _, count in buckets)
+    return {
+        'metric': metric,
+        'bucketWidth': width,
+        'count': total,
+        'p10': _quantile(buckets, total, width, 0.1),
+        'median': _quantile(buckets, total, width, 0.5),
+        'p90': _quantile(buckets, total, width, 0.9),
+        'histogram': [
+            {'lower': bucket * width, 'upper': (bucket + 1) * width, 'count': count}
+            for bucket, count in buckets
+        ],
+    }
+
+
+# 分布をまとめる単位（player: プレイヤーごと、season: シーズンごとに全プレイヤー、all: 全体で1つ）
+GROUP_BY = ('player', 'season', 'all')
+
+
+def query_distributions(cur, metric: str, season_id: Optional[int] = None,
+                        player_id: Optional[str] = None, group_by: str = 'player') -> List[Dict]:
+    """group_by の単位ごとの分布（バケットの件数を足し合わせる。シーズン指定がなければ全シーズンを合成）"""
+    if group_by not in GROUP_BY:
+        raise ValueError(f'group_by must be one of {", ".join(GROUP_BY)}')
+    conditions = ['h.metric = :metric']
+    if season_id is not None:
+        conditions.append('h.season_id = :season_id')
+    if player_id is not None:
+        conditions.append('h.player_id = :player_id')
+    params = {'metric': metric, 'season_id': season_id, 'player_id': player_id}
+
+    if group_by == 'all':
+        rows = cur.execute(f'''
+            SELECT h.bucket, SUM(h.count) AS count
+            FROM score_histograms h
+            WHERE {' AND '.join(conditions)}
+            GROUP BY h.bucket
+            ORDER BY h.bucket
+        ''', params).fetchall()
+        return [summarize(metric, [(row['bucket'], row['count']) for row in rows])] if rows else []
+
+    if group_by == 'season':
+        rows = cur.execute(f'''
+            SELECT h.season_id AS id, s.name, h.bucket, SUM(h.count) AS count
+            FROM score_histograms h
+            JOIN seasons s ON s.id = h.season_id
+            WHERE {' AND '.join(conditions)}
+            GROUP BY h.season_id, h.bucket
+            ORDER BY h.season_id, h.bucket
+        ''', params).fetchall()
+        key, describe = 'season', lambda row: {'id': row['id'], 'name': row['name']}
+    else:
+        rows = cur.execute(f'''
+            SELECT h.player_id AS id, p.name, p.avatar_url, h.bucket, SUM(h.count) AS count
+            FROM score_histograms h
+            JOIN players p ON p.id = h.player_id
+            WHERE {' AND '.join(conditions)}
+            GROUP BY h.player_id, h.bucket
+            ORDER BY p.name, h.player_id, h.bucket
+        ''', params).fetchall()
+        key, describe = 'player', lambda row: {'id': row['id'], 'name': row['name'], 'avatarUrl': row['avatar_url']}
+
+    groups = {}
+    buckets = {}
+    for row in rows:
+        groups.setdefault(row['id'], describe(row))
+        buckets.setdefault(row['id'], []).append((row['bucket'], row['count']))
+
+    return [
+        {key: group, **summarize(metric, buckets[group_id])}
+        for group_id, group in groups.items()
+    ]
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+麻雀リーグ管理システム - 分析用の列指向エクスポート
+
+game_results を1行とし、games の列とシーズン名・プレイヤー名を付けた表を書き出す。
+pyarrow があれば Parquet（チャンクごとに1つの行グループ）、なければ NumPy の .npz（列ごとの配列）。
+どちらも pandas で読める:
+    pd.read_parquet('game_results.parquet')
+    pd.DataFrame(dict(np.load('game_results.npz')))
+
+行は EXPORT_CHUNK_ROWS 件ずつ読み出して書き込むので、行数が多くてもメモリ使用量は一定。
+ライブDBは game_results.id の範囲でチャンクごとに別のクエリで読み、書き込みを長く待たせない
+（エクスポート中に記録されたゲームは含まれないことがある）。アーカイブは変更されないので1回のクエリで読む。
+シーズン名・プレイヤー名は少ないので最初に読み込み、Python で付ける。
+.npz は列ごとにチャンクを一時ファイルに保存し、最後に1つの配列にまとめる（文字列の長さは全体の最大に揃える）。
+
+使い方:
+    python export.py [--league NAME] [--format parquet|npz] [--season-id 3] [-o game_results.parquet]
+    python worker.py enqueue export_game_results --payload '{"format": "npz"}'
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import archive
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy がない環境
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow がない環境
+    pa = pq = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXPORT_DIR = os.environ.get('MAHJONG_EXPORT_DIR') or os.path.join(BASE_DIR, 'exports')
+
+# 1回のクエリで読む行数
+EXPORT_CHUNK_ROWS = 50_000
+
+EXPORT_FORMATS = {'parquet': '.parquet', 'npz': '.npz'}
+
+# 列名, SELECT の式（season_name / player_name は後から付ける）, 型
+# 型: int, nullable_int（.npz では NaN を使うため float64）, float, str, date, datetime
+EXPORT_COLUMNS: Tuple[Tuple[str, Optional[str], str], ...] = (
+    ('game_id', 'g.id', 'str'),
+    ('season_id', 'g.season_id', 'int'),
+    ('season_name', None, 'str'),
+    ('game_date', 'g.game_date', 'date'),
+    ('recorded_date', 'g.recorded_date', 'datetime'),
+    ('round_name', 'g.round_name', 'str'),
+    ('total_hands_in_game', 'g.total_hands_in_game', 'nullable_int'),
+    ('player_id', 'gr.player_id', 'str'),
+    ('player_name', None, 'str'),
+    ('raw_score', 'gr.raw_score', 'int'),
+    ('rank', 'gr.rank', 'int'),
+    ('calculated_points', 'gr.calculated_points', 'float'),
+    ('agari_count', 'COALESCE(gr.agari_count, 0)', 'int'),
+    ('riichi_count', 'COALESCE(gr.riichi_count, 0)', 'int'),
+    ('houjuu_count', 'COALESCE(gr.houjuu_count, 0)', 'int'),
+    ('furo_count', 'COALESCE(gr.furo_count, 0)', 'int'),
+)
+
+_SELECTED = [(name, expression) for name, expression, _ in EXPORT_COLUMNS if expression]
+
+
+def default_format() -> str:
+    """使える形式（pyarrow があれば Parquet）"""
+    if pa is not None:
+        return 'parquet'
+    if np is not None:
+        return 'npz'
+    raise RuntimeError('Export requires pyarrow or NumPy')
+
+
+def check_format(fmt: Optional[str]) -> str:
+    """形式を確かめる（省略すると default_format）
+
+    知らない形式は ValueError、必要なライブラリがなければ RuntimeError。
+    """
+    fmt = fmt or default_format()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of {", ".join(EXPORT_FORMATS)}')
+    if fmt == 'parquet' and pa is None:
+        raise RuntimeError('Parquet export requires pyarrow')
+    if fmt == 'npz' and np is None:
+        raise RuntimeError('npz export requires NumPy')
+    return fmt
+
+
+def _sources(con, season_id: Optional[int]) -> List[str]:
+    """読み出すスキーマ（ライブDBと ATTACH 済みのアーカイブ）"""
+    archive.ensure_attached(con)
+    if season_id is not None:
+        row = con.execute('''
+            SELECT MIN(season_id) FROM archived_seasons
+            WHERE file_name = (SELECT file_name FROM archived_seasons WHERE season_id = ?)
+        ''', (season_id,)).fetchone()
+        return [f'archive_{row[0]}'] if row[0] is not None else ['main']
+    return ['main'] + [alias for alias, _ in archive.archive_files(con)]
+
+
+def iter_chunks(con, season_id: Optional[int] = None,
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[Dict[str, list]]:
+    """EXPORT_COLUMNS の列名 -> 値のリスト を、最大 chunk_rows 行ずつ返す"""
+    seasons = dict(con.execute('SELECT id, name FROM seasons').fetchall())
+    players = dict(con.execute('SELECT id, name FROM players').fetchall())
+    season_filter = '' if season_id is None else 'AND g.season_id = :season_id'
+    select = ', '.join(expression for _, expression in _SELECTED)
+
+    def to_columns(rows):
+        columns = dict(zip((name for name, _ in _SELECTED), (list(values) for values in zip(*rows))))
+        columns['season_name'] = [seasons.get(value) for value in columns['season_id']]
+        columns['player_name'] = [players.get(value) for value in columns['player_id']]
+        return columns
+
+    for schema in _sources(con, season_id):
+        if schema == 'main':
+            # 主キーの範囲ごとに短いクエリで読む（読み取りロックをチャンクごとに手放す）
+            last_id = 0
+            while True:
+                rows = con.execute(f'''
+                    SELECT gr.id, {select}
+                    FROM main.game_results gr
+                    JOIN main.games g ON g.id = gr.game_id
+                    WHERE gr.id > :last_id {season_filter}
+                    ORDER BY gr.id
+                    LIMIT :limit
+                ''', {'last_id': last_id, 'season_id': season_id, 'limit': chunk_rows}).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                yield to_columns([tuple(row)[1:] for row in rows])
+        else:
+            cursor = con.execute(f'''
+                SELECT {select}
+                FROM {schema}.game_results gr
+                JOIN {schema}.games g ON g.id = gr.game_id
+                WHERE 1 {season_filter}
+            ''', {'season_id': season_id})
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield to_columns([tuple(row) for row in rows])
+
+
+# ==================== Parquet ====================
+
+def _arrow_type(kind: str):
+    return {
+        'int': pa.int64(), 'nullable_int': pa.int64(), 'float': pa.float64(), 'str': pa.string(),
+        'date': pa.date32(), 'datetime': pa.timestamp('s'),
+    }[kind]
+
+
+def _arrow_array(values: list, kind: str):
+    if kind in ('date', 'datetime'):
+        return pa.array(values, pa.string()).cast(_arrow_type(kind))
+    return pa.array(values, _arrow_type(kind))
+
+
+def write_parquet(con, path: str, season_id: Optional[int] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    schema = pa.schema([(name, _arrow_type(kind)) for name, _, kind in EXPORT_COLUMNS])
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for columns in iter_chunks(con, season_id, chunk_rows):
+            writer.write_table(pa.Table.from_arrays(
+                [_arrow_array(columns[name], kind) for name, _, kind in EXPORT_COLUMNS], schema=schema))
+            rows += len(columns['game_id'])
+    return rows
+
+
+# ==================== .npz ====================
+
+def _numpy_array(values: list, kind: str):
+    if kind == 'int':
+        return np.array(values, dtype=np.int64)
+    if kind in ('nullable_int', 'float'):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    if kind == 'date':
+        return np.array(values, dtype='datetime64[D]')
+    if kind == 'datetime':
+        return np.array(values, dtype='datetime64[s]')
+    return np.array(['' if value is None else value for value in values], dtype=str)
+
+
+def _empty_dtype(kind: str):
+    return {'int': np.int64, 'nullable_int': np.float64, 'float': np.float64, 'str': '<U1',
+            'date': 'datetime64[D]', 'datetime': 'datetime64[s]'}[kind]
+
+
+def write_npz(con, path: str, season_id: Optional[int] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> int:
+    parts_dir = tempfile.mkdtemp(prefix='.export-', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        # 1. チャンクごと・列ごとに保存する
+        chunk_lengths = []
+        for index, columns in enumerate(iter_chunks(con, season_id, chunk_rows)):
+            for name, _, kind in EXPORT_COLUMNS:
+                np.save(os.path.join(parts_dir, f'{name}.{index}.npy'), _numpy_array(columns[name], kind))
+            chunk_lengths.append(len(columns['game_id']))
+        rows = sum(chunk_lengths)
+
+        # 2. 列ごとに1つの配列にまとめて zip に加える（np.load で読める .npz と同じ形式）
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive_file:
+            for name, _, kind in EXPORT_COLUMNS:
+                parts = [os.path.join(parts_dir, f'{name}.{index}.npy') for index in range(len(chunk_lengths))]
+                column_path = os.path.join(parts_dir, f'{name}.npy')
+                if rows:
+                    dtype = np.result_type(*(np.load(part, mmap_mode='r').dtype for part in parts))
+                    merged = np.lib.format.open_memmap(column_path, mode='w+', dtype=dtype, shape=(rows,))
+                    offset = 0
+                    for part in parts:
+                        chunk = np.load(part, mmap_mode='r')
+                        merged[offset:offset + len(chunk)] = chunk
+                        offset += len(chunk)
+                        del chunk
+                        os.remove(part)
+                    merged.flush()
+                    del merged
+                else:
+                    np.save(column_path, np.empty(0, dtype=_empty_dtype(kind)))
+                archive_file.write(column_path, arcname=f'{name}.npy')
+                os.remove(column_path)
+        return rows
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+
+# ==================== 実行 ====================
+
+def export_game_results(con, fmt: Optional[str] = None, path: Optional[str] = None,
+                        season_id: Optional[int] = None, chunk_rows: int = EXPORT_CHUNK_ROWS,
+                        directory: Optional[str] = None) -> Dict[str, Any]:
+    """エクスポートを作成する（一時ファイルに書き出してから置き換える）
+
+    con はアーカイブを ATTACH した接続（app.connect_db）。path を省略すると directory
+    （省略時は EXPORT_DIR）に作成する。
+    """
+    fmt = check_format(fmt)
+
+    if path is None:
+        directory = directory or EXPORT_DIR
+        os.makedirs(directory, exist_ok=True)
+        scope = 'all' if season_id is None else f'season-{season_id}'
+        path = os.path.join(directory, f'game_results-{scope}-{datetime.now():%Y%m%d-%H%M%S}'
+                                        f'{EXPORT_FORMATS[fmt]}')
+    fd, tmp_path = tempfile.mkstemp(prefix='.export-', suffix=EXPORT_FORMATS[fmt],
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    try:
+        writer = write_parquet if fmt == 'parquet' else write_npz
+        rows = writer(con, tmp_path, season_id, chunk_rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return {'path': path, 'fileName': os.path.basename(path), 'format': fmt, 'rows': rows,
+            'bytes': os.path.getsize(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ゲーム結果を分析用の列指向ファイルに書き出す')
+    parser.add_argument('--league', help='対象のリーグ（MAHJONG_LEAGUES_DIR。出力はリーグのディレクトリの exports/）')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), help='出力形式（既定は pyarrow があれば parquet）')
+    parser.add_argument('--season-id', type=int, help='書き出すシーズン（省略すると全シーズン）')
+    parser.add_argument('-o', '--output', help='出力ファイル（省略すると exports/ に作成）')
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS, help='1回に読む行数')
+    args = parser.parse_args()
+
+    try:
+        fmt = check_format(args.format)
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+
+    import app as league_app
+
+    try:
+        league = league_app.open_league(args.league)
+    except ValueError:
+        parser.error(f'リーグ {args.league} がありません')
+
+    with league_app.league_context(league):
+        con = league_app.connect_db()
+        try:
+            result = export_game_results(con, fmt, args.output, args.season_id, args.chunk_rows,
+                                         directory=league_app.export_dir())
+        except (ValueError, RuntimeError) as e:
+            parser.error(str(e))
+        finally:
+            con.close()
+    print(f"{result['rows']} 行を {result['path']} に書き出しました（{result['format']}, {result['bytes']} bytes）")
+
+
+if __name__ == '__main__':
+    main()
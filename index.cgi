@@ -1,10 +1,17 @@
 #!/usr/keio/Anaconda3-2024.10-1/bin/python
 
-import cgitb
-cgitb.enable()
+import os
+
+# cgitb は読み込みに時間がかかり、API のエラーは JSON で返すので画面表示のときだけ有効にする
+# （cgitb は Python 3.13 で削除された）
+if not os.environ.get('PATH_INFO', '').startswith('/api/'):
+    try:
+        import cgitb
+        cgitb.enable()
+    except ImportError:
+        pass
 
 from wsgiref.handlers import CGIHandler
-import os
 os.environ['SCRIPT_NAME'] = \
     os.environ['SCRIPT_NAME'].removesuffix('/index.cgi')
 
@@ -2,11 +2,16 @@
 """
 データベース初期化スクリプト
 麻雀リーグ管理システム
+
+既存のデータベースを削除して作り直す。稼働中のデータベースのスキーマ更新には
+migrations.py を使う。
 """
 
 import sqlite3
 import os
 
+import migrations
+
 DATABASE = 'database.db'
 
 def init_database():
@@ -34,6 +39,8 @@ def init_database():
     # スキーマ実行
     print("データベーススキーマを作成しています...")
     cursor.executescript(schema_sql)
+    # スキーマファイルは最新の定義なので、全マイグレーションを適用済みとして記録する
+    migrations.stamp_latest(conn)
     
     # 初期データ投入
     print("初期データを投入しています...")
@@ -0,0 +1,227 @@
+"""
+麻雀リーグ管理システム - バックグラウンドジョブのキュー
+
+jobs: 実行待ち・実行中・完了したジョブ。リクエストの処理中に時間のかかる処理（シーズンのポイントの
+再計算・集計テーブルの作り直し・アーカイブなど）を直接行う代わりに、ここに登録してすぐに応答を返し、
+worker.py のプロセスが順に取り出して実行する。
+worker.py を動かしていない環境（CGI など）では MAHJONG_JOB_WORKER を設定せず、アプリが登録したジョブを
+そのリクエストのレスポンスを返し終えてから実行する（app.run_job_after_response。エクスポートはリクエストの中）。worker.py を常駐させるときは MAHJONG_JOB_WORKER=1 にする。
+
+取り出しは1つの UPDATE ... RETURNING で行うので、複数のワーカーが同じジョブを実行することはない。
+失敗したジョブは max_attempts 回まで、待ち時間を倍にしながら再実行する（ValueError は入力の誤りとして
+再実行しない）。実行中のワーカーは定期的に heartbeat を更新し、途中で止まったワーカーのジョブは
+JOB_STALE_SECONDS 後に再び実行待ちに戻す。
+
+ジョブの処理は register で種類ごとに登録する（app.py の Jobs セクション）。
+処理は (con, payload, report) を受け取り、結果（JSON にできる値）を返す。
+report(progress, message) で進捗（0〜1）を記録する。書き込みはコミットしてから report を呼ぶこと。
+"""
+
+import json
+import threading
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+# 既定の最大実行回数・再実行までの待ち時間（2回目以降は倍になる）
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY_SECONDS = 30
+# 実行中のワーカーが heartbeat を更新する間隔と、止まったとみなすまでの秒数
+JOB_HEARTBEAT_SECONDS = 30
+JOB_STALE_SECONDS = 600
+
+# ジョブの種類 -> 処理
+HANDLERS: Dict[str, Callable] = {}
+
+
+def register(kind: str):
+    """ジョブの処理を登録するデコレーター"""
+    def decorator(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue(cur, kind: str, payload: Optional[Dict[str, Any]] = None, dedupe_key: Optional[str] = None,
+            max_attempts: int = JOB_MAX_ATTEMPTS) -> int:
+    """ジョブを登録してIDを返す（コミットは呼び出し側のトランザクションで行う）
+
+    dedupe_key が同じジョブが実行待ちなら、新たに登録せずそのIDを返す。
+    実行中のジョブは既に古いデータを読んでいる可能性があるため、重複とみなさない。
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    if dedupe_key is not None:
+        queued = cur.execute('''
+            SELECT id FROM jobs WHERE dedupe_key = ? AND status = 'queued' ORDER BY id LIMIT 1
+        ''', (dedupe_key,)).fetchone()
+        if queued:
+            return queued[0]
+    cur.execute('''
+        INSERT INTO jobs (kind, payload, dedupe_key, max_attempts) VALUES (?, ?, ?, ?)
+    ''', (kind, json.dumps(payload or {}, ensure_ascii=False), dedupe_key, max_attempts))
+    return cur.lastrowid
+
+
+def requeue_stale(con, stale_seconds: int = JOB_STALE_SECONDS) -> int:
+    """heartbeat が途絶えた実行中のジョブを実行待ちに戻す（回数を使い切っていれば失敗にする）"""
+    cur = con.execute('''
+        UPDATE jobs SET
+            status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            error = 'Worker stopped responding',
+            locked_by = NULL,
+            finished_date = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END
+        WHERE status = 'running' AND heartbeat < datetime('now', ?)
+    ''', (f'-{int(stale_seconds)} seconds',))
+    con.commit()
+    return cur.rowcount
+
+
+def claim_next(con, worker_id: str, job_id: Optional[int] = None):
+    """実行できる最も古いジョブ（job_id を指定するとそのジョブ）を実行中にして返す（なければ None）"""
+    job = con.execute('''
+        UPDATE jobs SET
+            status = 'running', attempts = attempts + 1, locked_by = :worker_id, progress = 0, message = NULL,
+            started_date = CURRENT_TIMESTAMP, heartbeat = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP AND (:job_id IS NULL OR id = :job_id)
+            ORDER BY run_after, id
+            LIMIT 1
+        )
+        RETURNING id, kind, payload, attempts, max_attempts
+    ''', {'worker_id': worker_id, 'job_id': job_id}).fetchone()
+    con.commit()
+    return job
+
+
+def report_progress(con, job_id: int, progress: float, message: Optional[str] = None) -> None:
+    con.execute('''
+        UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (min(max(float(progress), 0.0), 1.0), message, job_id))
+    con.commit()
+
+
+def _finish(con, job, result=None, error: Optional[BaseException] = None) -> None:
+    job_id, attempts, max_attempts = job[0], job[3], job[4]
+    if error is None:
+        con.execute('''
+            UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, error = NULL,
+                locked_by = NULL, finished_date = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (json.dumps(result, ensure_ascii=False), job_id))
+    elif attempts < max_attempts and not isinstance(error, ValueError):
+        delay = JOB_RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+        con.execute('''
+            UPDATE jobs SET status = 'queued', error = ?, locked_by = NULL,
+                run_after = datetime('now', ?)
+            WHERE id = ?
+        ''', (f'{type(error).__name__}: {error}', f'+{delay} seconds', job_id))
+    else:
+        con.execute('''
+            UPDATE jobs SET status = 'failed', error = ?, locked_by = NULL, finished_date = CURRENT_TIMESTAMP
+            WHERE id = ?
+        ''', (f'{type(error).__name__}: {error}', job_id))
+    con.commit()
+
+
+def _heartbeat(connect: Callable, job_id: int, stop: threading.Event) -> None:
+    """処理が report を呼ばない間も、実行中であることを記録し続ける"""
+    con = connect()
+    try:
+        while not stop.wait(JOB_HEARTBEAT_SECONDS):
+            con.execute('UPDATE jobs SET heartbeat = CURRENT_TIMESTAMP WHERE id = ?', (job_id,))
+            con.commit()
+    finally:
+        con.close()
+
+
+def run_next(connect: Callable, worker_id: str, log: Callable[[str], None] = print,
+             job_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """次のジョブ（job_id を指定するとそのジョブ）を1つ実行し、(id, kind, status) を返す
+
+    実行できるジョブがなければ None。
+    connect はデータベース接続を開く関数。ジョブの管理・処理・heartbeat でそれぞれ別の接続を使う。
+    """
+    con = connect()
+    try:
+        requeue_stale(con)
+        job = claim_next(con, worker_id, job_id)
+        if job is None:
+            return None
+        job_id, kind = job[0], job[1]
+        log(f'job {job_id} {kind} started (attempt {job[3]}/{job[4]})')
+
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(connect, job_id, stop), daemon=True)
+        beat.start()
+        work = connect()
+        try:
+            handler = HANDLERS.get(kind)
+            if handler is None:
+                raise ValueError(f'Unknown job kind: {kind}')
+            result = handler(work, json.loads(job[2]),
+                             lambda progress, message=None: report_progress(con, job_id, progress, message))
+            work.commit()
+        except Exception as e:
+            work.rollback()
+            log(f'job {job_id} {kind} failed: {e}\n{traceback.format_exc()}')
+            _finish(con, job, error=e)
+        else:
+            _finish(con, job, result=result)
+            log(f'job {job_id} {kind} succeeded')
+        finally:
+            stop.set()
+            beat.join()
+            work.close()
+        status = con.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()[0]
+        return {'id': job_id, 'kind': kind, 'status': status}
+    finally:
+        con.close()
+
+
+# ==================== 参照 ====================
+
+def _job_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'payload': json.loads(row['payload']),
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'maxAttempts': row['max_attempts'],
+        'progress': row['progress'],
+        'message': row['message'],
+        'result': json.loads(row['result']) if row['result'] is not None else None,
+        'error': row['error'],
+        'createdDate': row['created_date'],
+        'runAfter': row['run_after'],
+        'startedDate': row['started_date'],
+        'finishedDate': row['finished_date'],
+    }
+
+
+def query_job(cur, job_id: int) -> Optional[Dict[str, Any]]:
+    row = cur.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+
+def query_jobs(cur, status: Optional[str] = None, kind: Optional[str] = None,
+               limit: int = 50) -> List[Dict[str, Any]]:
+    """新しい順のジョブ一覧"""
+    conditions, params = [], []
+    if status:
+        conditions.append('status = ?')
+        params.append(status)
+    if kind:
+        conditions.append('kind = ?')
+        params.append(kind)
+    rows = cur.execute(f'''
+        SELECT * FROM jobs
+        {f'WHERE {" AND ".join(conditions)}' if conditions else ''}
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (*params, limit)).fetchall()
+    return [_job_dict(row) for row in rows]
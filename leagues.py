@@ -0,0 +1,291 @@
+"""
+麻雀リーグ管理システム - 1つのインストールで複数のリーグを運用する
+
+MAHJONG_LEAGUES_DIR を設定すると、その下のディレクトリ1つを1リーグとして扱い、
+LEAGUES_DIR/<リーグ名>/database.db をそのリーグのデータベースにする。アーカイブ・スナップショット・
+ロックファイル・エクスポートもデータベースと同じディレクトリに作られるので、リーグ間で混ざらない。
+
+リクエストは次のどちらかでリーグに振り分ける（どちらでもなければ従来の DATABASE）。
+  - パス: /l/<リーグ名>/api/...（/l/<リーグ名> は SCRIPT_NAME に移すので、画面の BASE_PATH もそのリーグになる）
+  - ホスト名: MAHJONG_LEAGUE_DOMAIN=leagues.example.com のとき <リーグ名>.leagues.example.com
+
+プロセス内ではリーグごとに接続のプールを持ち、リクエストの終わりに接続を閉じずに戻して使い回す。
+開いているリーグが LEAGUES_CACHED を超えたときと、LEAGUE_IDLE_SECONDS 使われなかったときは、
+最も長く使われていないリーグから接続とメモリ上のキャッシュ（standings_engine の列）を解放する。
+
+使い方:
+    python leagues.py create club-a      # リーグを作成する
+    python leagues.py list
+    python leagues.py migrate            # 全リーグのスキーマを最新にする
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import archive
+
+LEAGUES_DIR = os.environ.get('MAHJONG_LEAGUES_DIR')
+LEAGUE_DOMAIN = os.environ.get('MAHJONG_LEAGUE_DOMAIN')
+# プロセス内で同時に開いておくリーグ数と、使われていないリーグを解放するまでの秒数
+LEAGUES_CACHED = int(os.environ.get('MAHJONG_LEAGUES_CACHED', '64'))
+LEAGUE_IDLE_SECONDS = 600
+# リーグごとにプールしておく接続数（超えた分はリクエストの終わりに閉じる）
+LEAGUE_POOL_SIZE = 2
+
+LEAGUE_DATABASE_NAME = 'database.db'
+# WSGI の environ に入れるリーグ名のキー
+ENVIRON_KEY = 'mahjong.league'
+
+_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,62}$')
+
+
+def enabled() -> bool:
+    return bool(LEAGUES_DIR)
+
+
+def valid_name(name: str) -> bool:
+    return bool(_NAME_PATTERN.match(name))
+
+
+def database_path(name: str) -> str:
+    if not valid_name(name):
+        raise ValueError(f'Invalid league name: {name}')
+    return os.path.join(os.path.abspath(LEAGUES_DIR), name, LEAGUE_DATABASE_NAME)
+
+
+def list_leagues() -> List[str]:
+    """データベースのあるリーグ名の一覧"""
+    if not enabled() or not os.path.isdir(LEAGUES_DIR):
+        return []
+    return sorted(name for name in os.listdir(LEAGUES_DIR)
+                  if valid_name(name) and os.path.exists(database_path(name)))
+
+
+def split_path(path: str) -> Tuple[Optional[str], str]:
+    """/l/<リーグ名>/... を (リーグ名, 残りのパス) に分ける（リーグのパスでなければ (None, path)）"""
+    if not enabled() or not path.startswith('/l/'):
+        return None, path
+    name, slash, rest = path[3:].partition('/')
+    if not name:
+        return None, path
+    return name, slash + rest
+
+
+def name_from_host(host: str) -> Optional[str]:
+    """<リーグ名>.LEAGUE_DOMAIN のホスト名からリーグ名を取り出す"""
+    if not enabled() or not LEAGUE_DOMAIN or not host:
+        return None
+    host = host.split(':', 1)[0].lower()
+    suffix = '.' + LEAGUE_DOMAIN.lower()
+    if host.endswith(suffix) and '.' not in host[:-len(suffix)]:
+        return host[:-len(suffix)] or None
+    return None
+
+
+class LeagueMiddleware:
+    """リクエストのパス・ホスト名からリーグを決めて environ[ENVIRON_KEY] に入れる WSGI ミドルウェア"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if enabled():
+            name, path = split_path(environ.get('PATH_INFO', ''))
+            if name is not None:
+                environ[ENVIRON_KEY] = name
+                environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + '/l/' + name
+                environ['PATH_INFO'] = path
+            else:
+                name = name_from_host(environ.get('HTTP_HOST', ''))
+                if name is not None:
+                    environ[ENVIRON_KEY] = name
+        return self.wsgi_app(environ, start_response)
+
+
+# ==================== 接続のプール ====================
+
+class ConnectionPool:
+    """1つのデータベースの接続を使い回す
+
+    接続は別のスレッドで使われることがあるので check_same_thread=False で開いておくこと。
+    戻すときに開いたままのトランザクションはロールバックする。
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int = LEAGUE_POOL_SIZE):
+        self.connect = connect
+        self.size = size
+        self.lock = threading.Lock()
+        # (接続, 開いたときのアーカイブの状態)
+        self.idle: List[Tuple[sqlite3.Connection, object]] = []
+        self.generations: Dict[int, object] = {}
+        self.closed = False
+
+    def acquire(self) -> sqlite3.Connection:
+        with self.lock:
+            entry = self.idle.pop() if self.idle else None
+        if entry is not None:
+            con, generation = entry
+            try:
+                if archive.generation(con) == generation:
+                    self.generations[id(con)] = generation
+                    return con
+            except sqlite3.Error:
+                pass
+            con.close()
+        con = self.connect()
+        self.generations[id(con)] = archive.generation(con)
+        return con
+
+    def release(self, con: sqlite3.Connection) -> None:
+        generation = self.generations.pop(id(con), None)
+        try:
+            if con.in_transaction:
+                con.rollback()
+        except sqlite3.Error:
+            con.close()
+            return
+        with self.lock:
+            if not self.closed and len(self.idle) < self.size:
+                self.idle.append((con, generation))
+                return
+        con.close()
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for con, _ in idle:
+            con.close()
+
+
+class League:
+    """開いているリーグ（名前・データベース・接続のプール）"""
+
+    def __init__(self, name: str, database: str, connect: Callable[[str], sqlite3.Connection]):
+        self.name = name
+        self.database = database
+        self.pool = ConnectionPool(lambda: connect(database))
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        self.pool.close()
+        # standings_engine は NumPy を読み込むので、使われているときだけ解放する
+        engines = sys.modules.get('standings_engine')
+        if engines is not None:
+            engines.drop_engine(self.database)
+
+
+class LeagueRegistry:
+    """リーグ名 -> League。最近使われた順に保持し、古いものから解放する"""
+
+    def __init__(self, connect: Callable[[str], sqlite3.Connection], capacity: int = LEAGUES_CACHED,
+                 idle_seconds: float = LEAGUE_IDLE_SECONDS):
+        self.connect = connect
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.leagues: 'OrderedDict[str, League]' = OrderedDict()
+
+    def get(self, name: str) -> Optional[League]:
+        """リーグを開く（データベースがなければ None。sqlite3.connect で空のファイルを作らないようにする）"""
+        if not enabled() or not valid_name(name):
+            return None
+        now = time.monotonic()
+        with self.lock:
+            league = self.leagues.get(name)
+            if league is not None:
+                self.leagues.move_to_end(name)
+            else:
+                database = database_path(name)
+                if not os.path.exists(database):
+                    return None
+                league = self.leagues[name] = League(name, database, self.connect)
+            league.last_used = now
+            evicted = self._evict(now, league)
+        for old in evicted:
+            old.close()
+        return league
+
+    def _evict(self, now: float, keep: League) -> List[League]:
+        """容量を超えた分と、使われていない時間が長いものを古い順に取り除く（keep は最新なので残る）"""
+        evicted = []
+        while self.leagues:
+            name, league = next(iter(self.leagues.items()))
+            if league is keep or (len(self.leagues) <= self.capacity
+                                  and now - league.last_used < self.idle_seconds):
+                break
+            del self.leagues[name]
+            evicted.append(league)
+        return evicted
+
+    def close(self) -> None:
+        with self.lock:
+            leagues, self.leagues = list(self.leagues.values()), OrderedDict()
+        for league in leagues:
+            league.close()
+
+
+# ==================== 実行 ====================
+
+def create_league(name: str) -> str:
+    """空のリーグを作成してデータベースのパスを返す"""
+    import migrations
+
+    path = database_path(name)
+    if os.path.exists(path):
+        raise ValueError(f'League already exists: {name}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    con = sqlite3.connect(path)
+    try:
+        with open(migrations.SCHEMA_PATH, encoding='utf-8') as f:
+            con.executescript(f.read())
+        migrations.stamp_latest(con)
+        con.commit()
+    finally:
+        con.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='リーグの作成と一覧（MAHJONG_LEAGUES_DIR）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    create_parser = subparsers.add_parser('create', help='リーグを作成する')
+    create_parser.add_argument('name', help='リーグ名（英小文字・数字・-・_）')
+    subparsers.add_parser('list', help='リーグの一覧を表示する')
+    subparsers.add_parser('migrate', help='全リーグのスキーマを最新にする')
+    args = parser.parse_args()
+
+    if not enabled():
+        parser.error('MAHJONG_LEAGUES_DIR を設定してください')
+
+    if args.command == 'create':
+        try:
+            path = create_league(args.name)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f'リーグ {args.name} を作成しました: {path}')
+    elif args.command == 'list':
+        for name in list_leagues():
+            print(f'{name}\t{database_path(name)}')
+    elif args.command == 'migrate':
+        import migrations
+
+        for name in list_leagues():
+            con = sqlite3.connect(archive.file_uri(database_path(name)), uri=True, isolation_level=None)
+            con.execute('PRAGMA foreign_keys = ON')
+            try:
+                version = migrations.migrate(con)
+            finally:
+                con.close()
+            print(f'{name}: version {version}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+麻雀リーグ管理システム - スキーマのマイグレーション
+
+稼働中のデータベースを作り直さずにスキーマを更新する。
+適用済みのバージョンは schema_version テーブルに記録し、未適用のマイグレーションだけを順に実行する。
+
+各マイグレーションは database_schema.sql に定義されたオブジェクト（テーブル・インデックス・
+トリガー・ビュー）を名前で指定して IF NOT EXISTS で作成し、必要なら既存データから
+集計テーブルなどを埋める（バックフィル）。バックフィルは小さなバッチごとに別の
+トランザクションで実行し、バッチの合間に待機するので、移行中もサイトは応答を続けられる。
+途中で中断しても、再実行すればそのマイグレーションを最初からやり直す（すべて冪等）。
+
+既存のテーブルへの列の追加は add_column を使う（PRAGMA table_info で確認してから追加する）。
+
+使い方:
+    python migrations.py            # 未適用のマイグレーションを実行する
+    python migrations.py --status   # 適用状況を表示する
+    python migrations.py --league club-a
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import archive
+import distributions
+import player_search
+import rollups
+import streaks
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database_schema.sql')
+
+# バックフィルの1バッチの件数と、バッチ間の待機秒数
+BACKFILL_BATCH_SIZE = 200
+BACKFILL_PAUSE_SECONDS = 0.05
+
+_CREATE_PATTERN = re.compile(r'^\s*CREATE\s+(VIRTUAL\s+TABLE|TABLE|INDEX|TRIGGER|VIEW)\s+(\w+)', re.IGNORECASE)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    # database_schema.sql から作成するオブジェクト名
+    objects: Sequence[str]
+    # バックフィル (con, batch_size, pause_seconds) -> None
+    backfill: Optional[Callable] = None
+
+
+def schema_statements(path: str = SCHEMA_PATH) -> Dict[str, str]:
+    """database_schema.sql の CREATE 文をオブジェクト名ごとに返す"""
+    statements = {}
+    buffer = ''
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not buffer and (not line.strip() or line.lstrip().startswith('--')):
+                continue
+            buffer += line
+            if sqlite3.complete_statement(buffer):
+                match = _CREATE_PATTERN.match(buffer)
+                if match:
+                    statements[match.group(2)] = buffer.strip()
+                buffer = ''
+    return statements
+
+
+def _create_if_missing(con: sqlite3.Connection, statement: str) -> None:
+    con.execute(_CREATE_PATTERN.sub(
+        lambda match: f'CREATE {match.group(1).upper()} IF NOT EXISTS {match.group(2)}', statement, count=1))
+
+
+def add_column(con: sqlite3.Connection, table: str, column: str, definition: str) -> None:
+    """列がなければ追加する（ALTER TABLE ADD COLUMN はテーブルを書き換えない）"""
+    columns = {row[1] for row in con.execute(f'PRAGMA table_info({table})').fetchall()}
+    if column not in columns:
+        con.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _in_batches(con: sqlite3.Connection, items: List, batch_size: int, pause_seconds: float,
+                apply: Callable[[sqlite3.Cursor, List], None]) -> None:
+    """items を batch_size 件ずつ、それぞれ別のトランザクションで処理する"""
+    for start in range(0, len(items), batch_size):
+        cur = con.cursor()
+        cur.execute('BEGIN IMMEDIATE')
+        try:
+            apply(cur, items[start:start + batch_size])
+            cur.execute('COMMIT')
+        except BaseException:
+            cur.execute('ROLLBACK')
+            raise
+        if start + batch_size < len(items):
+            time.sleep(pause_seconds)
+
+
+# ==================== バックフィル ====================
+
+def _backfill_change_log(con, batch_size, pause_seconds):
+    """既存のゲーム・プレイヤーを変更ログに登録する（登録済みのものはそのまま）"""
+    for entity, table in (('game', 'games'), ('player', 'players')):
+        ids = [row[0] for row in con.execute(f'SELECT id FROM {table} ORDER BY rowid').fetchall()]
+
+        def apply(cur, batch, entity=entity):
+            cur.executemany('''
+                INSERT OR IGNORE INTO change_log (entity, entity_id, operation) VALUES (?, ?, 'upsert')
+            ''', [(entity, entity_id) for entity_id in batch])
+
+        _in_batches(con, ids, batch_size, pause_seconds, apply)
+
+
+def _backfill_daily_player_stats(con, batch_size, pause_seconds):
+    """日別集計を日付のまとまりごとに作り直す"""
+    dates = [row[0] for row in con.execute('SELECT DISTINCT game_date FROM all_games ORDER BY game_date')]
+
+    def apply(cur, batch):
+        placeholders = ', '.join('?' * len(batch))
+        keys = cur.execute(f'''
+            SELECT DISTINCT g.game_date, gr.player_id
+            FROM all_game_results gr
+            JOIN all_games g ON gr.game_id = g.id
+            WHERE g.game_date IN ({placeholders})
+        ''', batch).fetchall()
+        rollups.refresh_daily_stats(cur, [(key[0], key[1]) for key in keys])
+
+    _in_batches(con, dates, batch_size, pause_seconds, apply)
+
+
+def _backfill_player_cumulative_stats(con, batch_size, pause_seconds):
+    """プレイヤーごとに累計を最初から作り直す"""
+    players = [row[0] for row in con.execute('SELECT DISTINCT player_id FROM daily_player_stats')]
+
+    def apply(cur, batch):
+        for player_id in batch:
+            rollups.refresh_cumulative_stats(cur, player_id, '')
+
+    _in_batches(con, players, max(1, batch_size // 10), pause_seconds, apply)
+
+
+def _backfill_score_histograms(con, batch_size, pause_seconds):
+    """シーズンごとにヒストグラムを作り直す"""
+    seasons = [row[0] for row in con.execute('SELECT DISTINCT season_id FROM all_games')]
+
+    def apply(cur, batch):
+        for season_id in batch:
+            distributions.rebuild_histograms(cur, season_id)
+
+    _in_batches(con, seasons, 1, pause_seconds, apply)
+
+
+def _backfill_player_search(con, batch_size, pause_seconds):
+    """既存のプレイヤーを検索用の名前に登録する"""
+    players = con.execute('SELECT id, name FROM players ORDER BY rowid').fetchall()
+
+    def apply(cur, batch):
+        for player_id, name in batch:
+            player_search.index_player(cur, player_id, name)
+
+    _in_batches(con, players, batch_size, pause_seconds, apply)
+
+
+def _backfill_player_search_reading(con, batch_size, pause_seconds):
+    """検索用の名前にローマ字の読み（reading_key）を加えて埋める"""
+    add_column(con, 'player_search', 'reading_key', 'TEXT')
+    _create_if_missing(con, schema_statements()['idx_player_search_reading_key'])
+    _backfill_player_search(con, batch_size, pause_seconds)
+
+
+def _backfill_streaks(con, batch_size, pause_seconds):
+    """プレイヤーごとに連続記録を最初から数える"""
+    players = [row[0] for row in con.execute('SELECT DISTINCT player_id FROM all_game_results')]
+
+    def apply(cur, batch):
+        streaks.rebuild_streaks(cur, batch)
+
+    _in_batches(con, players, max(1, batch_size // 10), pause_seconds, apply)
+
+
+# ==================== マイグレーション一覧 ====================
+
+MIGRATIONS = (
+    Migration(1, 'baseline', (
+        'seasons', 'players', 'league_settings', 'games', 'game_results',
+        'idx_seasons_active', 'idx_games_season_date', 'idx_game_results_player',
+        'idx_game_results_game', 'idx_league_settings_season',
+        'update_seasons_timestamp', 'update_players_timestamp', 'update_league_settings_timestamp',
+        'enforce_single_active_season', 'enforce_single_active_season_insert',
+        'view_all_standings', 'view_season_summary', 'view_game_results_flat',
+    )),
+    Migration(2, 'change_log', (
+        'change_log',
+        'log_games_insert', 'log_games_update', 'log_games_delete',
+        'log_game_results_insert', 'log_game_results_update', 'log_game_results_delete',
+        'log_players_insert', 'log_players_update', 'log_players_delete',
+    ), _backfill_change_log),
+    Migration(3, 'standings_events', ('standings_events',)),
+    Migration(4, 'daily_player_stats', (
+        'daily_player_stats', 'idx_daily_player_stats_player',
+    ), _backfill_daily_player_stats),
+    Migration(5, 'player_cumulative_stats', ('player_cumulative_stats',), _backfill_player_cumulative_stats),
+    Migration(6, 'aggregate_cache', ('aggregate_cache', 'clear_aggregate_cache')),
+    Migration(7, 'score_histograms', ('score_histograms',), _backfill_score_histograms),
+    Migration(8, 'archived_seasons', ('archived_seasons',)),
+    Migration(9, 'player_search', (
+        'player_search', 'player_search_fts', 'idx_player_search_name_key',
+        'player_search_fts_insert', 'player_search_fts_update', 'player_search_fts_delete',
+    ), _backfill_player_search),
+    Migration(10, 'streaks', ('streak_history', 'player_streaks'), _backfill_streaks),
+    Migration(11, 'jobs', ('jobs', 'idx_jobs_queue', 'idx_jobs_dedupe_key')),
+    # 列の追加はバックフィルの中で行う（索引は列を追加してから作る）
+    Migration(12, 'player_search_reading', (), _backfill_player_search_reading),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ==================== 実行 ====================
+
+def current_version(con: sqlite3.Connection) -> int:
+    """適用済みの最新バージョン（schema_version がなければ作成して 0）"""
+    _create_if_missing(con, schema_statements()['schema_version'])
+    return con.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(con: sqlite3.Connection, batch_size: int = BACKFILL_BATCH_SIZE,
+            pause_seconds: float = BACKFILL_PAUSE_SECONDS, log: Callable[[str], None] = print) -> int:
+    """未適用のマイグレーションを順に実行し、適用後のバージョンを返す
+
+    con は uri=True・isolation_level=None（自動コミット）で開いた接続を渡す。
+    """
+    statements = schema_statements()
+    version = current_version(con)
+    # バックフィルはアーカイブ済みシーズンも含めて all_* ビューから読む
+    archive.attach_archives(con, archive.archive_dir(con.execute('PRAGMA database_list').fetchone()[2]))
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        log(f'[{migration.version}] {migration.name}')
+        started = time.monotonic()
+
+        con.execute('BEGIN IMMEDIATE')
+        try:
+            for name in migration.objects:
+                _create_if_missing(con, statements[name])
+            con.execute('COMMIT')
+        except BaseException:
+            con.execute('ROLLBACK')
+            raise
+
+        if migration.backfill:
+            migration.backfill(con, batch_size, pause_seconds)
+
+        con.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                    (migration.version, migration.name))
+        version = migration.version
+        log(f'[{migration.version}] done in {time.monotonic() - started:.2f}s')
+    return version
+
+
+def stamp_latest(con: sqlite3.Connection) -> None:
+    """database_schema.sql から作成した新しいデータベースを最新バージョンとして記録する"""
+    current_version(con)
+    con.executemany('INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)',
+                    [(migration.version, migration.name) for migration in MIGRATIONS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='データベースのスキーマを最新にする')
+    parser.add_argument('--status', action='store_true', help='適用状況を表示する')
+    parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE, help='バックフィルの1バッチの件数')
+    parser.add_argument('--pause', type=float, default=BACKFILL_PAUSE_SECONDS, help='バッチ間の待機秒数')
+    parser.add_argument('--league', help='対象のリーグ（MAHJONG_LEAGUES_DIR。全リーグは leagues.py migrate）')
+    args = parser.parse_args()
+
+    import app as league_app
+
+    try:
+        league = league_app.open_league(args.league)
+    except ValueError:
+        parser.error(f'リーグ {args.league} がありません')
+    database = league_app.DATABASE if league is None else league.database
+
+    con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    con.execute('PRAGMA foreign_keys = ON')
+    try:
+        version = current_version(con)
+        if args.status:
+            applied = {row[0]: row[1] for row in con.execute('SELECT version, applied_date FROM schema_version')}
+            for migration in MIGRATIONS:
+                state = applied.get(migration.version, 'pending')
+                print(f'{migration.version:>3} {migration.name:<28} {state}')
+            return
+        if version >= LATEST_VERSION:
+            print(f'スキーマは最新です（version {version}）')
+            return
+        version = migrate(con, args.batch_size, args.pause)
+        print(f'version {version} に更新しました')
+    finally:
+        con.close()
+
+    if league_app.SNAPSHOT_MODE:
+        with league_app.league_context(league):
+            league_app.publish_snapshot()
+
+
+if __name__ == '__main__':
+    main()
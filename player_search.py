@@ -0,0 +1,158 @@
+"""
+麻雀リーグ管理システム - プレイヤー名の検索
+
+player_search: プレイヤーごとの正規化した名前（name_key）。name_key の索引で前方一致を、
+player_search_fts（FTS5 trigram、player_search を外部コンテンツとする）で部分一致を引く。
+FTS はトリガーで player_search と同期し、プレイヤーを削除すると ON DELETE CASCADE で消える。
+
+正規化は NFKC（全角英数・半角カナを揃える）・大文字小文字の同一視・カタカナのひらがな化。
+かなを含む名前は、かなをローマ字にした reading_key も持ち、ローマ字の入力（yam）でも
+かなの名前（やまだ）を前方一致・部分一致で引ける。ローマ字はヘボン式の子音（shi・chi・tsu・fu・ji）と
+かなどおりの母音（ゆうき -> yuuki、長音符は直前の母音）で、訓令式（si・ti など）の入力には一致しない。
+読み仮名は保存していないため、漢字の名前は漢字でのみ検索できる。
+プレイヤーの作成・名前の変更と同じトランザクションで index_player を呼ぶ。
+"""
+
+import unicodedata
+from typing import Dict, List, Optional
+
+# 検索結果の件数の既定値と上限
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+# trigram は3文字未満の語を索引から引けないため、それより短い語は LIKE で探す
+_TRIGRAM_MIN_LENGTH = 3
+
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+_KANA_ROMAJI = dict(zip(
+    'あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん'
+    'がぎぐげござじずぜぞだぢづでどばびぶべぼぱぴぷぺぽぁぃぅぇぉゃゅょゎゔ',
+    ('a i u e o ka ki ku ke ko sa shi su se so ta chi tsu te to na ni nu ne no '
+     'ha hi fu he ho ma mi mu me mo ya yu yo ra ri ru re ro wa wo n '
+     'ga gi gu ge go za ji zu ze zo da ji zu de do ba bi bu be bo pa pi pu pe po '
+     'a i u e o ya yu yo wa vu').split(),
+))
+_VOWELS = 'aiueo'
+
+
+def to_romaji(key: str) -> str:
+    """正規化した名前のかなをローマ字にする（かな以外はそのまま）"""
+    out: List[str] = []
+    double = False
+    for char in key:
+        if char == 'っ':
+            double = True
+            continue
+        if char == 'ー':
+            # 長音符は直前の母音を繰り返す
+            out.append(out[-1][-1] if out and out[-1][-1:] in _VOWELS else '')
+            continue
+        romaji = _KANA_ROMAJI.get(char, char)
+        if char in 'ゃゅょ' and out and len(out[-1]) > 1 and out[-1].endswith('i'):
+            # 拗音（きゃ -> kya。しゃ・ちゃ・じゃは y を付けない）
+            previous = out.pop()[:-1]
+            romaji = previous + ('' if previous.endswith(('sh', 'ch', 'j')) else 'y') + romaji[1]
+        elif double and romaji[:1].isascii() and romaji[:1].isalpha() and romaji[:1] not in _VOWELS:
+            # 促音は次の子音を重ねる（っち -> tchi）
+            romaji = ('t' if romaji.startswith('ch') else romaji[0]) + romaji
+        double = False
+        out.append(romaji)
+    return ''.join(out)
+
+
+def _reading(key: str) -> Optional[str]:
+    """かなを含む名前のローマ字（かながなければ None）"""
+    if not any(char in _KANA_ROMAJI or char in 'っー' for char in key):
+        return None
+    return to_romaji(key)
+
+
+def normalize(text: str) -> str:
+    """検索用に正規化した名前"""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return ' '.join(text.translate(_KATAKANA_TO_HIRAGANA).split())
+
+
+def index_player(cur, player_id: str, name: str) -> None:
+    """プレイヤーの検索用の名前を登録・更新する"""
+    key = normalize(name)
+    cur.execute('''
+        INSERT INTO player_search (player_id, name_key, reading_key) VALUES (?, ?, ?)
+        ON CONFLICT (player_id) DO UPDATE SET name_key = excluded.name_key, reading_key = excluded.reading_key
+        WHERE name_key != excluded.name_key OR reading_key IS NOT excluded.reading_key
+    ''', (player_id, key, _reading(key)))
+
+
+def rebuild_index(cur) -> None:
+    """検索用の名前を全プレイヤー分作り直す"""
+    cur.execute('DELETE FROM player_search')
+    keys = [(player_id, normalize(name)) for player_id, name in cur.execute('SELECT id, name FROM players').fetchall()]
+    cur.executemany('INSERT INTO player_search (player_id, name_key, reading_key) VALUES (?, ?, ?)', [
+        (player_id, key, _reading(key)) for player_id, key in keys
+    ])
+
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_players(cur, query: str, limit: int = SEARCH_DEFAULT_LIMIT) -> List[Dict]:
+    """名前が query で始まるプレイヤー、続いて query を含むプレイヤーを最大 limit 件返す"""
+    key = normalize(query)
+    if not key:
+        return []
+
+    # ローマ字の入力はかなの名前の reading_key でも引く
+    romaji = key.isascii()
+
+    # 前方一致（name_key・reading_key の索引の範囲検索）
+    ids = [row[0] for row in cur.execute(f'''
+        SELECT player_id FROM player_search
+        WHERE (name_key >= :key AND name_key < :end)
+            {'OR (reading_key >= :key AND reading_key < :end)' if romaji else ''}
+        ORDER BY name_key, player_id
+        LIMIT :limit
+    ''', {'key': key, 'end': key + '\U0010ffff', 'limit': limit}).fetchall()]
+
+    # 部分一致
+    if len(ids) < limit:
+        if len(key) >= _TRIGRAM_MIN_LENGTH:
+            rows = cur.execute('''
+                SELECT s.player_id FROM player_search_fts f
+                JOIN player_search s ON s.id = f.rowid
+                WHERE player_search_fts MATCH ?
+                ORDER BY s.name_key, s.player_id
+                LIMIT ?
+            ''', ('"' + key.replace('"', '""') + '"', limit + len(ids))).fetchall()
+        else:
+            rows = cur.execute('''
+                SELECT player_id FROM player_search
+                WHERE name_key LIKE ? ESCAPE '\\'
+                ORDER BY name_key, player_id
+                LIMIT ?
+            ''', (f'%{_escape_like(key)}%', limit + len(ids))).fetchall()
+        if romaji:
+            rows += cur.execute('''
+                SELECT player_id FROM player_search
+                WHERE reading_key LIKE ? ESCAPE '\\'
+                ORDER BY name_key, player_id
+                LIMIT ?
+            ''', (f'%{_escape_like(key)}%', limit + len(ids))).fetchall()
+        seen = set(ids)
+        for row in rows:
+            if len(ids) >= limit:
+                break
+            if row[0] not in seen:
+                seen.add(row[0])
+                ids.append(row[0])
+
+    if not ids:
+        return []
+    players = {row['id']: row for row in cur.execute(f'''
+        SELECT id, name, avatar_url FROM players WHERE id IN ({', '.join('?' * len(ids))})
+    ''', ids).fetchall()}
+    return [
+        {'id': player_id, 'name': players[player_id]['name'], 'avatarUrl': players[player_id]['avatar_url']}
+        for player_id in ids if player_id in players
+    ]
@@ -0,0 +1,185 @@
+"""
+麻雀リーグ管理システム - シーズン最終順位の予測（モンテカルロ法）
+
+各プレイヤーの残りゲームのポイントを、そのシーズンの本人のポイント（ゲームが少ない場合は
+シーズン全体のポイント）から復元抽出し、シーズン終了時の合計ポイントの順位を数える。
+試行は NumPy でまとめて計算し、複数のプロセスに分けて実行する（fork できないときは同じプロセスで実行する）。
+同じ seed なら、プロセス数によらず同じ結果になる。
+同じ卓のプレイヤーの結果の相関（誰かがトップなら他はトップでない）は考慮しない。
+
+NumPy はオプション（requirements.txt）。インストールされていなければ予測は使えない。
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy がない環境
+    np = None
+
+# 試行回数の既定値と上限
+PROJECTION_SIMULATIONS = 100_000
+PROJECTION_MAX_SIMULATIONS = 1_000_000
+# 1タスクで計算する試行回数（メモリ使用量の上限）
+PROJECTION_CHUNK_SIZE = 20_000
+# 1プレイヤーあたりの残りゲーム数の上限
+PROJECTION_MAX_REMAINING_GAMES = 1000
+# 本人のポイントから抽出するのに必要なゲーム数（これ未満はシーズン全体から抽出する）
+PROJECTION_MIN_GAMES = 5
+# 並列に実行するプロセス数（1 なら同じプロセスで実行する）
+PROJECTION_WORKERS = int(os.environ.get('MAHJONG_PROJECTION_WORKERS') or min(4, os.cpu_count() or 1))
+# fork で子プロセスを作ってよいか（asgi.py はイベントループとスレッドプールを持つので False にする）
+PROJECTION_FORK = True
+
+# 一度に抽出するポイントの数
+_SAMPLES_PER_BLOCK = 2_000_000
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _simulate_chunk(current: Sequence[float], samples: Sequence[Sequence[float]],
+                    remaining: Sequence[int], simulations: int, seed) -> tuple:
+    """simulations 回の試行で、プレイヤーごとの最終順位の回数と合計ポイントの総和を返す"""
+    rng = np.random.default_rng(seed)
+    players = len(current)
+    totals = np.tile(np.asarray(current, dtype=float), (simulations, 1))
+    # 抽出は (試行 × ゲーム) の配列で行うので、ゲーム数が多いときは分けて足す
+    block = max(1, _SAMPLES_PER_BLOCK // simulations)
+    for index, (points, games) in enumerate(zip(samples, remaining)):
+        points = np.asarray(points, dtype=float)
+        for start in range(0, games, block):
+            size = min(block, games - start)
+            totals[:, index] += rng.choice(points, size=(simulations, size)).sum(axis=1)
+
+    # 同点は無作為に順位を決める
+    order = np.lexsort((rng.random((simulations, players)), -totals), axis=1)
+    positions = np.empty_like(order)
+    np.put_along_axis(positions, order, np.arange(players), axis=1)
+    counts = np.stack([np.bincount(positions[:, index], minlength=players) for index in range(players)])
+    return counts, totals.sum(axis=0)
+
+
+def _pool_context():
+    # spawn / forkserver は子プロセスで __main__（CGI の index.cgi など）を読み直すため fork だけを使う。
+    # ほかのスレッドがあると、そのスレッドが持っていたロック（SQLite・ログなど）が子プロセスで
+    # 解放されないままになるので、同じプロセスで実行する
+    if not PROJECTION_FORK or threading.active_count() > 1:
+        return None
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return None
+
+
+def simulate(current: Sequence[float], samples: Sequence[Sequence[float]], remaining: Sequence[int],
+             simulations: int, seed: int, workers: int = PROJECTION_WORKERS) -> Dict[str, Any]:
+    """試行をタスクに分けて実行し、順位ごとの回数と合計ポイントの平均を返す"""
+    if np is None:
+        raise RuntimeError('NumPy is required for projections')
+    if max(remaining, default=0) > PROJECTION_MAX_REMAINING_GAMES:
+        raise ValueError(f'remaining games must not exceed {PROJECTION_MAX_REMAINING_GAMES}')
+    sizes = [PROJECTION_CHUNK_SIZE] * (simulations // PROJECTION_CHUNK_SIZE)
+    if simulations % PROJECTION_CHUNK_SIZE:
+        sizes.append(simulations % PROJECTION_CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(current, samples, remaining, size, task_seed) for size, task_seed in zip(sizes, seeds)]
+
+    context = _pool_context()
+    if workers > 1 and len(sizes) > 1 and context is not None:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sizes)), mp_context=context) as pool:
+            results = list(pool.map(_simulate_chunk, *zip(*arguments)))
+    else:
+        results = [_simulate_chunk(*args) for args in arguments]
+
+    counts = sum(result[0] for result in results)
+    point_sums = sum(result[1] for result in results)
+    return {'counts': counts, 'expected_points': point_sums / simulations}
+
+
+def season_samples(cur, season_id: int) -> Dict[str, List[float]]:
+    """シーズンのプレイヤーごとのポイント（ゲーム順）"""
+    samples: Dict[str, List[float]] = {}
+    for player_id, points in cur.execute('''
+        SELECT gr.player_id, gr.calculated_points
+        FROM all_game_results gr
+        JOIN all_games g ON gr.game_id = g.id
+        WHERE g.season_id = ?
+        ORDER BY g.game_date, g.recorded_date, g.id
+    ''', (season_id,)).fetchall():
+        samples.setdefault(player_id, []).append(points)
+    return samples
+
+
+def estimate_remaining_games(cur, season_id: int, today: str) -> Optional[Dict[str, int]]:
+    """シーズンの終了日までの残りゲーム数を、プレイヤーごとのこれまでのペースから見積もる
+
+    終了日が設定されていないか、既に過ぎている場合は None。
+    """
+    season = cur.execute('SELECT start_date, end_date FROM seasons WHERE id = ?', (season_id,)).fetchone()
+    last_game = cur.execute('SELECT MAX(game_date) FROM all_games WHERE season_id = ?', (season_id,)).fetchone()[0]
+    if not season or not season[1] or not last_game:
+        return None
+
+    start, end = date.fromisoformat(season[0]), date.fromisoformat(season[1])
+    elapsed_days = (date.fromisoformat(last_game) - start).days + 1
+    remaining_days = (end - max(date.fromisoformat(today), date.fromisoformat(last_game))).days
+    if remaining_days <= 0 or elapsed_days <= 0:
+        return None
+    return {
+        player_id: round(games / elapsed_days * remaining_days)
+        for player_id, games in cur.execute('''
+            SELECT gr.player_id, COUNT(*)
+            FROM all_game_results gr
+            JOIN all_games g ON gr.game_id = g.id
+            WHERE g.season_id = ?
+            GROUP BY gr.player_id
+        ''', (season_id,)).fetchall()
+    }
+
+
+def project_season(cur, season_id: int, remaining_games: Union[int, Dict[str, int]], simulations: int,
+                   seed: int, workers: int = PROJECTION_WORKERS) -> List[Dict[str, Any]]:
+    """シーズンの最終順位の確率をプレイヤーごとに求める
+
+    remaining_games は全員共通の残りゲーム数、またはプレイヤーID -> 残りゲーム数。
+    """
+    samples = season_samples(cur, season_id)
+    if not samples:
+        return []
+    player_ids = sorted(samples)
+    pooled = [points for player_id in player_ids for points in samples[player_id]]
+    current = [math.fsum(samples[player_id]) for player_id in player_ids]
+    draws = [samples[player_id] if len(samples[player_id]) >= PROJECTION_MIN_GAMES else pooled
+             for player_id in player_ids]
+    if isinstance(remaining_games, dict):
+        remaining = [max(0, int(remaining_games.get(player_id, 0))) for player_id in player_ids]
+    else:
+        remaining = [max(0, int(remaining_games))] * len(player_ids)
+
+    result = simulate(current, draws, remaining, simulations, seed, workers)
+    players = {
+        row[0]: {'id': row[0], 'name': row[1], 'avatarUrl': row[2]}
+        for row in cur.execute('SELECT id, name, avatar_url FROM players').fetchall()
+    }
+
+    projections = []
+    for index, player_id in enumerate(player_ids):
+        probabilities = [round(count / simulations, 4) for count in result['counts'][index].tolist()]
+        projections.append({
+            'player': players.get(player_id, {'id': player_id}),
+            'gamesPlayed': len(samples[player_id]),
+            'currentPoints': round(current[index], 1),
+            'remainingGames': remaining[index],
+            'expectedPoints': round(float(result['expected_points'][index]), 1),
+            'firstPlaceProbability': probabilities[0],
+            'positionProbabilities': probabilities
+        })
+    projections.sort(key=lambda projection: (-projection['firstPlaceProbability'], -projection['expectedPoints']))
+    return projections
@@ -0,0 +1,157 @@
+"""
+麻雀リーグ管理システム - 集計テーブルの維持
+
+daily_player_stats: (game_date, player_id) ごとの順位表用の件数と合計。
+player_cumulative_stats: プレイヤーごとの game_date 順の累計（期間集計は cum(end) - cum(start-1)）。
+
+ゲームの記録・更新・削除と同じトランザクション内で、影響を受けた
+(日付, プレイヤー) の日別集計を game_results から計算し直し、
+そのプレイヤーの累計は影響を受けた最も古い日付以降（末尾）だけを作り直す。
+集計元はアーカイブ済みシーズンも含む all_games / all_game_results（app.connect_db の接続で使う）。
+"""
+
+from typing import Dict, Iterable, Set, Tuple
+
+# (game_date, player_id)
+RollupKey = Tuple[str, str]
+
+_DAILY_STATS_SELECT = '''
+    SELECT
+        g.game_date,
+        gr.player_id,
+        COUNT(gr.id),
+        SUM(gr.calculated_points),
+        SUM(gr.raw_score),
+        SUM(gr.rank),
+        MAX(gr.raw_score),
+        SUM(CASE WHEN gr.rank = 1 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN gr.rank = 2 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN gr.rank = 3 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN gr.rank = 4 THEN 1 ELSE 0 END),
+        SUM(COALESCE(gr.agari_count, 0)),
+        SUM(COALESCE(gr.riichi_count, 0)),
+        SUM(COALESCE(gr.houjuu_count, 0)),
+        SUM(COALESCE(gr.furo_count, 0)),
+        SUM(COALESCE(g.total_hands_in_game, 0))
+    FROM all_game_results gr
+    JOIN all_games g ON gr.game_id = g.id
+'''
+
+_DAILY_STATS_INSERT = '''
+    INSERT INTO daily_player_stats (
+        game_date, player_id, games_played, total_points, total_raw_score, total_rank,
+        best_raw_score, wins, second_places, third_places, fourth_places,
+        total_agari, total_riichi, total_houjuu, total_furo, total_hands
+    )
+'''
+
+
+def game_rollup_keys(cur, game_id: str) -> Set[RollupKey]:
+    """ゲームが影響する (日付, プレイヤー) の組"""
+    rows = cur.execute('''
+        SELECT g.game_date, gr.player_id
+        FROM games g
+        JOIN game_results gr ON gr.game_id = g.id
+        WHERE g.id = ?
+    ''', (game_id,)).fetchall()
+    return {(row[0], row[1]) for row in rows}
+
+
+def refresh_daily_stats(cur, keys: Iterable[RollupKey]) -> None:
+    """指定した (日付, プレイヤー) の日別集計を game_results から計算し直す"""
+    for game_date, player_id in keys:
+        cur.execute('''
+            DELETE FROM daily_player_stats WHERE game_date = ? AND player_id = ?
+        ''', (game_date, player_id))
+        cur.execute(_DAILY_STATS_INSERT + _DAILY_STATS_SELECT + '''
+            WHERE g.game_date = ? AND gr.player_id = ?
+            GROUP BY g.game_date, gr.player_id
+        ''', (game_date, player_id))
+
+
+def rebuild_daily_stats(cur) -> None:
+    """日別集計を全件作り直す"""
+    cur.execute('DELETE FROM daily_player_stats')
+    cur.execute(_DAILY_STATS_INSERT + _DAILY_STATS_SELECT + '''
+        GROUP BY g.game_date, gr.player_id
+    ''')
+
+
+# 累計列 -> 日別集計の列
+_CUMULATIVE_COLUMNS = (
+    ('cum_games', 'games_played'),
+    ('cum_points', 'total_points'),
+    ('cum_raw_score', 'total_raw_score'),
+    ('cum_rank', 'total_rank'),
+    ('cum_wins', 'wins'),
+    ('cum_second_places', 'second_places'),
+    ('cum_third_places', 'third_places'),
+    ('cum_fourth_places', 'fourth_places'),
+    ('cum_agari', 'total_agari'),
+    ('cum_riichi', 'total_riichi'),
+    ('cum_houjuu', 'total_houjuu'),
+    ('cum_furo', 'total_furo'),
+    ('cum_hands', 'total_hands'),
+)
+
+_CUMULATIVE_INSERT = f'''
+    INSERT INTO player_cumulative_stats (
+        player_id, game_date, {', '.join(cum for cum, _ in _CUMULATIVE_COLUMNS)}
+    )
+'''
+
+
+def refresh_cumulative_stats(cur, player_id: str, from_date: str) -> None:
+    """プレイヤーの累計を from_date 以降だけ作り直す（それより前の累計は変わらない）"""
+    running_sums = ',\n'.join(
+        f'COALESCE(base.{cum}, 0) + SUM(r.{daily}) OVER running' for cum, daily in _CUMULATIVE_COLUMNS
+    )
+    cur.execute('''
+        DELETE FROM player_cumulative_stats WHERE player_id = ? AND game_date >= ?
+    ''', (player_id, from_date))
+    cur.execute(_CUMULATIVE_INSERT + f'''
+        SELECT r.player_id, r.game_date,
+               {running_sums}
+        FROM daily_player_stats r
+        LEFT JOIN (
+            SELECT * FROM player_cumulative_stats
+            WHERE player_id = :player_id AND game_date < :from_date
+            ORDER BY game_date DESC
+            LIMIT 1
+        ) base ON 1 = 1
+        WHERE r.player_id = :player_id AND r.game_date >= :from_date
+        WINDOW running AS (ORDER BY r.game_date ROWS UNBOUNDED PRECEDING)
+    ''', {'player_id': player_id, 'from_date': from_date})
+
+
+def rebuild_cumulative_stats(cur) -> None:
+    """累計を全件作り直す"""
+    running_sums = ',\n'.join(
+        f'SUM(r.{daily}) OVER running' for _, daily in _CUMULATIVE_COLUMNS
+    )
+    cur.execute('DELETE FROM player_cumulative_stats')
+    cur.execute(_CUMULATIVE_INSERT + f'''
+        SELECT r.player_id, r.game_date,
+               {running_sums}
+        FROM daily_player_stats r
+        WINDOW running AS (PARTITION BY r.player_id ORDER BY r.game_date ROWS UNBOUNDED PRECEDING)
+    ''')
+
+
+def refresh_rollups(cur, keys: Iterable[RollupKey]) -> None:
+    """影響を受けた (日付, プレイヤー) について日別集計と累計を更新する"""
+    keys = set(keys)
+    refresh_daily_stats(cur, keys)
+
+    earliest: Dict[str, str] = {}
+    for game_date, player_id in keys:
+        if player_id not in earliest or game_date < earliest[player_id]:
+            earliest[player_id] = game_date
+    for player_id, from_date in earliest.items():
+        refresh_cumulative_stats(cur, player_id, from_date)
+
+
+def rebuild_rollups(cur) -> None:
+    """集計テーブルを全件作り直す"""
+    rebuild_daily_stats(cur)
+    rebuild_cumulative_stats(cur)
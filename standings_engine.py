@@ -0,0 +1,333 @@
+"""
+麻雀リーグ管理システム - メモリ上の列指向データによる順位表の計算（オプション）
+
+game_results と games を一度だけ読み込み、プレイヤー・日付を整数に変換した NumPy の列に保持する。
+順位表は、絞り込み条件（期間・シーズン）のマスクを作り、プレイヤーの番号ごとに np.bincount で
+集計するだけなので、全期間・シーズン・日別・期間指定のどれも同じ計算でSQLより速い。
+
+書き込みは変更ログ（change_log）から反映する。読み取りのたびに最新の seq を確認し、前回以降に
+変更されたゲームの行だけを無効にして読み直して末尾に追加する（他のプロセスの書き込みも同じ方法で反映される）。
+無効な行が増えたら詰め直す。
+
+app.py から MAHJONG_STANDINGS_ENGINE=numpy のときに使う。NumPy がなければ使えない。
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+import streaks
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy がない環境
+    np = None
+
+# 読み込み時に1回で取得する行数
+ENGINE_LOAD_CHUNK_ROWS = 100_000
+# 無効な行がこの割合を超えたら詰め直す
+ENGINE_COMPACT_RATIO = 0.25
+# 変更されたゲームがこの割合を超えたら全件を読み直す
+ENGINE_RELOAD_RATIO = 0.5
+# 合計ポイントを丸める桁数（app.POINTS_DECIMALS と同じ）
+POINTS_DECIMALS = 3
+
+_ROW_SELECT = '''
+    SELECT gr.id, gr.game_id, gr.player_id, g.season_id, g.game_date, g.recorded_date,
+           gr.calculated_points, gr.raw_score, gr.rank,
+           COALESCE(gr.agari_count, 0), COALESCE(gr.riichi_count, 0),
+           COALESCE(gr.houjuu_count, 0), COALESCE(gr.furo_count, 0),
+           COALESCE(g.total_hands_in_game, 0)
+    FROM all_game_results gr
+    JOIN all_games g ON gr.game_id = g.id
+'''
+
+# 列名 -> dtype（_ROW_SELECT の game_id, player_id 以外の列と同じ順）
+_COLUMNS = (
+    ('result_id', 'int64'),
+    ('season', 'int32'),
+    ('date', 'int32'),
+    ('recorded', 'int64'),
+    ('points', 'float64'),
+    ('raw', 'int32'),
+    ('rank', 'int8'),
+    ('agari', 'int32'),
+    ('riichi', 'int32'),
+    ('houjuu', 'int32'),
+    ('furo', 'int32'),
+    ('hands', 'int32'),
+)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def _day(value: str) -> int:
+    return int(np.datetime64(value, 'D').astype(np.int64))
+
+
+class StandingsEngine:
+    """1つのデータベースの game_results を列として保持する"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.revision: Optional[int] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.size = 0
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in _COLUMNS}
+        self.columns['player'] = np.empty(0, dtype=np.int32)
+        self.columns['game'] = np.empty(0, dtype=np.int32)
+        self.valid = np.empty(0, dtype=bool)
+        self.player_ids: List[str] = []
+        self.player_codes: Dict[str, int] = {}
+        self.game_codes: Dict[str, int] = {}
+        # ゲームの番号 -> 行の位置
+        self.game_rows: Dict[int, np.ndarray] = {}
+        self.dead = 0
+
+    # ==================== 読み込み・更新 ====================
+
+    def _code(self, codes: Dict[str, int], values, names: Optional[List[str]] = None) -> 'np.ndarray':
+        result = np.empty(len(values), dtype=np.int32)
+        for index, value in enumerate(values):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                if names is not None:
+                    names.append(value)
+            result[index] = code
+        return result
+
+    def _append(self, rows) -> None:
+        """行を末尾に追加する（容量が足りなければ倍に広げる）"""
+        if not rows:
+            return
+        values = list(zip(*rows))
+        added = {
+            'result_id': np.array(values[0], dtype=np.int64),
+            'game': self._code(self.game_codes, values[1]),
+            'player': self._code(self.player_codes, values[2], self.player_ids),
+            'season': np.array(values[3], dtype=np.int32),
+            'date': np.array(values[4], dtype='datetime64[D]').astype(np.int32),
+            'recorded': np.array(values[5], dtype='datetime64[s]').astype(np.int64),
+        }
+        for (name, dtype), column in zip(_COLUMNS[4:], values[6:]):
+            added[name] = np.array(column, dtype=dtype)
+
+        count = len(rows)
+        needed = self.size + count
+        if needed > len(self.valid):
+            capacity = max(needed, 2 * len(self.valid), 1024)
+            for name, column in self.columns.items():
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self.columns[name] = grown
+            grown = np.zeros(capacity, dtype=bool)
+            grown[:self.size] = self.valid[:self.size]
+            self.valid = grown
+
+        for name, column in added.items():
+            self.columns[name][self.size:needed] = column
+        self.valid[self.size:needed] = True
+        positions = np.arange(self.size, needed)
+        games = added['game']
+        order = np.argsort(games, kind='stable')
+        boundaries = np.flatnonzero(np.diff(games[order])) + 1
+        for group in np.split(order, boundaries):
+            code = int(games[group[0]])
+            previous = self.game_rows.get(code)
+            rows_of_game = positions[group]
+            self.game_rows[code] = rows_of_game if previous is None else np.concatenate((previous, rows_of_game))
+        self.size = needed
+
+    def _remove_games(self, game_ids) -> None:
+        for game_id in game_ids:
+            code = self.game_codes.get(game_id)
+            rows = self.game_rows.pop(code, None) if code is not None else None
+            if rows is not None:
+                self.valid[rows] = False
+                self.dead += len(rows)
+
+    def _compact(self) -> None:
+        """無効な行を取り除いて詰め直す"""
+        keep = np.flatnonzero(self.valid[:self.size])
+        for name, column in self.columns.items():
+            self.columns[name] = column[keep]
+        self.valid = np.ones(len(keep), dtype=bool)
+        self.size = len(keep)
+        self.dead = 0
+        games = self.columns['game']
+        order = np.argsort(games, kind='stable')
+        boundaries = np.flatnonzero(np.diff(games[order])) + 1
+        self.game_rows = {int(games[group[0]]): group for group in np.split(order, boundaries) if len(group)}
+
+    def load(self, cur, revision: int) -> None:
+        """全件を読み込み直す"""
+        self._reset()
+        rows = cur.execute(_ROW_SELECT + ' ORDER BY gr.id')
+        while True:
+            chunk = rows.fetchmany(ENGINE_LOAD_CHUNK_ROWS)
+            if not chunk:
+                break
+            self._append([tuple(row) for row in chunk])
+        self.revision = revision
+
+    def sync(self, cur, revision: int) -> None:
+        """前回以降に変更されたゲームの行を読み直す"""
+        if self.revision is None:
+            self.load(cur, revision)
+            return
+        if revision <= self.revision:
+            # 読み取り用スナップショットがエンジンより古い場合も、新しい方のデータで計算する
+            return
+        changed = [row[0] for row in cur.execute('''
+            SELECT entity_id FROM change_log WHERE entity = 'game' AND seq > ? AND seq <= ?
+        ''', (self.revision, revision)).fetchall()]
+        if len(changed) > ENGINE_RELOAD_RATIO * max(len(self.game_rows), 1):
+            self.load(cur, revision)
+            return
+
+        self._remove_games(changed)
+        for start in range(0, len(changed), 500):
+            batch = changed[start:start + 500]
+            self._append([tuple(row) for row in cur.execute(
+                _ROW_SELECT + f' WHERE gr.game_id IN ({", ".join("?" * len(batch))}) ORDER BY gr.id',
+                batch).fetchall()])
+        if self.dead > ENGINE_COMPACT_RATIO * self.size:
+            self._compact()
+        self.revision = revision
+
+    # ==================== 集計 ====================
+
+    def aggregate(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  season_id: Optional[int] = None) -> Dict[str, 'np.ndarray']:
+        """プレイヤーの番号ごとの集計列（STANDINGS_AGGREGATES と同じ名前）"""
+        size = self.size
+        mask = self.valid[:size].copy()
+        columns = {name: column[:size] for name, column in self.columns.items()}
+        if start_date:
+            mask &= columns['date'] >= _day(start_date)
+        if end_date:
+            mask &= columns['date'] <= _day(end_date)
+        if season_id is not None:
+            mask &= columns['season'] == season_id
+
+        players = columns['player'][mask]
+        length = len(self.player_ids)
+
+        def total(values):
+            return np.bincount(players, weights=values[mask], minlength=length)
+
+        def count(condition):
+            return np.bincount(players[condition[mask]], minlength=length)
+
+        rank = columns['rank']
+        games = np.bincount(players, minlength=length)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            points = np.round(total(columns['points']), POINTS_DECIMALS)
+            best = np.full(length, np.iinfo(np.int32).min, dtype=np.int64)
+            np.maximum.at(best, players, columns['raw'][mask])
+            return {
+                'games_played': games,
+                'total_points': points,
+                'average_points': points / games,
+                'average_raw_score': total(columns['raw']) / games,
+                'average_rank': total(rank) / games,
+                'best_raw_score': best,
+                'wins': count(rank == 1),
+                'second_places': count(rank == 2),
+                'third_places': count(rank == 3),
+                'fourth_places': count(rank == 4),
+                'top_two_finishes': count(rank <= 2),
+                'avoid_last_finishes': count(rank < 4),
+                'total_agari': total(columns['agari']),
+                'total_riichi': total(columns['riichi']),
+                'total_houjuu': total(columns['houjuu']),
+                'total_furo': total(columns['furo']),
+                'total_hands': total(columns['hands']),
+            }
+
+    def last_games_points(self, player_codes, limit: int = 10, start_date: Optional[str] = None,
+                          end_date: Optional[str] = None, season_id: Optional[int] = None) -> Dict[int, List[float]]:
+        """プレイヤーの番号 -> 新しい順の直近 limit ゲームのポイント（aggregate と同じ絞り込み）"""
+        size = self.size
+        mask = self.valid[:size].copy()
+        date = self.columns['date'][:size]
+        if start_date:
+            mask &= date >= _day(start_date)
+        if end_date:
+            mask &= date <= _day(end_date)
+        if season_id is not None:
+            mask &= self.columns['season'][:size] == season_id
+        rows = np.flatnonzero(mask)
+        players = self.columns['player'][rows]
+        # プレイヤー順、その中で新しい順（同じ日時なら記録順）
+        order = rows[np.lexsort((self.columns['result_id'][rows], -self.columns['recorded'][rows],
+                                 -date[rows], players))]
+        players = self.columns['player'][order]
+        starts = np.flatnonzero(np.r_[True, players[1:] != players[:-1]])
+        points = self.columns['points'][order]
+        ends = np.r_[starts[1:], len(order)]
+        wanted = set(int(code) for code in player_codes)
+        return {
+            int(players[start]): points[start:min(start + limit, end)].tolist()
+            for start, end in zip(starts, ends) if int(players[start]) in wanted
+        }
+
+
+_engines: Dict[str, StandingsEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(database: str) -> StandingsEngine:
+    """データベースごとのエンジン（プロセス内で共有する）"""
+    with _engines_lock:
+        engine = _engines.get(database)
+        if engine is None:
+            engine = _engines[database] = StandingsEngine()
+        return engine
+
+
+def drop_engine(database: str) -> None:
+    """エンジンを破棄してメモリを解放する（leagues.py で使われなくなったリーグ）"""
+    with _engines_lock:
+        _engines.pop(database, None)
+
+
+def query_standings(engine: StandingsEngine, cur, revision: int, fields: List[str],
+                    standings_fields: Dict[str, Any], start_date: Optional[str] = None,
+                    end_date: Optional[str] = None, season_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """app.query_standings と同じ形式の順位表"""
+    players = {row[0]: row for row in cur.execute('SELECT id, name, avatar_url FROM players').fetchall()}
+    player_streaks = streaks.query_player_streaks(cur) if 'streaks' in fields else {}
+    with engine.lock:
+        engine.sync(cur, revision)
+        aggregates = engine.aggregate(start_date, end_date, season_id)
+        player_ids = list(engine.player_ids)
+        codes = [code for code in np.flatnonzero(aggregates['games_played']).tolist()
+                 if player_ids[code] in players]
+        last_ten = engine.last_games_points(codes, 10, start_date, end_date, season_id) \
+            if 'lastTenGamesPoints' in fields else {}
+
+    # SQL と同じく合計ポイント・平均ポイントの降順
+    codes.sort(key=lambda code: (-aggregates['total_points'][code], -aggregates['average_points'][code]))
+    integer_columns = {'games_played', 'best_raw_score', 'wins', 'second_places', 'third_places',
+                       'fourth_places', 'top_two_finishes', 'avoid_last_finishes', 'total_agari',
+                       'total_riichi', 'total_houjuu', 'total_furo', 'total_hands'}
+    standings = []
+    for code in codes:
+        stat = {column: (int(values[code]) if column in integer_columns else float(values[code]))
+                for column, values in aggregates.items()}
+        player = players[player_ids[code]]
+        row = {'player': {'id': player[0], 'name': player[1], 'avatarUrl': player[2]}}
+        for field in fields:
+            if field == 'lastTenGamesPoints':
+                row[field] = last_ten.get(code, [])
+            elif field == 'streaks':
+                row[field] = player_streaks.get(player[0], streaks.EMPTY_STREAKS)
+            else:
+                row[field] = standings_fields[field][1](stat)
+        standings.append(row)
+    return standings
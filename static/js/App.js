@@ -2,6 +2,7 @@ import React from 'react';
 
 // Constants and utilities
 import { API_BASE_URL } from './constants.js';
+import { isColumnar, decodeColumnar } from './utils/columnar.js';
 
 const DEFAULT_LEAGUE_SETTINGS = {
   gameStartChipCount: 25000,
@@ -125,6 +126,23 @@ const calculatePlayerStats = (games, players) => {
   return Object.values(playerStats).filter(stats => stats.gamesPlayed > 0);
 };
 
+// 差分同期で受け取ったゲームの変更を現在のゲーム一覧に反映する
+const applyGameChanges = (currentGames, changes, seasonId) => {
+  const gamesById = new Map(currentGames.map(game => [game.id, game]));
+
+  changes.forEach(change => {
+    if (change.operation === 'delete' || !change.data || change.data.seasonId !== seasonId) {
+      gamesById.delete(change.id);
+    } else {
+      gamesById.set(change.id, change.data);
+    }
+  });
+
+  return Array.from(gamesById.values()).sort((a, b) =>
+    b.gameDate.localeCompare(a.gameDate) || (b.recordedDate || '').localeCompare(a.recordedDate || '')
+  );
+};
+
 const calculateMLeaguePoints = (gameResults, leagueSettings) => {
   if (gameResults.length !== 4) {
     throw new Error('4人のプレイヤーが必要です');
@@ -3653,6 +3671,11 @@ const App = () => {
   const [leagueSettings, setLeagueSettings] = React.useState(null);
   const [playerStats, setPlayerStats] = React.useState([]);
 
+  // 差分同期（/api/changes）で最後に受け取った seq
+  const changeSeqRef = React.useRef(0);
+  // ゲームと一緒に順位表も取得したときは、games の更新による順位表の再取得を1回省く
+  const standingsFetchedRef = React.useRef(false);
+
   // Loading states
   const [isLoadingSeasons, setIsLoadingSeasons] = React.useState(true);
   const [isLoadingPlayers, setIsLoadingPlayers] = React.useState(true);
@@ -3696,23 +3719,85 @@ const App = () => {
         throw new Error(data.error || 'API request failed');
       }
       
-      return data.data;
+      return isColumnar(data.data) ? decodeColumnar(data.data) : data.data;
     } catch (error) {
       console.error('API request failed:', error);
       throw error;
     }
   };
 
+  // 複数の GET を /api/batch で1回のリクエストにまとめる（CGI ではリクエストごとにプロセスが起動するため）
+  // 失敗したサブリクエストは Error として返す
+  const batchRequest = async (urls) => {
+    const results = await apiRequest('/api/batch', {
+      method: 'POST',
+      body: JSON.stringify({ requests: urls }),
+    });
+    return results.map(({ path, status, body }) => {
+      if (status >= 400 || !body || !body.success) {
+        return new Error((body && body.error) || `Batch request failed: ${path} (${status})`);
+      }
+      return isColumnar(body.data) ? decodeColumnar(body.data) : body.data;
+    });
+  };
+
+  const batchValue = (result) => {
+    if (result instanceof Error) {
+      throw result;
+    }
+    return result;
+  };
+
+  // static/data に書き出し済みのJSONがあればそれを使い、なければAPIから取得する
+  const staticDataRequest = async (staticPath, apiUrl) => {
+    if (window.STATIC_DATA) {
+      try {
+        const basePath = window.BASE_PATH || '';
+        const response = await fetch(`${basePath}/static/data/${staticPath}`, { cache: 'no-cache' });
+        if (response.ok) {
+          const data = await response.json();
+          if (data.success) {
+            return { data: data.data, changeSeq: data.changeSeq };
+          }
+        }
+      } catch (error) {
+        console.warn('Static data unavailable, falling back to API:', error);
+      }
+    }
+    return { data: await apiRequest(apiUrl), changeSeq: null };
+  };
+
   // Data loading functions
-  const loadSeasons = async () => {
+  // 起動時はシーズン・アクティブシーズン・プレイヤーを1回のバッチで取得する
+  // （静的JSONがあればプレイヤーはそちらから読むので、シーズンのバッチと並行して取得する）
+  const loadInitialData = async () => {
+    if (window.STATIC_DATA) {
+      await Promise.all([loadSeasons(), loadPlayers()]);
+      return;
+    }
     try {
       setIsLoadingSeasons(true);
-      const [seasonsData, activeSeasonData] = await Promise.all([
-        apiRequest('/api/seasons'),
-        apiRequest('/api/seasons/active').catch(() => null)
+      setIsLoadingPlayers(true);
+      const [seasonsResult, activeSeasonResult, playersResult] = await batchRequest([
+        '/api/seasons', '/api/seasons/active', '/api/players'
       ]);
-      setSeasons(seasonsData);
-      setActiveSeason(activeSeasonData);
+      setSeasons(batchValue(seasonsResult));
+      setActiveSeason(activeSeasonResult instanceof Error ? null : activeSeasonResult);
+      setPlayers(batchValue(playersResult));
+    } catch (error) {
+      console.error('Failed to load initial data:', error);
+    } finally {
+      setIsLoadingSeasons(false);
+      setIsLoadingPlayers(false);
+    }
+  };
+
+  const loadSeasons = async () => {
+    try {
+      setIsLoadingSeasons(true);
+      const [seasonsResult, activeSeasonResult] = await batchRequest(['/api/seasons', '/api/seasons/active']);
+      setSeasons(batchValue(seasonsResult));
+      setActiveSeason(activeSeasonResult instanceof Error ? null : activeSeasonResult);
     } catch (error) {
       console.error('Failed to load seasons:', error);
     } finally {
@@ -3723,7 +3808,7 @@ const App = () => {
   const loadPlayers = async () => {
     try {
       setIsLoadingPlayers(true);
-      const playersData = await apiRequest('/api/players');
+      const { data: playersData } = await staticDataRequest('players.json', '/api/players');
       setPlayers(playersData);
     } catch (error) {
       console.error('Failed to load players:', error);
@@ -3739,12 +3824,29 @@ const App = () => {
       setIsLoadingGames(true);
       setIsLoadingSettings(true);
       
-      const [gamesData, settingsData] = await Promise.all([
-        apiRequest(`/api/seasons/${seasonId}/games`),
-        apiRequest(`/api/seasons/${seasonId}/settings`)
-      ]);
-      
-      setGames(gamesData);
+      // 全件取得と同じ時点の seq を控え、以降の変更は差分同期で受け取る
+      const gamesUrl = `/api/seasons/${seasonId}/games?format=columnar`;
+      let changes, settingsData, gamesResult;
+      if (window.STATIC_DATA) {
+        [changes, settingsData] = (await batchRequest(['/api/changes', `/api/seasons/${seasonId}/settings`])).map(batchValue);
+        gamesResult = await staticDataRequest(`seasons/${seasonId}/games.json`, gamesUrl);
+      } else {
+        // 順位表も同じバッチで取得する（失敗したときは games の更新後に loadStandings で取り直す）
+        const [changesResult, settingsResult, gamesData, standingsResult] = await batchRequest([
+          '/api/changes', `/api/seasons/${seasonId}/settings`, gamesUrl,
+          `/api/seasons/${seasonId}/standings?format=columnar`
+        ]);
+        [changes, settingsData] = [changesResult, settingsResult].map(batchValue);
+        gamesResult = { data: batchValue(gamesData), changeSeq: null };
+        if (!(standingsResult instanceof Error)) {
+          standingsFetchedRef.current = true;
+          setPlayerStats(standingsResult);
+        }
+      }
+
+      // 静的JSONは書き出し時点の seq を持つので、そこから差分同期する
+      changeSeqRef.current = gamesResult.changeSeq !== null ? gamesResult.changeSeq : changes.lastSeq;
+      setGames(gamesResult.data);
       setLeagueSettings(settingsData);
     } catch (error) {
       console.error('Failed to load games and settings:', error);
@@ -3754,11 +3856,35 @@ const App = () => {
     }
   };
 
+  const syncGames = async (seasonId) => {
+    if (!seasonId) return;
+
+    let changes = [];
+    let hasMore = true;
+    while (hasMore) {
+      const delta = await apiRequest(`/api/changes?since=${changeSeqRef.current}`);
+      if (delta.reset) {
+        await loadGamesAndSettings(seasonId);
+        return;
+      }
+      changes = changes.concat(delta.changes);
+      changeSeqRef.current = delta.lastSeq;
+      hasMore = delta.hasMore;
+    }
+
+    const gameChanges = changes.filter(change => change.entity === 'game');
+    if (gameChanges.length > 0) {
+      setGames(prevGames => applyGameChanges(prevGames, gameChanges, seasonId));
+    }
+  };
+
   const loadStandings = async (seasonId) => {
     if (!seasonId) return;
     
     try {
-      const standingsData = await apiRequest(`/api/seasons/${seasonId}/standings`);
+      const { data: standingsData } = await staticDataRequest(
+        `seasons/${seasonId}/standings.json`, `/api/seasons/${seasonId}/standings?format=columnar`
+      );
       setPlayerStats(standingsData);
     } catch (error) {
       console.error('Failed to load standings:', error);
@@ -3771,7 +3897,9 @@ const App = () => {
 
   const loadAllStandings = async () => {
     try {
-      const standingsData = await apiRequest('/api/standings/all');
+      const { data: standingsData } = await staticDataRequest(
+        'standings/all.json', '/api/standings/all?format=columnar'
+      );
       return standingsData;
     } catch (error) {
       console.error('Failed to load all standings:', error);
@@ -3781,7 +3909,7 @@ const App = () => {
 
   const loadDailyStandings = async (date) => {
     try {
-      const standingsData = await apiRequest(`/api/standings/daily?date=${date}`);
+      const standingsData = await apiRequest(`/api/standings/daily?date=${date}&format=columnar`);
       return standingsData;
     } catch (error) {
       console.error('Failed to load daily standings:', error);
@@ -3791,7 +3919,7 @@ const App = () => {
 
   const loadRangeStandings = async (startDate, endDate) => {
     try {
-      const standingsData = await apiRequest(`/api/standings/daily?date=${endDate}`);
+      const standingsData = await apiRequest(`/api/standings/daily?date=${endDate}&format=columnar`);
       return standingsData;
     } catch (error) {
       console.error('Failed to load range standings:', error);
@@ -3801,7 +3929,7 @@ const App = () => {
 
   const loadAllGames = async () => {
     try {
-      const gamesData = await apiRequest('/api/games/all');
+      const gamesData = await apiRequest('/api/games/all?format=columnar');
       return gamesData;
     } catch (error) {
       console.error('Failed to load all games:', error);
@@ -3811,7 +3939,7 @@ const App = () => {
 
   const loadDailyGames = async (date) => {
     try {
-      const gamesData = await apiRequest(`/api/games/daily?date=${date}`);
+      const gamesData = await apiRequest(`/api/games/daily?date=${date}&format=columnar`);
       return gamesData;
     } catch (error) {
       console.error('Failed to load daily games:', error);
@@ -3821,7 +3949,7 @@ const App = () => {
 
   const loadRangeGames = async (startDate, endDate) => {
     try {
-      const gamesData = await apiRequest(`/api/games/date-range?start_date=${startDate}&end_date=${endDate}`);
+      const gamesData = await apiRequest(`/api/games/date-range?start_date=${startDate}&end_date=${endDate}&format=columnar`);
       return gamesData;
     } catch (error) {
       console.error('Failed to load range games:', error);
@@ -3831,8 +3959,7 @@ const App = () => {
 
   // Initialize app
   React.useEffect(() => {
-    loadSeasons();
-    loadPlayers();
+    loadInitialData();
   }, []);
 
   React.useEffect(() => {
@@ -3841,11 +3968,31 @@ const App = () => {
     }
   }, [activeSeason]);
 
+  // アクティブシーズンが変わったときは loadGamesAndSettings がゲームを読み込んだあとに取得する
   React.useEffect(() => {
+    if (standingsFetchedRef.current) {
+      standingsFetchedRef.current = false;
+      return;
+    }
     if (activeSeason) {
       loadStandings(activeSeason.id);
     }
-  }, [games, activeSeason]);
+  }, [games]);
+
+  // 順位表のリアルタイム更新（ゲームが記録されるとサーバーから配信される）
+  // 常駐するサーバーのときだけ。それ以外（CGI）は記録後の loadStandings で更新する
+  React.useEffect(() => {
+    if (!window.LIVE_STANDINGS || typeof EventSource === 'undefined') return;
+
+    const basePath = window.BASE_PATH || '';
+    const source = new EventSource(`${basePath}/api/standings/stream`);
+    source.addEventListener('standings', (event) => {
+      const { standings } = JSON.parse(event.data);
+      setPlayerStats(standings);
+    });
+
+    return () => source.close();
+  }, []);
 
   // Management functions
   const addPlayer = async (name) => {
@@ -3901,7 +4048,7 @@ const App = () => {
           roundName,
         }),
       });
-      await loadGamesAndSettings(activeSeason.id);
+      await syncGames(activeSeason.id);
     } catch (error) {
       console.error('Failed to add game:', error);
       throw error;
@@ -3936,9 +4083,9 @@ const App = () => {
         body: JSON.stringify(payload),
       });
       
-      // ゲームを更新した後、現在のデータをリロード
+      // ゲームを更新した後、変更分だけを同期
       if (activeSeason) {
-        await loadGamesAndSettings(activeSeason.id);
+        await syncGames(activeSeason.id);
       }
     } catch (error) {
       console.error('Failed to update game:', error);
@@ -3951,9 +4098,9 @@ const App = () => {
       await apiRequest(`/api/games/${gameId}`, {
         method: 'DELETE',
       });
-      // ゲームを削除した後、現在のデータをリロード
+      // ゲームを削除した後、変更分だけを同期
       if (activeSeason) {
-        await loadGamesAndSettings(activeSeason.id);
+        await syncGames(activeSeason.id);
       }
     } catch (error) {
       console.error('Failed to delete game:', error);
@@ -3963,7 +4110,7 @@ const App = () => {
 
   const refreshGames = async () => {
     if (activeSeason) {
-      await loadGamesAndSettings(activeSeason.id);
+      await syncGames(activeSeason.id);
     }
   };
 
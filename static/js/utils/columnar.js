@@ -0,0 +1,69 @@
+// 列指向形式 (?format=columnar) のレスポンスを元のオブジェクト配列に復元するユーティリティ
+
+// field はキーの配列（例: ['player', 'id']）
+const setPath = (obj, field, value) => {
+  let target = obj;
+  for (let i = 0; i < field.length - 1; i++) {
+    if (target[field[i]] === undefined || target[field[i]] === null) {
+      target[field[i]] = {};
+    }
+    target = target[field[i]];
+  }
+  target[field[field.length - 1]] = value;
+};
+
+const deletePath = (obj, field) => {
+  let target = obj;
+  for (let i = 0; i < field.length - 1; i++) {
+    target = target[field[i]];
+    if (target === undefined || target === null || typeof target !== 'object') {
+      return;
+    }
+  }
+  delete target[field[field.length - 1]];
+};
+
+export const isColumnar = (data) =>
+  data !== null && typeof data === 'object' && !Array.isArray(data) && data.format === 'columnar';
+
+export const decodeColumnar = (payload) => {
+  const rows = new Array(payload.length);
+  for (let i = 0; i < payload.length; i++) {
+    const row = {};
+    for (let f = 0; f < payload.fields.length; f++) {
+      setPath(row, payload.fields[f], payload.columns[f][i]);
+    }
+    rows[i] = row;
+  }
+
+  // 行によって null のオブジェクトを戻す（内側から先に戻し、外側の null で上書きする）
+  [...(payload.objects || [])].reverse().forEach(({ path, present }) => {
+    for (let i = 0; i < rows.length; i++) {
+      if (!present[i]) {
+        setPath(rows[i], path, null);
+      }
+    }
+  });
+
+  // 入れ子の配列（ゲームのresultsなど）は lengths に従って各行に振り分ける
+  Object.entries(payload.nested || {}).forEach(([key, nested]) => {
+    const children = decodeColumnar(nested);
+    let offset = 0;
+    for (let i = 0; i < rows.length; i++) {
+      const length = nested.lengths[i];
+      if (length === null) {
+        rows[i][key] = null;
+        continue;
+      }
+      rows[i][key] = children.slice(offset, offset + length);
+      offset += length;
+    }
+  });
+
+  // キーがなかった行ではキーを消す（null の値とは区別する）
+  (payload.missing || []).forEach(({ path, rows: indexes }) => {
+    indexes.forEach((i) => deletePath(rows[i], path));
+  });
+
+  return rows;
+};
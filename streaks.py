@@ -0,0 +1,137 @@
+"""
+麻雀リーグ管理システム - 連続記録の維持
+
+連続記録は、連続トップ・連続ラス回避・連続放銃なしの3種類。
+それぞれ現在の連続数と最長記録を持つ。
+
+streak_history: プレイヤーのゲームごとの、そのゲーム終了時点の連続記録。
+    キーはゲーム順 (game_date, recorded_date, game_id)。
+player_streaks: プレイヤーごとの最新の連続記録（streak_history の最後の行と同じ内容）。
+    読み取りはこちらを主キーで引くだけ。
+
+ゲームの記録・更新・削除と同じトランザクション内で、影響を受けたプレイヤーの履歴を
+変更されたゲームの位置から作り直す。それより前の履歴は変わらないので、その直前の行から続きを数える。
+通常の記録（最新のゲームの追加）では1ゲーム分だけの更新になる。
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+# ゲーム順のキー (game_date, recorded_date, game_id)
+GameOrder = Tuple[str, str, str]
+
+# 連続記録 -> 続く条件（rank, houjuu_count から判定する）
+STREAKS = {
+    'top': lambda rank, houjuu: rank == 1,
+    'no_last': lambda rank, houjuu: rank < 4,
+    'no_houjuu': lambda rank, houjuu: not houjuu,
+}
+
+_STATE_COLUMNS = tuple(
+    column for name in STREAKS for column in (f'{name}_streak', f'best_{name}_streak')
+)
+
+
+def game_streak_keys(cur, game_id: str) -> Dict[str, GameOrder]:
+    """ゲームに参加したプレイヤーと、そのゲームの位置"""
+    rows = cur.execute('''
+        SELECT gr.player_id, g.game_date, g.recorded_date, g.id
+        FROM games g
+        JOIN game_results gr ON gr.game_id = g.id
+        WHERE g.id = ?
+    ''', (game_id,)).fetchall()
+    return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+def merge_keys(*key_sets: Dict[str, GameOrder]) -> Dict[str, GameOrder]:
+    """プレイヤーごとに最も早い位置を残す"""
+    merged: Dict[str, GameOrder] = {}
+    for keys in key_sets:
+        for player_id, order in keys.items():
+            if player_id not in merged or tuple(order) < tuple(merged[player_id]):
+                merged[player_id] = tuple(order)
+    return merged
+
+
+def replay_player(cur, player_id: str, from_order: Optional[GameOrder] = None) -> None:
+    """プレイヤーの連続記録を from_order 以降だけ数え直す（None なら最初から）"""
+    from_order = tuple(from_order) if from_order else ('', '', '')
+    cur.execute('''
+        DELETE FROM streak_history
+        WHERE player_id = ? AND (game_date, recorded_date, game_id) >= (?, ?, ?)
+    ''', (player_id, *from_order))
+    base = cur.execute(f'''
+        SELECT {', '.join(_STATE_COLUMNS)} FROM streak_history
+        WHERE player_id = ?
+        ORDER BY game_date DESC, recorded_date DESC, game_id DESC
+        LIMIT 1
+    ''', (player_id,)).fetchone()
+    state = dict(zip(_STATE_COLUMNS, base)) if base else dict.fromkeys(_STATE_COLUMNS, 0)
+
+    games = cur.execute('''
+        SELECT g.game_date, g.recorded_date, g.id, gr.rank, gr.houjuu_count
+        FROM all_game_results gr
+        JOIN all_games g ON gr.game_id = g.id
+        WHERE gr.player_id = ? AND (g.game_date, g.recorded_date, g.id) >= (?, ?, ?)
+        ORDER BY g.game_date, g.recorded_date, g.id
+    ''', (player_id, *from_order)).fetchall()
+
+    history = []
+    for game_date, recorded_date, game_id, rank, houjuu in games:
+        for name, continues in STREAKS.items():
+            current = state[f'{name}_streak'] + 1 if continues(rank, houjuu) else 0
+            state[f'{name}_streak'] = current
+            state[f'best_{name}_streak'] = max(state[f'best_{name}_streak'], current)
+        history.append((player_id, game_date, recorded_date, game_id,
+                        *(state[column] for column in _STATE_COLUMNS)))
+    cur.executemany(f'''
+        INSERT INTO streak_history (player_id, game_date, recorded_date, game_id, {', '.join(_STATE_COLUMNS)})
+        VALUES (?, ?, ?, ?, {', '.join('?' * len(_STATE_COLUMNS))})
+    ''', history)
+
+    # 最新の状態（ゲームがなくなった場合は削除）
+    if base is None and not history:
+        cur.execute('DELETE FROM player_streaks WHERE player_id = ?', (player_id,))
+    else:
+        cur.execute(f'''
+            INSERT OR REPLACE INTO player_streaks (player_id, {', '.join(_STATE_COLUMNS)})
+            VALUES (?, {', '.join('?' * len(_STATE_COLUMNS))})
+        ''', (player_id, *(state[column] for column in _STATE_COLUMNS)))
+
+
+def refresh_streaks(cur, keys: Dict[str, GameOrder]) -> None:
+    """影響を受けたプレイヤーの連続記録を、変更されたゲームの位置から数え直す"""
+    for player_id, from_order in keys.items():
+        replay_player(cur, player_id, from_order)
+
+
+def rebuild_streaks(cur, player_ids: Optional[Iterable[str]] = None) -> None:
+    """連続記録を最初から数え直す（player_ids を省略すると全プレイヤー）"""
+    if player_ids is None:
+        cur.execute('DELETE FROM streak_history')
+        cur.execute('DELETE FROM player_streaks')
+        player_ids = [row[0] for row in cur.execute('SELECT DISTINCT player_id FROM all_game_results').fetchall()]
+    for player_id in player_ids:
+        replay_player(cur, player_id)
+
+
+# 列 -> API のキー
+_JSON_KEYS = {
+    'top_streak': 'currentTop',
+    'best_top_streak': 'bestTop',
+    'no_last_streak': 'currentNoLast',
+    'best_no_last_streak': 'bestNoLast',
+    'no_houjuu_streak': 'currentNoHoujuu',
+    'best_no_houjuu_streak': 'bestNoHoujuu',
+}
+
+# ゲームのないプレイヤーの連続記録
+EMPTY_STREAKS = dict.fromkeys(_JSON_KEYS.values(), 0)
+
+
+def query_player_streaks(cur) -> Dict[str, Dict[str, int]]:
+    """プレイヤーID -> 最新の連続記録"""
+    rows = cur.execute(f'SELECT player_id, {", ".join(_STATE_COLUMNS)} FROM player_streaks').fetchall()
+    return {
+        row[0]: {_JSON_KEYS[column]: value for column, value in zip(_STATE_COLUMNS, row[1:])}
+        for row in rows
+    }
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+# リポジトリ直下のモジュール（app.py など）を読み込めるようにする
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# リポジトリで管理している database.db をテストが書き換えないよう、
+# app の読み込み前に既定のデータベースを一時ディレクトリへ向けておく。
+# スキーマの変更は database_schema.sql と migrations.py で行う。
+os.environ.setdefault('MAHJONG_DATABASE', os.path.join(tempfile.mkdtemp(), 'database.db'))
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """シーズン1つ（id=1）とその設定だけを持つ空のデータベースを DATABASE にする"""
+    import app as league_app
+
+    path = str(tmp_path / 'database.db')
+    con = sqlite3.connect(path)
+    with open(os.path.join(BASE_DIR, 'database_schema.sql'), encoding='utf-8') as f:
+        con.executescript(f.read())
+    con.execute("INSERT INTO seasons (name, start_date, is_active) VALUES ('S1', '2025-01-01', 1)")
+    con.execute('INSERT INTO league_settings (season_id) VALUES (1)')
+    con.commit()
+    con.close()
+    monkeypatch.setattr(league_app, 'DATABASE', path)
+    return path
+
+
+@pytest.fixture
+def client(database):
+    import app as league_app
+
+    return league_app.app.test_client()
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+import app as league_app
+
+CALLERS = 8
+
+
+def _call_concurrently(compute, cache_key='test:aggregate'):
+    """CALLERS 個のスレッドが同時に cached_aggregate を呼ぶ"""
+    barrier = threading.Barrier(CALLERS)
+    results, errors = [], []
+
+    def caller():
+        try:
+            with league_app.app.app_context():
+                barrier.wait()
+                results.append(league_app.cached_aggregate(cache_key, compute))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=caller) for _ in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def _slow_compute(calls):
+    def compute(cur):
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return [{'games': cur.execute('SELECT COUNT(*) FROM games').fetchone()[0]}]
+    return compute
+
+
+@pytest.mark.parametrize('process_locks', [False, True])
+def test_concurrent_callers_compute_once(database, monkeypatch, process_locks):
+    monkeypatch.setattr(league_app, 'AGGREGATE_PROCESS_LOCKS', process_locks)
+    calls = []
+    results, errors = _call_concurrently(_slow_compute(calls))
+
+    assert errors == []
+    assert len(calls) == 1
+    assert results == [[{'games': 0}]] * CALLERS
+    assert league_app._aggregate_flights == {}
+
+    # 保存した結果を使い、計算しない
+    results, errors = _call_concurrently(_slow_compute(calls))
+    assert errors == [] and len(calls) == 1 and len(results) == CALLERS
+
+
+def test_waiters_compute_themselves_when_leader_fails(database):
+    calls = []
+    lock = threading.Lock()
+
+    def compute(cur):
+        with lock:
+            calls.append(threading.get_ident())
+            first = len(calls) == 1
+        time.sleep(0.1)
+        if first:
+            raise RuntimeError('leader failed')
+        return {'ok': True}
+
+    results, errors = _call_concurrently(compute, 'test:failing')
+    assert len(errors) == 1 and str(errors[0]) == 'leader failed'
+    assert results == [{'ok': True}] * (CALLERS - 1)
+    assert league_app._aggregate_flights == {}
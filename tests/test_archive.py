@@ -0,0 +1,136 @@
+import os
+import sqlite3
+
+import pytest
+
+import app as league_app
+import archive
+
+SEASONS = 12
+
+
+@pytest.fixture
+def seasons(client, database):
+    """SEASONS 個のシーズン（1 がアクティブ）に、シーズン番号と同じ数のゲームを記録する"""
+    con = sqlite3.connect(database)
+    for season_id in range(2, SEASONS + 1):
+        con.execute("INSERT INTO seasons (id, name, start_date, is_active) VALUES (?, ?, '2025-01-01', 0)",
+                    (season_id, f'S{season_id}'))
+        con.execute('INSERT INTO league_settings (season_id) VALUES (?)', (season_id,))
+    con.commit()
+    con.close()
+
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for season_id in range(1, SEASONS + 1):
+        for number in range(season_id):
+            results = [{'playerId': pid, 'rawScore': 25000 + (2 - rank) * 5000, 'rank': rank,
+                        'calculatedPoints': (2 - rank) * 5 + [20, 10, -10, -20][rank - 1]}
+                       for rank, pid in enumerate(pids, 1)]
+            response = client.post(f'/api/seasons/{season_id}/games',
+                                   json={'gameDate': f'2025-01-{number % 28 + 1:02d}', 'gameResults': results})
+            assert response.json['success'], response.json
+    return pids
+
+
+def _archive(database, season_ids):
+    con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    con.execute('PRAGMA foreign_keys = ON')
+    try:
+        return [archive.archive_season(con, season_id, archive.archive_dir(database)) for season_id in season_ids]
+    finally:
+        con.close()
+
+
+def _files(database):
+    return sorted(os.listdir(archive.archive_dir(database)))
+
+
+def test_archiving_more_seasons_than_attach_limit(client, database, seasons):
+    before = client.get('/api/standings/all').json['data']
+    total_games = sum(range(1, SEASONS + 1))
+
+    _archive(database, range(2, SEASONS + 1))
+
+    assert len(_files(database)) <= archive.ARCHIVE_MAX_FILES
+    con = league_app.connect_db(database)
+    try:
+        assert con.execute('SELECT COUNT(*) FROM all_games').fetchone()[0] == total_games
+        registered = {row[0] for row in con.execute('SELECT DISTINCT file_name FROM archived_seasons')}
+        assert registered == set(_files(database))
+        per_season = dict(con.execute('SELECT season_id, COUNT(*) FROM all_games GROUP BY season_id').fetchall())
+        assert per_season == {season_id: season_id for season_id in range(1, SEASONS + 1)}
+    finally:
+        con.close()
+
+    response = client.get('/api/standings/all')
+    assert response.json['success'], response.json
+    assert response.json['data'] == before
+    assert len(client.get(f'/api/seasons/{SEASONS}/games').json['data']) == SEASONS
+
+
+def test_compact_archives_from_legacy_layout(client, database, seasons, monkeypatch):
+    # 上限がなかった頃のインストール（シーズンごとに1ファイル）
+    monkeypatch.setattr(archive, 'ARCHIVE_MAX_FILES', 100)
+    _archive(database, range(2, SEASONS + 1))
+    assert len(_files(database)) == SEASONS - 1
+    monkeypatch.setattr(archive, 'ARCHIVE_MAX_FILES', 8)
+
+    con = league_app.connect_db(database)
+    try:
+        with pytest.raises(RuntimeError):
+            con.execute('SELECT COUNT(*) FROM all_games')
+    finally:
+        con.close()
+
+    con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    try:
+        file_name = archive.compact_archives(con, archive.archive_dir(database))
+        assert archive.compact_archives(con, archive.archive_dir(database)) is None
+    finally:
+        con.close()
+
+    assert file_name in _files(database)
+    assert len(_files(database)) == archive.ARCHIVE_MAX_FILES
+    con = league_app.connect_db(database)
+    try:
+        assert con.execute('SELECT COUNT(*) FROM all_games').fetchone()[0] == sum(range(1, SEASONS + 1))
+    finally:
+        con.close()
+
+
+def test_export_reads_seasons_from_merged_files(client, database, seasons):
+    import export
+
+    _archive(database, range(2, SEASONS + 1))
+    con = league_app.connect_db(database)
+    try:
+        def count(season_id=None):
+            return sum(len(chunk['game_id']) for chunk in export.iter_chunks(con, season_id))
+
+        assert count() == 4 * sum(range(1, SEASONS + 1))
+        for season_id in range(1, SEASONS + 1):
+            assert count(season_id) == 4 * season_id
+    finally:
+        con.close()
+
+
+def test_archives_are_attached_on_first_use(client, database, seasons):
+    _archive(database, [2, 3])
+    con = league_app.connect_db(database)
+    try:
+        def attached():
+            return {row[1] for row in con.execute('PRAGMA database_list')} - {'main', 'temp'}
+
+        con.execute('SELECT COUNT(*) FROM players').fetchone()
+        assert attached() == set()
+        assert con.execute('SELECT COUNT(*) FROM all_games').fetchone()[0] == sum(range(1, SEASONS + 1))
+        assert attached() == {alias for alias, _ in archive.archive_files(con)}
+
+        # ビューを作ったトランザクションがロールバックされても作り直す
+        con.execute('DROP VIEW temp.all_games')
+        con.execute('BEGIN')
+        assert con.cursor().execute('SELECT COUNT(*) FROM all_games').fetchone()[0] == sum(range(1, SEASONS + 1))
+        con.rollback()
+        assert con.execute('SELECT COUNT(*) FROM all_games').fetchone()[0] == sum(range(1, SEASONS + 1))
+    finally:
+        con.close()
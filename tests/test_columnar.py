@@ -0,0 +1,113 @@
+"""to_columnar（?format=columnar）の変換と、static/js/utils/columnar.js の decodeColumnar での復元"""
+
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import app
+
+COLUMNAR_JS = os.path.join(os.path.dirname(app.__file__), 'static', 'js', 'utils', 'columnar.js')
+
+DECODE_SCRIPT = '''
+import { readFileSync } from 'node:fs';
+import { decodeColumnar } from './columnar.mjs';
+const payload = JSON.parse(readFileSync(process.argv[2], 'utf8'));
+process.stdout.write(JSON.stringify(decodeColumnar(payload)));
+'''
+
+
+@pytest.fixture
+def decode(tmp_path):
+    """node で decodeColumnar を実行する（columnar.js は ES モジュールなので .mjs にコピーする）"""
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    shutil.copy(COLUMNAR_JS, tmp_path / 'columnar.mjs')
+    (tmp_path / 'decode.mjs').write_text(DECODE_SCRIPT, encoding='utf-8')
+
+    def run(payload):
+        fixture = tmp_path / 'payload.json'
+        # API と同じく JSON を経由させる（int のキーは文字列になる）
+        fixture.write_text(app.app.json.dumps(payload), encoding='utf-8')
+        output = subprocess.run([node, str(tmp_path / 'decode.mjs'), str(fixture)],
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output)
+    return run
+
+
+def _json(rows):
+    return json.loads(json.dumps(rows))
+
+
+def test_empty(decode):
+    payload = app.to_columnar([])
+    assert payload['length'] == 0
+    assert decode(payload) == []
+
+
+def test_round_trip_standings_rows(decode):
+    rows = [
+        {'player': {'id': 'a', 'name': 'A', 'avatarUrl': None}, 'totalPoints': 10.5, 'lastTenGamesPoints': [1.0, 2.0]},
+        {'player': {'id': 'b', 'name': 'B', 'avatarUrl': 'x.png'}, 'totalPoints': -3.0, 'lastTenGamesPoints': []},
+    ]
+    payload = app.to_columnar(rows)
+    assert ['player', 'id'] in payload['fields']
+    assert payload['objects'] == [] and payload['missing'] == []
+    assert decode(payload) == rows
+
+
+def test_none_object_in_later_row(decode):
+    rows = [
+        {'id': 1, 'player': {'id': 'a', 'stats': {'wins': 2}}},
+        {'id': 2, 'player': None},
+        {'id': 3, 'player': {'id': 'c', 'stats': None}},
+    ]
+    assert decode(app.to_columnar(rows)) == rows
+
+
+def test_keys_first_seen_in_later_rows_are_kept(decode):
+    rows = [{'id': 1}, {'id': 2, 'extra': {'note': 'x'}}, {'id': 3, 'late': 5, 'extra': None}]
+    payload = app.to_columnar(rows)
+    assert ['extra', 'note'] in payload['fields']
+    assert ['late'] in payload['fields']
+    # キーがなかった行にはキーを作らず、None の値とは区別する
+    assert decode(payload) == rows
+
+
+def test_keys_containing_dots_do_not_collide(decode):
+    rows = [{'a.b': 1, 'a': {'b': 2}}, {'a.b': 3, 'a': {'b': 4}}]
+    payload = app.to_columnar(rows)
+    assert ['a.b'] in payload['fields'] and ['a', 'b'] in payload['fields']
+    assert decode(payload) == rows
+
+
+def test_nested_lists_with_heterogeneous_children(decode):
+    rows = [
+        {'id': 'g1', 'results': [{'playerId': 'a', 'rank': 1}, {'playerId': 'b', 'rank': 2, 'note': 'x'}]},
+        {'id': 'g2', 'results': []},
+        {'id': 'g3', 'results': None},
+        {'id': 'g4', 'results': [{'playerId': 'c', 'rank': 1, 'detail': {'agari': 2}}]},
+        {'id': 'g5'},
+    ]
+    assert decode(app.to_columnar(rows)) == rows
+
+
+def test_missing_distribution_keys_are_omitted(decode):
+    rows = [{'rankDistribution': {1: 2, 2: 0}}, {'rankDistribution': {1: 0, 3: 1}}]
+    payload = app.to_columnar(rows)
+    assert ['rankDistribution', '1'] in payload['fields']
+    assert decode(payload) == _json(rows)
+
+
+def test_api_columnar_matches_rows(client, decode):
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    results = [{'playerId': pid, 'rawScore': 25000, 'rank': rank, 'calculatedPoints': 0}
+               for rank, pid in enumerate(pids, 1)]
+    assert client.post('/api/seasons/1/games', json={'gameDate': '2025-01-01', 'gameResults': results}).json['success']
+
+    for url in ('/api/seasons/1/games', '/api/seasons/1/standings', '/api/standings/all'):
+        rows = client.get(url).json['data']
+        assert decode(client.get(url + '?format=columnar').json['data']) == rows
@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+SCORES = [(45300, 30100, 15800, 8800), (32000, 28000, 22000, 18000), (40000, 35000, 20000, 5000)]
+
+
+@pytest.fixture
+def games(client, database):
+    """シーズン1に2ゲーム、シーズン2に1ゲーム"""
+    con = sqlite3.connect(database)
+    con.execute("INSERT INTO seasons (id, name, start_date, is_active) VALUES (2, 'S2', '2025-02-01', 0)")
+    con.execute('INSERT INTO league_settings (season_id) VALUES (2)')
+    con.commit()
+    con.close()
+
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for number, scores in enumerate(SCORES):
+        season_id = 1 if number < 2 else 2
+        results = [{'playerId': pid, 'rawScore': score, 'rank': rank, 'calculatedPoints': (score - 25000) / 1000}
+                   for rank, (pid, score) in enumerate(zip(pids, scores), 1)]
+        response = client.post(f'/api/seasons/{season_id}/games',
+                               json={'gameDate': f'2025-0{season_id}-0{number + 1}', 'gameResults': results})
+        assert response.json['success'], response.json
+    return pids
+
+
+def _distribution(client, **params):
+    response = client.get('/api/stats/distribution', query_string={'metric': 'rawScore', **params})
+    assert response.json['success'], response.json
+    return response.json['data']
+
+
+def _counts(histogram):
+    return {bucket['lower']: bucket['count'] for bucket in histogram}
+
+
+def test_group_by_season_sums_players(client, games):
+    per_player = _distribution(client, season_id=1)
+    per_season = _distribution(client, group_by='season')
+
+    assert [row['season'] for row in per_season] == [{'id': 1, 'name': 'S1'}, {'id': 2, 'name': 'S2'}]
+    assert [row['count'] for row in per_season] == [8, 4]
+    expected = {}
+    for row in per_player:
+        for lower, count in _counts(row['histogram']).items():
+            expected[lower] = expected.get(lower, 0) + count
+    assert _counts(per_season[0]['histogram']) == expected
+    # 中央値は8件の4番目と5番目（22000・28000）の間
+    assert 22000 <= per_season[0]['median'] <= 28000
+
+
+def test_group_by_all_and_filters(client, games):
+    [overall] = _distribution(client, group_by='all')
+    assert 'player' not in overall and overall['count'] == 12
+
+    [season] = _distribution(client, group_by='season', season_id=2)
+    assert season['season']['id'] == 2 and season['count'] == 4
+
+    [only] = _distribution(client, group_by='all', player_id=games[0])
+    assert only['count'] == 3
+
+
+def test_group_by_player_is_default(client, games):
+    rows = _distribution(client)
+    assert len(rows) == 4 and all(row['count'] == 3 for row in rows)
+
+
+def test_unknown_group_by(client):
+    response = client.get('/api/stats/distribution', query_string={'group_by': 'table'})
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+import io
+import sqlite3
+
+import pytest
+
+import app as league_app
+import export
+
+GAMES = 5
+
+
+@pytest.fixture
+def games(client, database, tmp_path, monkeypatch):
+    """GAMES 回のゲームを記録し、エクスポートの置き場所を一時ディレクトリにする"""
+    monkeypatch.setattr(export, 'EXPORT_DIR', str(tmp_path / 'exports'))
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for number in range(GAMES):
+        results = [{'playerId': pid, 'rawScore': 25000 + (2 - rank) * 5000 + number * 100, 'rank': rank,
+                    'calculatedPoints': (2 - rank) * 5 + [20, 10, -10, -20][rank - 1] + number * 0.1}
+                   for rank, pid in enumerate(pids, 1)]
+        response = client.post('/api/seasons/1/games', json={'gameDate': f'2025-01-0{number + 1}',
+                                                             'gameResults': results})
+        assert response.json['success'], response.json
+    return pids
+
+
+def _expected_rows(database):
+    con = sqlite3.connect(database)
+    try:
+        return con.execute('''
+            SELECT g.id, gr.player_id, p.name, s.name, g.game_date, gr.raw_score, gr.rank, gr.calculated_points
+            FROM game_results gr
+            JOIN games g ON g.id = gr.game_id
+            JOIN players p ON p.id = gr.player_id
+            JOIN seasons s ON s.id = g.season_id
+            ORDER BY gr.id
+        ''').fetchall()
+    finally:
+        con.close()
+
+
+def test_npz_chunks_round_trip(database, games, tmp_path):
+    np = pytest.importorskip('numpy')
+
+    path = str(tmp_path / 'game_results.npz')
+    con = league_app.connect_db(database)
+    try:
+        # 1チャンクに収まらない行数にする
+        result = export.export_game_results(con, 'npz', path, chunk_rows=3)
+    finally:
+        con.close()
+    expected = _expected_rows(database)
+    assert result['rows'] == len(expected) == GAMES * 4
+
+    with np.load(path) as data:
+        assert set(data.files) == {name for name, _, _ in export.EXPORT_COLUMNS}
+        rows = list(zip(data['game_id'].tolist(), data['player_id'].tolist(), data['player_name'].tolist(),
+                        data['season_name'].tolist(), data['game_date'].astype(str).tolist(),
+                        data['raw_score'].tolist(), data['rank'].tolist(), data['calculated_points'].tolist()))
+    assert rows == [tuple(row) for row in expected]
+
+
+def test_export_route_without_worker(client, games, monkeypatch):
+    monkeypatch.setattr(league_app, 'JOB_WORKER', False)
+    try:
+        fmt = export.default_format()
+    except RuntimeError:
+        pytest.skip('export requires pyarrow or NumPy')
+
+    response = client.post('/api/exports', json={'format': fmt})
+    assert response.json['success'], response.json
+    data = response.json['data']
+    assert data['status'] == 'succeeded'
+    assert data['result']['rows'] == GAMES * 4
+
+    download = client.get(f"/api/exports/{data['result']['fileName']}")
+    assert download.status_code == 200
+    assert 'attachment' in download.headers['Content-Disposition']
+    assert len(download.data) == data['result']['bytes']
+    if fmt == 'npz':
+        with export.np.load(io.BytesIO(download.data)) as loaded:
+            assert len(loaded['game_id']) == GAMES * 4
+
+
+@pytest.mark.parametrize('fmt, library', [('parquet', 'pa'), ('npz', 'np')])
+def test_export_route_rejects_missing_library(client, monkeypatch, fmt, library):
+    monkeypatch.setattr(export, library, None)
+    response = client.post('/api/exports', json={'format': fmt})
+    assert response.status_code == 503
+    assert client.get('/api/jobs').json['data'] == []
+
+
+def test_export_route_rejects_unknown_format(client):
+    assert client.post('/api/exports', json={'format': 'csv'}).status_code == 400
+
+
+@pytest.mark.parametrize('file_name', ['../database.db', '..%2fdatabase.db', '%2e%2e/%2e%2e/app.py'])
+def test_download_rejects_path_traversal(client, games, file_name):
+    response = client.get(f'/api/exports/{file_name}')
+    assert response.status_code == 404
+    assert response.json['success'] is False
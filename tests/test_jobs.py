@@ -0,0 +1,132 @@
+import pytest
+
+import app as league_app
+import jobs
+
+
+@pytest.fixture
+def con(database):
+    con = league_app.connect_db(database)
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def kind(monkeypatch):
+    monkeypatch.setitem(jobs.HANDLERS, 'test_job', lambda con, payload, report: payload)
+    return 'test_job'
+
+
+def _job(con, job_id):
+    return jobs.query_job(con.cursor(), job_id)
+
+
+def test_enqueue_dedupes_queued_jobs(con, kind):
+    first = jobs.enqueue(con.cursor(), kind, {'n': 1}, dedupe_key='k')
+    assert jobs.enqueue(con.cursor(), kind, {'n': 2}, dedupe_key='k') == first
+    con.commit()
+    jobs.claim_next(con, 'w1')
+    # 実行中のジョブは重複とみなさない
+    assert jobs.enqueue(con.cursor(), kind, {'n': 3}, dedupe_key='k') != first
+
+
+def test_claim_next_takes_oldest_once(con, kind):
+    ids = [jobs.enqueue(con.cursor(), kind, {'n': n}) for n in range(2)]
+    con.commit()
+
+    job = jobs.claim_next(con, 'w1')
+    assert job[0] == ids[0]
+    assert _job(con, ids[0])['status'] == 'running'
+    assert _job(con, ids[0])['attempts'] == 1
+    assert jobs.claim_next(con, 'w2')[0] == ids[1]
+    assert jobs.claim_next(con, 'w3') is None
+
+
+def test_claim_next_by_id(con, kind):
+    ids = [jobs.enqueue(con.cursor(), kind, {'n': n}) for n in range(2)]
+    con.commit()
+    assert jobs.claim_next(con, 'w1', ids[1])[0] == ids[1]
+    assert jobs.claim_next(con, 'w1', ids[1]) is None
+    assert _job(con, ids[0])['status'] == 'queued'
+
+
+def test_finish_retries_with_backoff(con, kind):
+    job_id = jobs.enqueue(con.cursor(), kind, max_attempts=2)
+    con.commit()
+
+    jobs._finish(con, jobs.claim_next(con, 'w1'), error=RuntimeError('boom'))
+    job = _job(con, job_id)
+    assert (job['status'], job['error']) == ('queued', 'RuntimeError: boom')
+    delay = con.execute("SELECT CAST(strftime('%s', run_after) - strftime('%s', 'now') AS INTEGER) FROM jobs").fetchone()[0]
+    assert jobs.JOB_RETRY_DELAY_SECONDS - 5 <= delay <= jobs.JOB_RETRY_DELAY_SECONDS
+    # 待ち時間が過ぎるまでは取り出さない
+    assert jobs.claim_next(con, 'w1') is None
+
+    con.execute("UPDATE jobs SET run_after = datetime('now', '-1 seconds')")
+    con.commit()
+    jobs._finish(con, jobs.claim_next(con, 'w1'), error=RuntimeError('boom'))
+    job = _job(con, job_id)
+    assert (job['status'], job['attempts']) == ('failed', 2)
+    assert job['finishedDate'] is not None
+
+
+def test_finish_does_not_retry_value_errors(con, kind):
+    job_id = jobs.enqueue(con.cursor(), kind)
+    con.commit()
+    jobs._finish(con, jobs.claim_next(con, 'w1'), error=ValueError('bad payload'))
+    assert _job(con, job_id)['status'] == 'failed'
+
+
+def test_finish_records_result(con, kind):
+    job_id = jobs.enqueue(con.cursor(), kind)
+    con.commit()
+    jobs._finish(con, jobs.claim_next(con, 'w1'), result={'rows': 3})
+    job = _job(con, job_id)
+    assert (job['status'], job['progress'], job['result'], job['error']) == ('succeeded', 1, {'rows': 3}, None)
+
+
+def test_requeue_stale(con, kind):
+    job_id = jobs.enqueue(con.cursor(), kind, max_attempts=1)
+    other_id = jobs.enqueue(con.cursor(), kind)
+    con.commit()
+    jobs.claim_next(con, 'w1')
+    jobs.claim_next(con, 'w2')
+    con.execute("UPDATE jobs SET heartbeat = datetime('now', '-1 hours')")
+    con.commit()
+
+    assert jobs.requeue_stale(con, stale_seconds=60) == 2
+    # 回数を使い切ったジョブは失敗にする
+    assert _job(con, job_id)['status'] == 'failed'
+    assert _job(con, other_id)['status'] == 'queued'
+
+
+def test_run_next_runs_handler(database, kind):
+    con = league_app.connect_db(database)
+    job_id = jobs.enqueue(con.cursor(), kind, {'n': 1})
+    con.commit()
+    con.close()
+
+    result = jobs.run_next(lambda: league_app.connect_db(database), 'w1', log=lambda message: None)
+    assert result == {'id': job_id, 'kind': kind, 'status': 'succeeded'}
+    con = league_app.connect_db(database)
+    assert _job(con, job_id)['result'] == {'n': 1}
+    con.close()
+
+
+def test_deferred_static_artifacts_run_after_response_without_worker(client, con, tmp_path, monkeypatch):
+    monkeypatch.setattr(league_app, 'STATIC_DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(league_app, 'STATIC_ARTIFACTS', True)
+    monkeypatch.setattr(league_app, 'DEFER_STATIC_ARTIFACTS', True)
+    monkeypatch.setattr(league_app, 'JOB_WORKER', False)
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    results = [{'playerId': pid, 'rawScore': 25000, 'rank': rank, 'calculatedPoints': 0}
+               for rank, pid in enumerate(pids, 1)]
+
+    response = client.post('/api/seasons/1/games', json={'gameDate': '2025-01-01', 'gameResults': results})
+    assert response.json['success'], response.json
+    [job] = jobs.query_jobs(con.cursor(), kind='rebuild_static_artifacts')
+    assert job['status'] == 'queued'
+
+    response.close()
+    assert _job(con, job['id'])['status'] == 'succeeded'
+    assert (tmp_path / 'data' / 'seasons' / '1' / 'games.json').exists()
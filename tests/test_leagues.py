@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+
+import app as league_app
+import archive
+import leagues
+
+SEASONS = 4
+
+
+@pytest.fixture
+def league(tmp_path, monkeypatch):
+    """LEAGUES_DIR の下にリーグを1つ作り、アクティブでないシーズンにゲームを記録する"""
+    monkeypatch.setattr(leagues, 'LEAGUES_DIR', str(tmp_path / 'leagues'))
+    monkeypatch.setattr(league_app, 'league_registry', leagues.LeagueRegistry(
+        lambda database: league_app.connect_db(database, check_same_thread=False)))
+    database = leagues.create_league('club-a')
+
+    con = sqlite3.connect(database)
+    for season_id in range(1, SEASONS + 1):
+        con.execute("INSERT INTO seasons (id, name, start_date, is_active) VALUES (?, ?, '2025-01-01', ?)",
+                    (season_id, f'S{season_id}', int(season_id == 1)))
+        con.execute('INSERT INTO league_settings (season_id) VALUES (?)', (season_id,))
+    con.commit()
+    con.close()
+
+    client = league_app.app.test_client()
+    pids = [client.post('/l/club-a/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for season_id in range(1, SEASONS + 1):
+        results = [{'playerId': pid, 'rawScore': 25000, 'rank': rank, 'calculatedPoints': 4 - rank}
+                   for rank, pid in enumerate(pids, 1)]
+        response = client.post(f'/l/club-a/api/seasons/{season_id}/games',
+                               json={'gameDate': '2025-01-01', 'gameResults': results})
+        assert response.json['success'], response.json
+    yield league_app.open_league('club-a')
+    league_app.league_registry.close()
+
+
+def _archive(database, season_id):
+    con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    con.execute('PRAGMA foreign_keys = ON')
+    try:
+        return archive.archive_season(con, season_id, archive.archive_dir(database))
+    finally:
+        con.close()
+
+
+def _compact(database):
+    con = sqlite3.connect(archive.file_uri(database), uri=True, isolation_level=None)
+    try:
+        return archive.compact_archives(con, archive.archive_dir(database))
+    finally:
+        con.close()
+
+
+def _games(con):
+    return con.execute('SELECT COUNT(*) FROM all_games').fetchone()[0]
+
+
+def test_pool_reuses_connection_until_archives_change(league, monkeypatch):
+    pool = league.pool
+    con = pool.acquire()
+    assert _games(con) == SEASONS
+    pool.release(con)
+
+    # アーカイブが変わらなければ同じ接続を使い回す
+    assert pool.acquire() is con
+    pool.release(con)
+
+    _archive(league.database, 2)
+    reopened = pool.acquire()
+    assert reopened is not con
+    with pytest.raises(sqlite3.ProgrammingError):
+        con.execute('SELECT 1')
+    assert _games(reopened) == SEASONS
+    pool.release(reopened)
+
+    # シーズン数の変わらないまとめ直しでも開き直す
+    _archive(league.database, 3)
+    con = pool.acquire()
+    assert _games(con) == SEASONS
+    pool.release(con)
+    monkeypatch.setattr(archive, 'ARCHIVE_MAX_FILES', 1)
+    assert _compact(league.database) is not None
+    compacted = pool.acquire()
+    assert compacted is not con
+    assert _games(compacted) == SEASONS
+    assert {row[0] for row in compacted.execute('SELECT DISTINCT season_id FROM all_games')} == \
+        set(range(1, SEASONS + 1))
+    pool.release(compacted)
+
+
+def test_league_requests_see_archived_seasons(league):
+    client = league_app.app.test_client()
+    before = client.get('/l/club-a/api/standings/all').json['data']
+    assert client.get('/l/club-a/api/seasons/2/games').json['success']
+
+    _archive(league.database, 2)
+
+    # プールに残った接続ではなく、開き直した接続でアーカイブを読む
+    assert client.get('/l/club-a/api/standings/all').json['data'] == before
+    games = client.get('/l/club-a/api/seasons/2/games').json
+    assert games['success'] and len(games['data']) == 1
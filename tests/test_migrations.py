@@ -0,0 +1,114 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import rollups
+
+
+def _connect(path):
+    con = sqlite3.connect(path, isolation_level=None)
+    con.execute('PRAGMA foreign_keys = ON')
+    return con
+
+
+def _objects(con):
+    return sorted(con.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'").fetchall())
+
+
+def _migrate(con, **kwargs):
+    return migrations.migrate(con, batch_size=1, pause_seconds=0, log=lambda message: None, **kwargs)
+
+
+@pytest.fixture
+def baseline(tmp_path, monkeypatch):
+    """baseline（version 1）のスキーマだけを持ち、ゲームを記録済みのデータベース"""
+    path = str(tmp_path / 'legacy.db')
+    con = _connect(path)
+    monkeypatch.setattr(migrations, 'MIGRATIONS', migrations.MIGRATIONS[:1])
+    assert _migrate(con) == 1
+    monkeypatch.undo()
+
+    con.execute("INSERT INTO seasons (id, name, start_date, is_active) VALUES (1, 'S1', '2025-01-01', 1)")
+    con.execute('INSERT INTO league_settings (season_id) VALUES (1)')
+    con.executemany('INSERT INTO players (id, name) VALUES (?, ?)', [(f'p{i}', f'やまだ{i}') for i in range(4)])
+    for number in range(3):
+        con.execute("INSERT INTO games (id, season_id, game_date) VALUES (?, 1, ?)",
+                    (f'g{number}', f'2025-01-0{number + 1}'))
+        con.executemany('''
+            INSERT INTO game_results (game_id, player_id, raw_score, rank, calculated_points)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(f'g{number}', f'p{i}', 40000 - i * 10000, i + 1, 35.0 - i * 20)
+              for i in range(4)])
+    con.close()
+    return path
+
+
+def test_migrate_from_version_0_matches_schema(tmp_path):
+    con = _connect(str(tmp_path / 'empty.db'))
+    fresh = _connect(str(tmp_path / 'fresh.db'))
+    try:
+        assert migrations.current_version(con) == 0
+        assert _migrate(con) == migrations.LATEST_VERSION
+        with open(migrations.SCHEMA_PATH, encoding='utf-8') as f:
+            fresh.executescript(f.read())
+        assert _objects(con) == _objects(fresh)
+
+        # もう一度実行しても何もしない
+        applied = con.execute('SELECT version, applied_date FROM schema_version').fetchall()
+        assert _migrate(con) == migrations.LATEST_VERSION
+        assert con.execute('SELECT version, applied_date FROM schema_version').fetchall() == applied
+        assert _objects(con) == _objects(fresh)
+    finally:
+        con.close()
+        fresh.close()
+
+
+def test_migrate_backfills_existing_data(baseline):
+    con = _connect(baseline)
+    try:
+        assert _migrate(con) == migrations.LATEST_VERSION
+        assert con.execute('SELECT COUNT(*) FROM change_log').fetchone()[0] == 3 + 4
+        assert con.execute('SELECT COUNT(*) FROM daily_player_stats').fetchone()[0] == 3 * 4
+        assert con.execute('SELECT COUNT(*) FROM player_search WHERE reading_key IS NOT NULL').fetchone()[0] == 4
+        assert dict(con.execute('''
+            SELECT player_id, cum_points FROM player_cumulative_stats WHERE game_date = '2025-01-03'
+        ''').fetchall()) == {f'p{i}': 3 * (35.0 - i * 20) for i in range(4)}
+    finally:
+        con.close()
+
+
+def test_interrupted_backfill_resumes(baseline, tmp_path, monkeypatch):
+    expected_path = str(tmp_path / 'expected.db')
+    with open(baseline, 'rb') as source, open(expected_path, 'wb') as target:
+        target.write(source.read())
+    expected = _connect(expected_path)
+    _migrate(expected)
+
+    calls = []
+    refresh = rollups.refresh_daily_stats
+
+    def failing_refresh(cur, keys):
+        calls.append(keys)
+        if len(calls) == 2:
+            raise RuntimeError('interrupted')
+        refresh(cur, keys)
+
+    con = _connect(baseline)
+    try:
+        monkeypatch.setattr(rollups, 'refresh_daily_stats', failing_refresh)
+        with pytest.raises(RuntimeError):
+            _migrate(con)
+        # 中断したマイグレーションは記録されず、前のバージョンから再開する
+        assert migrations.current_version(con) == 3
+        monkeypatch.undo()
+
+        assert _migrate(con) == migrations.LATEST_VERSION
+        for query in ('SELECT * FROM daily_player_stats ORDER BY 1, 2',
+                      'SELECT * FROM player_cumulative_stats ORDER BY 1, 2',
+                      'SELECT * FROM score_histograms ORDER BY 1, 2, 3, 4',
+                      'SELECT seq, entity, entity_id, operation FROM change_log ORDER BY seq'):
+            assert con.execute(query).fetchall() == expected.execute(query).fetchall(), query
+    finally:
+        con.close()
+        expected.close()
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+import migrations
+import player_search
+
+
+@pytest.fixture
+def players(client):
+    names = ['やまだ', 'ヤマモト', '山田タロウ', 'Yamaguchi', 'しゅんすけ', 'はっとり']
+    return {name: client.post('/api/players', json={'name': name}).json['data']['id'] for name in names}
+
+
+def _search(client, query):
+    response = client.get('/api/players/search', query_string={'q': query})
+    assert response.json['success'], response.json
+    return [player['name'] for player in response.json['data']]
+
+
+@pytest.mark.parametrize('name, reading', [
+    ('やまだ', 'yamada'), ('ユーキ', 'yuuki'), ('しゅんすけ', 'shunsuke'), ('まっちゃ', 'matcha'),
+    ('ｷｮｳｺ', 'kyouko'), ('山田タロウ', '山田tarou'), ('Yamada', None),
+])
+def test_reading(name, reading):
+    assert player_search._reading(player_search.normalize(name)) == reading
+
+
+def test_romaji_matches_kana_names(client, players):
+    assert _search(client, 'yam') == ['Yamaguchi', 'やまだ', 'ヤマモト']
+    assert _search(client, 'ＹＡＭＡＤ') == ['やまだ']
+    # 部分一致（3文字未満と trigram の両方）
+    assert _search(client, 'tar') == ['山田タロウ']
+    assert _search(client, 'su') == ['しゅんすけ']
+    assert _search(client, 'hatt') == ['はっとり']
+    # かなの入力はそのまま
+    assert _search(client, 'やま') == ['やまだ', 'ヤマモト']
+
+
+def test_rename_updates_reading(client, players):
+    response = client.put(f"/api/players/{players['やまだ']}", json={'name': 'たなか'})
+    assert response.json['success'], response.json
+    assert _search(client, 'tana') == ['たなか']
+    assert _search(client, 'yamad') == []
+
+
+def test_migration_backfills_reading(database, players):
+    con = sqlite3.connect(database, isolation_level=None)
+    try:
+        # reading_key を追加する前のスキーマ（version 11）に戻す
+        migrations.stamp_latest(con)
+        con.execute('DELETE FROM schema_version WHERE version = 12')
+        con.execute('DROP INDEX idx_player_search_reading_key')
+        con.execute('ALTER TABLE player_search DROP COLUMN reading_key')
+
+        assert migrations.migrate(con, pause_seconds=0, log=lambda message: None) == migrations.LATEST_VERSION
+        readings = dict(con.execute('''
+            SELECT p.name, s.reading_key FROM player_search s JOIN players p ON p.id = s.player_id
+        ''').fetchall())
+    finally:
+        con.close()
+    assert readings['やまだ'] == 'yamada'
+    assert readings['Yamaguchi'] is None
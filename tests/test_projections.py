@@ -0,0 +1,47 @@
+import multiprocessing
+import threading
+
+import pytest
+
+import projections
+
+pytest.importorskip('numpy')
+
+CURRENT = [12.5, 3.0, -4.5, -11.0]
+SAMPLES = [[30.1, -5.2, 12.0, 8.8, -20.4], [10.0, 2.5, -3.3], [-15.0, 22.2, 4.4, 0.0, 1.1], [5.5, -9.9]]
+REMAINING = [6, 8, 7, 10]
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # 複数のタスクに分かれる試行回数を小さく保つ
+    monkeypatch.setattr(projections, 'PROJECTION_CHUNK_SIZE', 500)
+
+
+def _simulate(seed, workers):
+    result = projections.simulate(CURRENT, SAMPLES, REMAINING, 2_000, seed, workers)
+    return result['counts'].tolist(), result['expected_points'].tolist()
+
+
+def test_same_seed_gives_same_result_in_process_and_pool():
+    in_process = _simulate(7, workers=1)
+    assert _simulate(7, workers=1) == in_process
+    assert _simulate(7, workers=2) == in_process
+    assert _simulate(8, workers=1) != in_process
+
+
+def test_no_fork_with_other_threads(monkeypatch):
+    if 'fork' in multiprocessing.get_all_start_methods() and threading.active_count() == 1:
+        assert projections._pool_context() is not None
+
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        assert projections._pool_context() is None
+    finally:
+        stop.set()
+        thread.join()
+
+    monkeypatch.setattr(projections, 'PROJECTION_FORK', False)
+    assert projections._pool_context() is None
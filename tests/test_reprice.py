@@ -0,0 +1,77 @@
+import pytest
+
+import app as league_app
+
+SCORES = [(45300, 30100, 15800, 8800), (32000, 28000, 22000, 18000)]
+DEFAULT_UMA = {1: 20, 2: 10, 3: -10, 4: -20}
+
+
+def _points(score, rank, base, uma):
+    return (score - base) / 1000 + uma[rank]
+
+
+@pytest.fixture
+def players(client):
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for number, scores in enumerate(SCORES):
+        results = [{'playerId': pid, 'rawScore': score, 'rank': rank,
+                    'calculatedPoints': _points(score, rank, 25000, DEFAULT_UMA)}
+                   for rank, (pid, score) in enumerate(zip(pids, scores), 1)]
+        response = client.post('/api/seasons/1/games', json={'gameDate': f'2025-01-0{number + 1}',
+                                                             'gameResults': results})
+        assert response.json['success'], response.json
+    return pids
+
+
+def _put(client, base, uma):
+    response = client.put('/api/seasons/1/settings', json={
+        'gameStartChipCount': 25000, 'calculationBaseChipCount': base, 'umaPoints': uma,
+    })
+    assert response.json['success'], response.json
+    return response
+
+
+def _update(client, base, uma):
+    response = _put(client, base, uma)
+    response.close()
+    return response.json['data']['jobId']
+
+
+def test_settings_change_reprices_games_after_response(client, players, monkeypatch):
+    monkeypatch.setattr(league_app, 'JOB_WORKER', False)
+    # JSON のキーは文字列で届く
+    response = _put(client, 30000, {'1': 30, '2': 10, '3': -10, '4': -30})
+    assert response.status_code == 202
+    job_id = response.json['data']['jobId']
+    assert job_id is not None
+    # レスポンスを返し終えるまでは実行しない
+    assert client.get(f'/api/jobs/{job_id}').json['data']['status'] == 'queued'
+    response.close()
+
+    settings = client.get('/api/seasons/1/settings').json['data']
+    assert settings['calculationBaseChipCount'] == 30000
+    assert [settings['umaPoints'][key] for key in ('1', '2', '3', '4')] == [30, 10, -10, -30]
+    assert client.get(f'/api/jobs/{job_id}').json['data']['status'] == 'succeeded'
+
+    uma = {1: 30, 2: 10, 3: -10, 4: -30}
+    standings = {row['player']['id']: row for row in client.get('/api/seasons/1/standings').json['data']}
+    for index, pid in enumerate(players):
+        expected = sum(_points(scores[index], index + 1, 30000, uma) for scores in SCORES)
+        assert standings[pid]['totalPoints'] == pytest.approx(expected)
+    games = client.get('/api/seasons/1/games').json['data']
+    for game in games:
+        for result in game['results']:
+            assert result['calculatedPoints'] == pytest.approx(_points(result['rawScore'], result['rank'], 30000, uma))
+
+
+def test_unchanged_settings_do_not_enqueue(client, players):
+    assert _update(client, 25000, {'1': 20, '2': 10, '3': -10, '4': -20}) is None
+    assert client.get('/api/jobs').json['data'] == []
+
+
+def test_settings_change_is_left_to_worker(client, players, monkeypatch):
+    monkeypatch.setattr(league_app, 'JOB_WORKER', True)
+    job_id = _update(client, 25000, {'1': 15, '2': 5, '3': -5, '4': -15})
+    assert client.get(f'/api/jobs/{job_id}').json['data']['status'] == 'queued'
+    # 登録済みの再計算は重複して登録しない
+    assert _update(client, 25000, {'1': 20, '2': 10, '3': -10, '4': -20}) == job_id
@@ -0,0 +1,18 @@
+from flask import url_for
+from werkzeug.routing import Rule
+
+import app as league_app
+
+
+def test_url_for_builds_urls():
+    with league_app.app.test_request_context(base_url='http://localhost/base'):
+        assert url_for('get_daily_standings', date='2025-01-01') == '/base/api/standings/daily?date=2025-01-01'
+        assert url_for('static_files', filename='js/App.js') == '/base/static/js/App.js'
+        assert url_for('index', _external=True) == 'http://localhost/base/'
+
+
+def test_lazy_build_rule_requires_werkzeug_internals(monkeypatch):
+    expected = league_app.LazyBuildRule if league_app.LazyBuildRule.lazy_build_supported() else Rule
+    assert league_app.app.url_rule_class is expected
+    monkeypatch.delattr(Rule, '_compile_builder')
+    assert not league_app.LazyBuildRule.lazy_build_supported()
@@ -0,0 +1,57 @@
+import pytest
+
+import app as league_app
+
+# 0.1 刻みのポイント（浮動小数点の足し引きで誤差が出やすい値）
+POINTS = [(10.4, 0.3, -3.6, -7.1), (20.7, 5.2, -10.8, -15.1), (0.1, 0.2, -0.1, -0.2)]
+DATES = ['2025-01-01', '2025-01-02', '2025-01-03']
+
+
+@pytest.fixture
+def players(client):
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    for game_date, points in zip(DATES, POINTS):
+        results = [{'playerId': pid, 'rawScore': 25000 + int(value * 1000), 'rank': rank,
+                    'calculatedPoints': value}
+                   for rank, (pid, value) in enumerate(zip(pids, points), 1)]
+        response = client.post('/api/seasons/1/games', json={'gameDate': game_date, 'gameResults': results})
+        assert response.json['success'], response.json
+    return pids
+
+
+@pytest.mark.parametrize('url,start_date,end_date', [
+    ('/api/standings/all', None, None),
+    ('/api/standings/date-range?start_date=2025-01-02&end_date=2025-01-03', '2025-01-02', '2025-01-03'),
+    ('/api/standings/daily?date=2025-01-02', '2025-01-02', '2025-01-02'),
+    ('/api/standings/as-of?date=2025-01-02', None, '2025-01-02'),
+])
+def test_date_range_points_have_no_float_noise(client, players, url, start_date, end_date):
+    response = client.get(url)
+    assert response.json['success'], response.json
+    standings = {row['player']['id']: row for row in response.json['data']}
+
+    selected = [points for game_date, points in zip(DATES, POINTS)
+                if (start_date is None or game_date >= start_date) and (end_date is None or game_date <= end_date)]
+    for index, pid in enumerate(players):
+        expected = round(sum(points[index] for points in selected), league_app.POINTS_DECIMALS)
+        assert standings[pid]['totalPoints'] == expected
+        assert standings[pid]['gamesPlayed'] == len(selected)
+
+
+@pytest.mark.parametrize('url', [
+    '/api/standings/all', '/api/seasons/1/standings', '/api/standings/daily?date=2025-01-02',
+    '/api/standings/date-range?start_date=2025-01-02&end_date=2025-01-03', '/api/standings/as-of?date=2025-01-02',
+])
+def test_fields_returns_only_requested_keys(client, players, url):
+    separator = '&' if '?' in url else '?'
+    full = {row['player']['id']: row for row in client.get(url).json['data']}
+
+    response = client.get(f'{url}{separator}fields=totalPoints,lastTenGamesPoints,gamesPlayed')
+    assert response.json['success'], response.json
+    rows = response.json['data']
+    assert [row['player']['id'] for row in rows] == list(full)
+    for row in rows:
+        assert set(row) == {'player', 'totalPoints', 'lastTenGamesPoints', 'gamesPlayed'}
+        assert row == {key: full[row['player']['id']][key] for key in row}
+
+    assert client.get(f'{url}{separator}fields=totalPoints,nope').status_code == 400
@@ -0,0 +1,122 @@
+"""standings_engine（MAHJONG_STANDINGS_ENGINE=numpy）と SQL の順位表が一致すること"""
+
+import random
+import sqlite3
+
+import pytest
+
+import app as league_app
+
+standings_engine = pytest.importorskip('standings_engine')
+pytest.importorskip('numpy')
+
+FIELDS = list(league_app.STANDINGS_FIELDS)
+# シーズン1は1月、シーズン2は2月（シーズンの絞り込みを期間指定の SQL と比べる）
+SEASON_DATES = {1: ('2025-01-01', '2025-01-31'), 2: ('2025-02-01', '2025-02-28')}
+QUERIES = [
+    {},
+    {'start_date': '2025-01-03', 'end_date': '2025-01-03'},
+    {'start_date': '2025-01-02', 'end_date': '2025-02-02'},
+    {'end_date': '2025-01-04'},
+]
+
+
+@pytest.fixture
+def games(client, database):
+    con = sqlite3.connect(database)
+    con.execute("INSERT INTO seasons (id, name, start_date, is_active) VALUES (2, 'S2', '2025-02-01', 0)")
+    con.execute('INSERT INTO league_settings (season_id) VALUES (2)')
+    con.commit()
+    con.close()
+
+    rnd = random.Random(3)
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(6)]
+    game_ids = []
+    for number in range(24):
+        season_id = 1 if number < 16 else 2
+        month = SEASON_DATES[season_id][0][:8]
+        table = rnd.sample(pids, 4)
+        scores = sorted((rnd.randint(0, 500) * 100 for _ in range(3)), reverse=True)
+        scores.append(100000 - sum(scores))
+        scores.sort(reverse=True)
+        results = [{'playerId': pid, 'rawScore': score, 'rank': rank,
+                    'calculatedPoints': (score - 25000) / 1000 + [20, 10, -10, -20][rank - 1],
+                    'agariCount': rnd.randint(0, 3), 'riichiCount': rnd.randint(0, 3)}
+                   for rank, (pid, score) in enumerate(zip(table, scores), 1)]
+        response = client.post(f'/api/seasons/{season_id}/games', json={
+            'gameDate': f'{month}{number % 5 + 1:02d}', 'gameResults': results, 'totalHandsInGame': 9})
+        assert response.json['success'], response.json
+        game_ids.append(response.json['data']['id'])
+    return game_ids
+
+
+def _rounded(value):
+    if isinstance(value, float):
+        return round(value, 9)
+    if isinstance(value, dict):
+        return {key: _rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rounded(item) for item in value]
+    return value
+
+
+def _standings(database, monkeypatch, use_engine, season_id=None, **dates):
+    monkeypatch.setattr(league_app, 'STANDINGS_ENGINE', use_engine)
+    with league_app.app.app_context():
+        con = league_app.connect_db(database)
+        try:
+            cur = con.cursor()
+            if season_id is not None:
+                return _rounded(standings_engine.query_standings(
+                    standings_engine.get_engine(database), cur, league_app.current_revision(cur), FIELDS,
+                    league_app.STANDINGS_FIELDS, season_id=season_id))
+            return _rounded(league_app.query_standings(cur, FIELDS, **dates))
+        finally:
+            con.close()
+
+
+def _assert_parity(database, monkeypatch):
+    for dates in QUERIES:
+        expected = _standings(database, monkeypatch, False, **dates)
+        assert expected, dates
+        assert _standings(database, monkeypatch, True, **dates) == expected, dates
+    for season_id, (start_date, end_date) in SEASON_DATES.items():
+        expected = _standings(database, monkeypatch, False, start_date=start_date, end_date=end_date)
+        assert _standings(database, monkeypatch, True, season_id=season_id) == expected, season_id
+
+
+def test_engine_matches_sql(database, games, monkeypatch):
+    _assert_parity(database, monkeypatch)
+
+
+def test_engine_matches_sql_after_edit_and_delete(client, database, games, monkeypatch):
+    _assert_parity(database, monkeypatch)
+    engine = standings_engine.get_engine(database)
+    loads = []
+    monkeypatch.setattr(engine, 'load', lambda *args, load=engine.load: loads.append(args) or load(*args))
+
+    game = client.get(f'/api/games/{games[0]}').json['data']
+    results = [{'playerId': result['playerId'], 'rawScore': result['rawScore'], 'rank': result['rank'],
+                'calculatedPoints': result['calculatedPoints'] + 1.5} for result in game['results']]
+    response = client.put(f'/api/games/{games[0]}', json={'gameDate': '2025-01-04', 'gameResults': results})
+    assert response.json['success'], response.json
+    assert client.delete(f'/api/games/{games[5]}').json['success']
+
+    _assert_parity(database, monkeypatch)
+    # 変更されたゲームだけを読み直している
+    assert loads == []
+
+
+def test_engine_matches_sql_after_compaction(client, database, games, monkeypatch):
+    _assert_parity(database, monkeypatch)
+    engine = standings_engine.get_engine(database)
+    monkeypatch.setattr(standings_engine, 'ENGINE_COMPACT_RATIO', 0.0)
+    size = engine.size
+
+    for game_id in games[1:4]:
+        assert client.delete(f'/api/games/{game_id}').json['success']
+    _assert_parity(database, monkeypatch)
+
+    assert engine.dead == 0
+    assert engine.size == size - 3 * 4
+    assert engine.valid[:engine.size].all()
@@ -0,0 +1,71 @@
+import json
+import threading
+
+import app as league_app
+
+
+def _record_game(client, pids, game_date):
+    results = [{'playerId': pid, 'rawScore': 25000, 'rank': rank, 'calculatedPoints': 4 - rank}
+               for rank, pid in enumerate(pids, 1)]
+    response = client.post('/api/seasons/1/games', json={'gameDate': game_date, 'gameResults': results})
+    assert response.json['success'], response.json
+
+
+def _read_concurrently(database, subscribers=8):
+    """購読者ごとの接続で同時に最新のイベントを読む"""
+    barrier = threading.Barrier(subscribers)
+    events, errors = [], []
+
+    def subscriber():
+        con = league_app.connect_db(database, check_same_thread=False)
+        try:
+            with league_app.league_context(None):
+                barrier.wait()
+                events.append(league_app.latest_standings_event(con, 0)['id'])
+        except Exception as e:  # pragma: no cover - 失敗はテストで報告する
+            errors.append(e)
+        finally:
+            con.close()
+
+    threads = [threading.Thread(target=subscriber) for _ in range(subscribers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    return events
+
+
+def _events(database):
+    con = league_app.connect_db(database)
+    try:
+        return [(row['change_seq'], json.loads(row['payload'])['changeSeq'])
+                for row in con.execute('SELECT change_seq, payload FROM standings_events ORDER BY id')]
+    finally:
+        con.close()
+
+
+def test_one_event_per_revision(client, database):
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    _record_game(client, pids, '2025-01-01')
+
+    first = _read_concurrently(database)
+    assert len(set(first)) == 1
+    assert len(_events(database)) == 1
+
+    # 版が変わらなければ、別のプロセスからの保存も重ならない
+    con = league_app.connect_db(database)
+    try:
+        with league_app.league_context(None):
+            assert league_app.publish_standings_event(con) is None
+    finally:
+        con.close()
+
+    _record_game(client, pids, '2025-01-02')
+    second = _read_concurrently(database)
+    assert len(set(second)) == 1 and second[0] > first[0]
+
+    events = _events(database)
+    assert len(events) == 2
+    assert len({change_seq for change_seq, _ in events}) == 2
+    assert all(change_seq == payload_seq for change_seq, payload_seq in events)
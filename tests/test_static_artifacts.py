@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+
+import pytest
+
+import app as league_app
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(league_app, 'STATIC_DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(league_app, 'STATIC_ARTIFACTS', True)
+    monkeypatch.setattr(league_app, 'DEFER_STATIC_ARTIFACTS', False)
+    return tmp_path / 'data'
+
+
+def _write(relative_path, data, change_seq):
+    with league_app.app.app_context():
+        league_app._write_static_artifact(relative_path, data, change_seq)
+
+
+def _leftovers(directory):
+    return [name for _, _, names in os.walk(directory) for name in names if name.startswith('.tmp-')]
+
+
+def test_readers_never_see_partial_files(data_dir):
+    path = data_dir / 'standings' / 'all.json'
+    _write('standings/all.json', [], 0)
+    stop = threading.Event()
+    seen, errors = set(), []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with open(path, encoding='utf-8') as f:
+                    seen.add(json.load(f)['changeSeq'])
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for change_seq in range(1, 200):
+            _write('standings/all.json', [{'n': n, 'name': 'x' * 200} for n in range(200)], change_seq)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert errors == []
+    assert json.loads(path.read_text(encoding='utf-8'))['changeSeq'] == 199
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o644)
+    assert _leftovers(data_dir) == []
+
+
+def test_failed_write_keeps_previous_file(data_dir, monkeypatch):
+    _write('players.json', [{'id': 'a'}], 1)
+
+    def failing_dump(obj, f, **kwargs):
+        f.write('{"success": true, "data": [')
+        raise OSError('disk full')
+
+    monkeypatch.setattr(league_app.json, 'dump', failing_dump)
+    with pytest.raises(OSError):
+        _write('players.json', [{'id': 'b'}], 2)
+
+    assert json.loads((data_dir / 'players.json').read_text(encoding='utf-8'))['data'] == [{'id': 'a'}]
+    assert _leftovers(data_dir) == []
+
+
+def test_game_write_replaces_artifacts(client, data_dir):
+    pids = [client.post('/api/players', json={'name': f'P{i}'}).json['data']['id'] for i in range(4)]
+    results = [{'playerId': pid, 'rawScore': 25000, 'rank': rank, 'calculatedPoints': 4 - rank}
+               for rank, pid in enumerate(pids, 1)]
+    assert client.post('/api/seasons/1/games', json={'gameDate': '2025-01-01', 'gameResults': results}).json['success']
+
+    standings = json.loads((data_dir / 'standings' / 'all.json').read_text(encoding='utf-8'))
+    assert standings['data'] == client.get('/api/standings/all').json['data']
+    assert _leftovers(data_dir) == []
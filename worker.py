@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+麻雀リーグ管理システム - バックグラウンドジョブのワーカー
+
+jobs テーブル（jobs.py）からジョブを取り出して実行する。--processes で複数のプロセスを起動でき、
+各プロセスが1つずつジョブを実行する。SIGTERM / Ctrl+C を受け取ると、実行中のジョブを終えてから終了する。
+常駐させられない環境（CGI のみのサーバー）では cron から --drain で定期的に実行する。
+複数リーグの運用（leagues.py）では、従来のデータベースと全リーグのキューを順に確認する。
+--league を指定するとそのリーグだけを対象にする。
+ワーカー（常駐でも cron でも）を動かすときは、アプリ側に MAHJONG_JOB_WORKER=1 を設定する。
+設定しなければ、アプリはポイントの再計算などのジョブを登録したリクエストのレスポンスの後に実行する。
+
+使い方:
+    python worker.py run [--processes 2] [--poll 1.0]
+    python worker.py run --drain                       # 実行できるジョブがなくなったら終了する
+    python worker.py enqueue rebuild_aggregates
+    python worker.py enqueue archive_season --payload '{"season_id": 3}'
+    python worker.py list [--status failed]
+    python worker.py --league club-a run --drain
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Optional
+
+import leagues
+
+# 実行できるジョブがないときに次に確認するまでの秒数
+WORKER_POLL_SECONDS = 1.0
+
+
+def work(poll_seconds: float = WORKER_POLL_SECONDS, drain: bool = False, league: Optional[str] = None) -> None:
+    """ジョブを順に実行し続ける（drain ならジョブがなくなった時点で終了する）"""
+    import app as league_app
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    while not stopping:
+        # None は従来のデータベース。リーグは作成・削除されるので毎回確認する
+        targets = [league] if league is not None else [None, *leagues.list_leagues()]
+        ran = False
+        for target in targets:
+            if stopping:
+                break
+            prefix = f'[{target}] ' if target is not None else ''
+            try:
+                job = league_app.run_next_job(worker_id, log=lambda message: print(prefix + message, flush=True),
+                                              league=target)
+            except Exception as e:
+                # データベースがロックされているなど。少し待ってからやり直す
+                print(f'{prefix}{worker_id} ジョブの取得に失敗しました: {e}', file=sys.stderr, flush=True)
+                job = None
+            ran = ran or job is not None
+        if not ran:
+            if drain:
+                return
+            time.sleep(poll_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='バックグラウンドジョブの実行と登録')
+    parser.add_argument('--league', help='対象のリーグ（MAHJONG_LEAGUES_DIR）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='ジョブを実行する')
+    run_parser.add_argument('--processes', type=int, default=1, help='ワーカーのプロセス数')
+    run_parser.add_argument('--poll', type=float, default=WORKER_POLL_SECONDS, help='ジョブがないときの確認間隔（秒）')
+    run_parser.add_argument('--drain', action='store_true', help='実行できるジョブがなくなったら終了する')
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='ジョブを登録する')
+    enqueue_parser.add_argument('kind', help='ジョブの種類')
+    enqueue_parser.add_argument('--payload', default='{}', help='ジョブの引数（JSON）')
+
+    list_parser = subparsers.add_parser('list', help='ジョブの一覧を表示する')
+    list_parser.add_argument('--status', help='状態で絞り込む')
+    list_parser.add_argument('--limit', type=int, default=20, help='表示する件数')
+
+    args = parser.parse_args()
+
+    import app as league_app
+    import jobs
+
+    database = league_app.DATABASE
+    if args.league is not None:
+        if args.league not in leagues.list_leagues():
+            parser.error(f'リーグ {args.league} がありません')
+        database = leagues.database_path(args.league)
+
+    if args.command == 'run':
+        if args.processes <= 1:
+            work(args.poll, args.drain, args.league)
+            return
+        processes = [multiprocessing.Process(target=work, args=(args.poll, args.drain, args.league))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        # 子プロセスが自分でシグナルを処理して終了するのを待つ
+        signal.signal(signal.SIGTERM, lambda signum, frame: [p.terminate() for p in processes if p.is_alive()])
+        for process in processes:
+            try:
+                process.join()
+            except KeyboardInterrupt:
+                process.join()
+    elif args.command == 'enqueue':
+        con = league_app.connect_db(database)
+        try:
+            job_id = jobs.enqueue(con.cursor(), args.kind, json.loads(args.payload))
+            con.commit()
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            con.close()
+        print(f'ジョブ {job_id} を登録しました')
+    elif args.command == 'list':
+        con = league_app.connect_db(database)
+        try:
+            for job in jobs.query_jobs(con.cursor(), args.status, limit=args.limit):
+                print(f"{job['id']}\t{job['kind']}\t{job['status']}\t{job['progress']:.0%}\t"
+                      f"{job['attempts']}/{job['maxAttempts']}\t{job['error'] or job['message'] or ''}")
+        finally:
+            con.close()
+
+
+if __name__ == '__main__':
+    main()